@@ -0,0 +1,130 @@
+"""
+Dump browser fixtures for `python preprocess.py check`: draws chalk strokes the way
+DrawingCanvas does, runs DigitCNN._preprocessCanvas from js/recognition/digitCNN.js in
+headless Chrome at each devicePixelRatio, and saves the canvases with the tensors.
+
+    python adhoc_scripts/dump_preprocess_fixtures.py --chrome /path/to/chrome-headless-shell
+"""
+
+import os
+import re
+import sys
+import json
+import base64
+import argparse
+import subprocess
+import tempfile
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OUT = os.path.join(ROOT, 'data', 'preprocess_fixtures.npz')
+DPRS = [1, 1.5, 2]
+# CSS size of the drawing canvas
+WIDTH, HEIGHT = 160, 120
+
+# Strokes in CSS pixels; several run off the canvas so the padded box is clamped at an edge
+CASES = {
+    'seven': [[(50, 30), (110, 30), (75, 95)]],
+    'one_thin': [[(80, 20), (80, 100)]],
+    'top_left': [[(-10, 5), (30, 5), (5, 40)]],
+    'bottom_right': [[(120, 90), (170, 130)], [(150, 80), (150, 125)]],
+    'one_right_edge': [[(156, 15), (156, 110)]],
+    'zero_wide': [[(10, 60), (80, 20), (150, 60), (80, 100), (10, 60)]],
+    'dot': [[(40, 40), (41, 41)]],
+    'empty': [],
+}
+
+PAGE = """<!DOCTYPE html>
+<html><body style="margin:0">
+<pre id="out"></pre>
+<script>var ort = {Tensor: function (type, data, dims) { this.data = data; this.dims = dims; }};</script>
+<script src="%(script)s"></script>
+<script>
+function b64(bytes) {
+    let s = '';
+    for (let i = 0; i < bytes.length; i += 0x8000) s += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+    return btoa(s);
+}
+const cases = %(cases)s;
+const out = {dpr: window.devicePixelRatio, cases: []};
+const cnn = new DigitCNN();
+for (const [name, strokes] of Object.entries(cases)) {
+    const canvas = document.createElement('canvas');
+    canvas.style.width = '%(width)dpx';
+    canvas.style.height = '%(height)dpx';
+    document.body.appendChild(canvas);
+    // DrawingCanvas._resizeCanvas / _applyStyle
+    const rect = canvas.getBoundingClientRect();
+    const dpr = window.devicePixelRatio || 1;
+    canvas.width = rect.width * dpr;
+    canvas.height = rect.height * dpr;
+    const ctx = canvas.getContext('2d');
+    ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+    ctx.strokeStyle = '#f8f9fa';
+    ctx.lineWidth = 10;
+    ctx.lineCap = 'round';
+    ctx.lineJoin = 'round';
+    ctx.shadowColor = 'rgba(255, 255, 255, 0.3)';
+    ctx.shadowBlur = 4;
+    // One segment per pointermove, as in _onPointerMove
+    for (const points of strokes) {
+        for (let i = 1; i < points.length; i++) {
+            ctx.beginPath();
+            ctx.moveTo(points[i - 1][0], points[i - 1][1]);
+            ctx.lineTo(points[i][0], points[i][1]);
+            ctx.stroke();
+        }
+    }
+    const pixels = ctx.getImageData(0, 0, canvas.width, canvas.height).data;
+    const tensor = cnn._preprocessCanvas(canvas);
+    out.cases.push({
+        name, width: canvas.width, height: canvas.height,
+        canvas: b64(new Uint8Array(pixels.buffer)),
+        expected: b64(new Uint8Array(tensor.data.buffer)),
+    });
+}
+document.getElementById('out').textContent = JSON.stringify(out);
+</script>
+</body></html>
+"""
+
+
+def dump(chrome, dpr):
+    script = 'file://' + os.path.join(ROOT, 'js', 'recognition', 'digitCNN.js')
+    page = PAGE % {'script': script, 'cases': json.dumps(CASES), 'width': WIDTH, 'height': HEIGHT}
+    with tempfile.NamedTemporaryFile('w', suffix='.html', delete=False, encoding='utf-8') as f:
+        f.write(page)
+    try:
+        html = subprocess.run([chrome, '--no-sandbox', '--allow-file-access-from-files',
+                               f'--force-device-scale-factor={dpr}', '--dump-dom', 'file://' + f.name],
+                              capture_output=True, text=True, timeout=120, check=True).stdout
+    finally:
+        os.remove(f.name)
+    result = json.loads(re.search(r'<pre id="out">(.*?)</pre>', html, re.S).group(1).replace('&quot;', '"'))
+    if result['dpr'] != dpr:
+        raise RuntimeError(f"Chrome reported devicePixelRatio {result['dpr']}, asked for {dpr}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dump _preprocessCanvas fixtures from headless Chrome.')
+    parser.add_argument('--chrome', required=True, help='Chrome or chrome-headless-shell binary')
+    parser.add_argument('--out', default=OUT)
+    args = parser.parse_args()
+
+    arrays = {'dpr': np.array(DPRS, np.float64), 'names': np.array(list(CASES))}
+    for g, dpr in enumerate(DPRS):
+        result = dump(args.chrome, dpr)
+        cases = result['cases']
+        h, w = cases[0]['height'], cases[0]['width']
+        arrays[f'canvases_{g}'] = np.stack([np.frombuffer(base64.b64decode(c['canvas']), np.uint8).reshape(h, w, 4)
+                                            for c in cases])
+        arrays[f'expected_{g}'] = np.stack([np.frombuffer(base64.b64decode(c['expected']), '<f4').reshape(1, 28, 28)
+                                            for c in cases])
+        print(f"dpr {dpr}: {len(cases)} canvases of {w}×{h}")
+    np.savez_compressed(args.out, **arrays)
+    print(f"✅ Fixtures saved to {args.out} ({os.path.getsize(args.out) / 1024:.0f} KB)")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
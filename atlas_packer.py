@@ -0,0 +1,279 @@
+"""
+atlas_packer.py — Pack sprites into power-of-two texture atlases with Phaser frame JSON.
+
+BootScene used to load every pose, the umbrella, the minibus sheet and the classroom
+background as separate images: one HTTP request and one texture bind each. This packs
+them into as few atlases as fit under --max-size:
+  • each sprite (or each frame of a sheet given as path@WxH) is trimmed to its alpha
+    bounding box, as tile_user_minibus.py does with cv2.findNonZero
+  • frames whose trimmed pixels are identical (the same bitmap at different offsets, like
+    the minibus animation) share one rectangle; --no-dedupe packs each separately
+  • the trimmed rectangles are bin-packed (MaxRects, best short side fit) into the
+    smallest power-of-two atlas that holds them all, or into several max-size atlases
+    when they don't fit one, each then shrunk to the smallest power of two
+  • a Phaser multiatlas JSON records each frame's rectangle and its trim offset within
+    the original sprite, so frames keep their size, origin and animation alignment
+
+Sprites are given as [name=]path[@WxH]; the frame name defaults to the file name, and
+sheet frames are named name_0, name_1, ... left to right, top to bottom.
+
+    python atlas_packer.py sunnie_1=img/sunnie_pose_1.png sunnie_minibus=img/sunnie_minibus_sheet.png@640x210 -o img/sprites
+    python atlas_packer.py img/*.png -o img/sprites --max-size 4096
+
+    this.load.multiatlas('sprites', 'img/sprites.json', 'img/');     // BootScene
+    this.add.image(x, y, 'sprites', 'sunnie_1');
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from collections import namedtuple
+import cv2
+import numpy as np
+
+from image_io import load_image, save_image
+
+# ===== Configuration =====
+# 2048 is safe on every iPad the classroom has; newer ones take 4096
+MAX_SIZE = 2048
+# Transparent gap between frames (and the atlas edge), so linear filtering doesn't bleed
+PADDING = 2
+
+# A trimmed frame: its pixels, and where they sat in the untrimmed (source_w × source_h) sprite
+Sprite = namedtuple('Sprite', ['name', 'image', 'x', 'y', 'source_w', 'source_h'])
+
+
+def trim_sprite(name, img):
+    """Crop `img` to its alpha bounding box; a fully transparent sprite keeps one pixel."""
+    h, w = img.shape[:2]
+    coords = cv2.findNonZero(img[..., 3])
+    x, y, tw, th = cv2.boundingRect(coords) if coords is not None else (0, 0, 1, 1)
+    return Sprite(name, img[y:y + th, x:x + tw], x, y, w, h)
+
+
+def parse_sprite(spec):
+    """'[name=]path[@WxH]' -> (name, path, frame size or None)."""
+    name, _, path = spec.rpartition('=')
+    path, _, frame = path.partition('@')
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    if not frame:
+        return name, path, None
+    try:
+        fw, fh = (int(v) for v in frame.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"frame size must be WxH: {spec}")
+    return name, path, (fw, fh)
+
+
+def load_sprites(specs):
+    sprites = []
+    for name, path, frame in specs:
+        img = load_image(path)
+        if frame is None:
+            sprites.append(trim_sprite(name, img))
+            continue
+        fw, fh = frame
+        rows, cols = img.shape[0] // fh, img.shape[1] // fw
+        for i in range(rows * cols):
+            y, x = divmod(i, cols)
+            sprites.append(trim_sprite(f'{name}_{i}', img[y * fh:(y + 1) * fh, x * fw:(x + 1) * fw]))
+    return sprites
+
+
+def dedupe(sprites):
+    """
+    Split `sprites` into those with distinct trimmed pixels and the rest. Returns (unique,
+    {unique name: [sprites with the same pixels]}); trimming already removed any translation.
+    """
+    unique, duplicates, seen = [], {}, {}
+    for s in sprites:
+        key = (s.image.shape, hashlib.blake2b(np.ascontiguousarray(s.image).tobytes(), digest_size=16).digest())
+        if key in seen:
+            duplicates.setdefault(seen[key].name, []).append(s)
+        else:
+            seen[key] = s
+            unique.append(s)
+    return unique, duplicates
+
+
+class MaxRects:
+    """MaxRects bin with best-short-side-fit placement; rectangles are never rotated."""
+
+    def __init__(self, width, height, padding=PADDING):
+        self.padding = padding
+        # Every rectangle reserves `padding` to its right and below; the bin's top-left edges get it up front
+        self.free = [(padding, padding, width - padding, height - padding)]
+
+    def insert(self, w, h):
+        """Place a w×h rectangle; returns its (x, y), or None if it doesn't fit."""
+        w, h = w + self.padding, h + self.padding
+        best, best_fit = None, None
+        for fx, fy, fw, fh in self.free:
+            if w <= fw and h <= fh:
+                fit = (min(fw - w, fh - h), max(fw - w, fh - h))
+                if best_fit is None or fit < best_fit:
+                    best, best_fit = (fx, fy), fit
+        if best is None:
+            return None
+        self._split(best[0], best[1], w, h)
+        return best
+
+    def _split(self, x, y, w, h):
+        free = []
+        for fx, fy, fw, fh in self.free:
+            if x >= fx + fw or x + w <= fx or y >= fy + fh or y + h <= fy:
+                free.append((fx, fy, fw, fh))
+                continue
+            # Keep the up-to-four maximal pieces of the free rectangle around the placed one
+            if x > fx:
+                free.append((fx, fy, x - fx, fh))
+            if x + w < fx + fw:
+                free.append((x + w, fy, fx + fw - x - w, fh))
+            if y > fy:
+                free.append((fx, fy, fw, y - fy))
+            if y + h < fy + fh:
+                free.append((fx, y + h, fw, fy + fh - y - h))
+        # Drop free rectangles contained in another
+        self.free = [a for i, a in enumerate(free)
+                     if not any(j != i and b[0] <= a[0] and b[1] <= a[1] and a[0] + a[2] <= b[0] + b[2]
+                                and a[1] + a[3] <= b[1] + b[3] and (b != a or j < i)
+                                for j, b in enumerate(free))]
+
+
+def pack_into(sprites, width, height, padding=PADDING):
+    """Place as many of `sprites` (largest first) as fit; returns {index: (x, y)}."""
+    packer = MaxRects(width, height, padding)
+    placed = {}
+    for i in sorted(range(len(sprites)), key=lambda i: -max(sprites[i].image.shape[:2])):
+        h, w = sprites[i].image.shape[:2]
+        pos = packer.insert(w, h)
+        if pos is not None:
+            placed[i] = pos
+    return placed
+
+
+def pot_sizes(max_size):
+    """Power-of-two (width, height) pairs up to max_size, smallest area first, squarer first."""
+    sides = [2 ** k for k in range(int(np.log2(max_size)) + 1)]
+    return sorted(((w, h) for w in sides for h in sides), key=lambda s: (s[0] * s[1], abs(s[0] - s[1]), -s[0]))
+
+
+def smallest_atlas(sprites, max_size=MAX_SIZE, padding=PADDING):
+    """The smallest power-of-two size that holds all of `sprites`, with their positions; None if none does."""
+    area = sum((s.image.shape[0] + padding) * (s.image.shape[1] + padding) for s in sprites)
+    for w, h in pot_sizes(max_size):
+        if w * h < area:
+            continue
+        placed = pack_into(sprites, w, h, padding)
+        if len(placed) == len(sprites):
+            return (w, h), [placed[i] for i in range(len(sprites))]
+    return None
+
+
+def pack(sprites, max_size=MAX_SIZE, padding=PADDING):
+    """Split `sprites` into atlases. Returns [((width, height), [(sprite, x, y), ...]), ...]."""
+    for s in sprites:
+        h, w = s.image.shape[:2]
+        if w + 2 * padding > max_size or h + 2 * padding > max_size:
+            raise ValueError(f"{s.name} is {w}×{h} after trimming, larger than the {max_size}px maximum")
+    atlases = []
+    remaining = list(sprites)
+    while remaining:
+        result = smallest_atlas(remaining, max_size, padding)
+        if result is not None:
+            size, positions = result
+            atlases.append((size, [(s, x, y) for s, (x, y) in zip(remaining, positions)]))
+            break
+        # Fill one max-size atlas, shrink it to fit what went in, and carry on with the rest
+        placed = pack_into(remaining, max_size, max_size, padding)
+        subset = [remaining[i] for i in sorted(placed)]
+        size, positions = smallest_atlas(subset, max_size, padding)
+        atlases.append((size, [(s, x, y) for s, (x, y) in zip(subset, positions)]))
+        remaining = [s for i, s in enumerate(remaining) if i not in placed]
+    return atlases
+
+
+def render(size, placements):
+    atlas = np.zeros((size[1], size[0], 4), np.uint8)
+    for s, x, y in placements:
+        h, w = s.image.shape[:2]
+        atlas[y:y + h, x:x + w] = s.image
+    return atlas
+
+
+def frame_json(s, x, y):
+    h, w = s.image.shape[:2]
+    return {
+        'filename': s.name,
+        'rotated': False,
+        'trimmed': (w, h) != (s.source_w, s.source_h),
+        'sourceSize': {'w': s.source_w, 'h': s.source_h},
+        'spriteSourceSize': {'x': s.x, 'y': s.y, 'w': w, 'h': h},
+        'frame': {'x': x, 'y': y, 'w': w, 'h': h},
+    }
+
+
+def write_atlases(atlases, output, duplicates=None, extra=None):
+    """
+    Write output.png (or output-0.png, output-1.png, ...) and the multiatlas output.json.
+    duplicates: {packed sprite name: [sprites sharing its pixels]}, written as frames at the
+    same rectangle with their own trim offsets. extra: more top-level keys for the JSON.
+    """
+    duplicates = duplicates or {}
+    textures = []
+    for i, (size, placements) in enumerate(atlases):
+        path = f'{output}.png' if len(atlases) == 1 else f'{output}-{i}.png'
+        save_image(path, render(size, placements))
+        textures.append({
+            'image': os.path.basename(path),
+            'format': 'RGBA8888',
+            'size': {'w': size[0], 'h': size[1]},
+            'scale': 1,
+            'frames': sorted((frame_json(d, x, y) for s, x, y in placements for d in [s, *duplicates.get(s.name, [])]),
+                             key=lambda f: f['filename']),
+        })
+    with open(f'{output}.json', 'w', encoding='utf-8') as f:
+        json.dump({'textures': textures, **(extra or {}), 'meta': {'app': 'atlas_packer.py', 'version': '1'}}, f,
+                  indent=1)
+        f.write('\n')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Pack sprites into power-of-two atlases with Phaser frame JSON.')
+    parser.add_argument('sprites', nargs='+', type=parse_sprite,
+                        help='[name=]path[@WxH]; @WxH splits a sheet into frames name_0, name_1, ...')
+    parser.add_argument('-o', '--output', required=True, help='output path without extension, e.g. img/sprites')
+    parser.add_argument('--max-size', type=int, default=MAX_SIZE, help='largest atlas side (power of two)')
+    parser.add_argument('--padding', type=int, default=PADDING, help='transparent pixels between frames')
+    parser.add_argument('--no-dedupe', action='store_true', help='pack frames with identical pixels separately')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.max_size & (args.max_size - 1):
+        print(f"Error: --max-size must be a power of two, got {args.max_size}")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    sprites = load_sprites(args.sprites)
+    unique, duplicates = (sprites, {}) if args.no_dedupe else dedupe(sprites)
+    try:
+        atlases = pack(unique, args.max_size, args.padding)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    write_atlases(atlases, args.output, duplicates)
+
+    source_px = sum(s.source_w * s.source_h for s in sprites)
+    for i, (size, placements) in enumerate(atlases):
+        used = sum(s.image.shape[0] * s.image.shape[1] for s, _, _ in placements)
+        print(f"  atlas {i}: {size[0]}×{size[1]}, {len(placements)} bitmaps, {100 * used / (size[0] * size[1]):.0f}% filled")
+    atlas_px = sum(w * h for (w, h), _ in atlases)
+    shared = f" ({len(sprites) - len(unique)} sharing another's pixels)" if len(unique) < len(sprites) else ''
+    print(f"✅ {len(sprites)} frames{shared} from {len(args.sprites)} image(s) in {len(atlases)} atlas(es) "
+          f"({atlas_px * 4 / 2 ** 20:.1f} MB of texture vs {source_px * 4 / 2 ** 20:.1f} MB untrimmed) "
+          f"in {time.perf_counter() - t0:.2f}s → {args.output}.json")
@@ -0,0 +1,125 @@
+"""
+augment.py — Batched random affine augmentation for MNIST-style digit tensors.
+
+Replaces the per-sample PIL `transforms.RandomAffine` in the training loop with a
+single `affine_grid` + `grid_sample` call over a whole (B, 1, H, W) batch.
+Run this file directly for a samples/sec comparison against the PIL path.
+"""
+
+import math
+import time
+import torch
+import torch.nn.functional as F
+
+# ===== Configuration =====
+# Same ranges as the original transforms.RandomAffine in get_mnist_model.py
+DEGREES = 20
+TRANSLATE = (0.15, 0.15)
+SCALE = (0.7, 1.2)
+
+
+def random_affine_params(batch_size, degrees=DEGREES, translate=TRANSLATE, scale=SCALE,
+                         img_size=(28, 28), generator=None, device='cpu'):
+    """Sample per-image (angle in degrees, tx, ty in pixels, scale) like RandomAffine.get_params."""
+    def uniform(lo, hi):
+        return torch.empty(batch_size, device=device).uniform_(lo, hi, generator=generator)
+
+    angle = uniform(-degrees, degrees)
+    max_dx = translate[0] * img_size[1]
+    max_dy = translate[1] * img_size[0]
+    # RandomAffine rounds translations to whole pixels
+    tx = uniform(-max_dx, max_dx).round()
+    ty = uniform(-max_dy, max_dy).round()
+    s = uniform(scale[0], scale[1])
+    return angle, tx, ty, s
+
+
+def affine_theta(angle, tx, ty, scale, img_size=(28, 28)):
+    """
+    Build the (B, 2, 3) inverse affine matrices `F.affine_grid` expects.
+    The forward warp rotates/scales about the image centre and then translates,
+    matching torchvision's affine; the grid maps output pixels back to input pixels.
+    """
+    h, w = img_size
+    rad = torch.deg2rad(angle)
+    cos, sin = torch.cos(rad) / scale, torch.sin(rad) / scale
+
+    # Translation in normalized [-1, 1] coordinates
+    nx = tx * 2.0 / w
+    ny = ty * 2.0 / h
+
+    theta = torch.empty(angle.shape[0], 2, 3, device=angle.device, dtype=angle.dtype)
+    theta[:, 0, 0] = cos
+    theta[:, 0, 1] = sin
+    theta[:, 0, 2] = -(cos * nx + sin * ny)
+    theta[:, 1, 0] = -sin
+    theta[:, 1, 1] = cos
+    theta[:, 1, 2] = -(-sin * nx + cos * ny)
+    return theta
+
+
+def batch_random_affine(images, degrees=DEGREES, translate=TRANSLATE, scale=SCALE,
+                        mode='nearest', generator=None):
+    """
+    Apply an independent random affine warp to every image of a (B, C, H, W) batch.
+
+    Images should be in [0, 1] (before normalization) so that out-of-bounds pixels
+    are filled with black, exactly like RandomAffine's default fill on MNIST.
+    `mode='nearest'` matches RandomAffine's default interpolation; 'bilinear' is smoother.
+    """
+    b, _, h, w = images.shape
+    angle, tx, ty, s = random_affine_params(b, degrees, translate, scale, (h, w),
+                                            generator=generator, device=images.device)
+    theta = affine_theta(angle, tx, ty, s, (h, w)).to(images.dtype)
+    grid = F.affine_grid(theta, list(images.shape), align_corners=False)
+    return F.grid_sample(images, grid, mode=mode, padding_mode='zeros', align_corners=False)
+
+
+class BatchRandomAffine(torch.nn.Module):
+    """Module wrapper so the batched augmentation can sit in a transform pipeline."""
+    def __init__(self, degrees=DEGREES, translate=TRANSLATE, scale=SCALE, mode='nearest'):
+        super().__init__()
+        self.degrees = degrees
+        self.translate = translate
+        self.scale = scale
+        self.mode = mode
+
+    def forward(self, images, generator=None):
+        return batch_random_affine(images, self.degrees, self.translate, self.scale,
+                                   self.mode, generator=generator)
+
+
+def benchmark(num_samples=10000, batch_size=64):
+    """Compare samples/sec of per-sample PIL RandomAffine vs. the batched tensor path."""
+    import numpy as np
+    from PIL import Image
+    from torchvision import transforms
+
+    rng = np.random.default_rng(0)
+    pil_images = [Image.fromarray(rng.integers(0, 256, (28, 28), dtype=np.uint8))
+                  for _ in range(batch_size)]
+    pil_transform = transforms.Compose([
+        transforms.RandomAffine(degrees=DEGREES, translate=TRANSLATE, scale=SCALE),
+        transforms.ToTensor(),
+    ])
+    batch = torch.rand(batch_size, 1, 28, 28)
+    num_batches = math.ceil(num_samples / batch_size)
+
+    t0 = time.perf_counter()
+    for _ in range(num_batches):
+        torch.stack([pil_transform(img) for img in pil_images])
+    pil_rate = num_batches * batch_size / (time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    for _ in range(num_batches):
+        batch_random_affine(batch)
+    batched_rate = num_batches * batch_size / (time.perf_counter() - t0)
+
+    print(f"PIL RandomAffine (per sample): {pil_rate:10.0f} samples/s")
+    print(f"Batched affine_grid          : {batched_rate:10.0f} samples/s")
+    print(f"Speedup: {batched_rate / pil_rate:.1f}x")
+    return pil_rate, batched_rate
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,190 @@
+"""
+benchmark_onnx.py — Inference latency benchmark for the exported ONNX models.
+
+For each model (default: model/digit_cnn.onnx and model/greek_cnn.onnx, when present)
+it measures, on CPU with onnxruntime:
+  • cold start: session creation and the first batch-1 run
+  • warm batch-1 latency p50 / p95 / p99
+  • batched throughput (images/s) for every combination of intra-op thread count
+    and graph optimization level
+
+Results are written as JSON. With --baseline, the run is compared to a stored
+result and the script exits with status 1 if p50 latency or file size grows, or
+throughput drops, by more than --tolerance:
+
+    python benchmark_onnx.py --out runs/bench.json
+    python benchmark_onnx.py --baseline runs/bench.json --tolerance 0.15
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import numpy as np
+
+from evaluate import MODEL_DIR, create_session
+
+# ===== Configuration =====
+DEFAULT_MODELS = ('digit_cnn.onnx', 'greek_cnn.onnx')
+WARM_RUNS = 500
+WARMUP_RUNS = 20
+THREADS = (1, 2, 4)
+OPT_LEVELS = ('disabled', 'basic', 'extended', 'all')
+THROUGHPUT_BATCH = 256
+THROUGHPUT_SECONDS = 1.0
+# Fail the comparison on a change beyond this fraction
+REGRESSION_TOLERANCE = 0.15
+
+
+def _opt_level(name):
+    import onnxruntime as ort
+    return {'disabled': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL}[name]
+
+
+def _input(session, batch, seed=0):
+    meta = session.get_inputs()[0]
+    size = meta.shape[-1]
+    x = np.random.default_rng(seed).standard_normal((batch, 1, size, size)).astype(np.float32)
+    return {meta.name: x}
+
+
+def cold_start(path):
+    """Session creation and first batch-1 run, in ms."""
+    t0 = time.perf_counter()
+    session = create_session(path, threads=1)
+    t1 = time.perf_counter()
+    session.run(None, _input(session, 1))
+    t2 = time.perf_counter()
+    return {'load_ms': 1000 * (t1 - t0), 'first_run_ms': 1000 * (t2 - t1)}
+
+
+def warm_latency(path, runs=WARM_RUNS, threads=1):
+    """Batch-1 latency percentiles in ms after WARMUP_RUNS untimed runs."""
+    session = create_session(path, threads)
+    feed = _input(session, 1)
+    for _ in range(WARMUP_RUNS):
+        session.run(None, feed)
+    times = np.empty(runs)
+    for i in range(runs):
+        t0 = time.perf_counter()
+        session.run(None, feed)
+        times[i] = time.perf_counter() - t0
+    p50, p95, p99 = 1000 * np.percentile(times, [50, 95, 99])
+    return {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99), 'runs': runs}
+
+
+def throughput(path, threads, opt_level, batch=THROUGHPUT_BATCH, seconds=THROUGHPUT_SECONDS):
+    """Images/s for repeated `batch`-sized runs over roughly `seconds` of wall time."""
+    session = create_session(path, threads, _opt_level(opt_level))
+    feed = _input(session, batch)
+    session.run(None, feed)
+    n, t0 = 0, time.perf_counter()
+    while True:
+        session.run(None, feed)
+        n += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= seconds:
+            return n * batch / elapsed
+
+
+def benchmark_model(path, threads=THREADS, opt_levels=OPT_LEVELS, runs=WARM_RUNS,
+                    batch=THROUGHPUT_BATCH, seconds=THROUGHPUT_SECONDS):
+    print(f"\n{path}")
+    result = {
+        'size_kb': os.path.getsize(path) / 1024,
+        'cold': cold_start(path),
+        'warm': warm_latency(path, runs),
+        'throughput': {},
+    }
+    cold, warm = result['cold'], result['warm']
+    print(f"  size {result['size_kb']:.1f} KB   cold: load {cold['load_ms']:.1f} ms + first run {cold['first_run_ms']:.2f} ms")
+    print(f"  warm batch-1: p50 {warm['p50_ms']:.3f} ms  p95 {warm['p95_ms']:.3f} ms  p99 {warm['p99_ms']:.3f} ms")
+
+    print(f"  throughput at batch {batch} (images/s):")
+    print(f"  {'threads':>9}" + ''.join(f"{level:>11}" for level in opt_levels))
+    for t in threads:
+        row = {level: throughput(path, t, level, batch, seconds) for level in opt_levels}
+        for level, value in row.items():
+            result['throughput'][f"t{t}/{level}"] = value
+        print(f"  {t:>9}" + ''.join(f"{row[level]:>11,.0f}" for level in opt_levels))
+    return result
+
+
+def compare(run, baseline, tolerance=REGRESSION_TOLERANCE):
+    """List of regression messages; metrics missing from either side are skipped."""
+    regressions = []
+
+    def check(label, new, old, higher_is_better):
+        change = (new / old - 1) if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = '❌' if worse > tolerance else '  '
+        print(f"{flag} {label:<44}{old:>12.3f}{new:>12.3f}{100 * change:>+9.1f}%")
+        if worse > tolerance:
+            regressions.append(f"{label}: {old:.3f} -> {new:.3f}")
+
+    print(f"\n   {'metric':<44}{'baseline':>12}{'this run':>12}{'change':>10}")
+    for name, new in run['models'].items():
+        old = baseline['models'].get(name)
+        if old is None:
+            continue
+        check(f"{name} size_kb", new['size_kb'], old['size_kb'], higher_is_better=False)
+        # Tail percentiles are too noisy on shared machines to gate on
+        check(f"{name} warm p50_ms", new['warm']['p50_ms'], old['warm']['p50_ms'], higher_is_better=False)
+        for key, value in new['throughput'].items():
+            if key in old['throughput']:
+                check(f"{name} images/s {key}", value, old['throughput'][key], higher_is_better=True)
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Latency and throughput benchmark for ONNX models.')
+    parser.add_argument('models', nargs='*', help='.onnx files (default: model/digit_cnn.onnx, model/greek_cnn.onnx)')
+    parser.add_argument('--threads', type=int, nargs='+', default=list(THREADS))
+    parser.add_argument('--opt-levels', nargs='+', choices=OPT_LEVELS, default=list(OPT_LEVELS))
+    parser.add_argument('--runs', type=int, default=WARM_RUNS, help='timed batch-1 runs')
+    parser.add_argument('--batch-size', type=int, default=THROUGHPUT_BATCH, help='batch size for throughput')
+    parser.add_argument('--seconds', type=float, default=THROUGHPUT_SECONDS,
+                        help='time spent on each throughput measurement')
+    parser.add_argument('--out', default=None, help='write results to this JSON file')
+    parser.add_argument('--baseline', default=None, help='JSON from an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help='allowed fractional regression per metric')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    paths = args.models or [p for p in (os.path.join(MODEL_DIR, m) for m in DEFAULT_MODELS) if os.path.exists(p)]
+    if not paths:
+        print(f"Error: no ONNX models found in {MODEL_DIR}")
+        sys.exit(1)
+
+    import onnxruntime as ort
+    run = {
+        'machine': {'platform': platform.platform(), 'processor': platform.processor(),
+                    'cpu_count': os.cpu_count(), 'onnxruntime': ort.__version__},
+        'config': {'runs': args.runs, 'batch_size': args.batch_size, 'threads': args.threads,
+                   'opt_levels': args.opt_levels},
+        'models': {os.path.basename(p): benchmark_model(p, args.threads, args.opt_levels, args.runs,
+                                                        args.batch_size, args.seconds) for p in paths},
+    }
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2)
+        print(f"\nResults saved to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(run, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} metric(s) regressed beyond {100 * args.tolerance:.0f}%")
+            sys.exit(1)
+        print("✅ No regressions")
@@ -0,0 +1,420 @@
+"""
+build_assets.py — Incremental, parallel image build driven by assets.json.
+
+Replaces the one-off scripts in adhoc_scripts/. assets.json declares each output image
+as a graph of steps over source images:
+
+    {
+      "steps":   {"minibus": {"op": "trim", "input": "img/sunnie_minibus_no_bg.png"}},
+      "outputs": {"img/sunnie_minibus_sheet.png":
+                    {"op": "sheet", "input": {"op": "fit", "input": "@minibus", "size": [640, 210]},
+                     "frame": [640, 210], "offsets": [0, 4, 2]}}
+    }
+
+An input is a file path, "@name" of a shared step, or an inline step. Every other key
+of a step is a parameter of its op (see OPS). Each step is keyed by a content hash of
+its op, parameters, the op's source code and its inputs' keys, and its result is kept
+in .asset_cache/, so only steps downstream of a changed source (or a changed
+manifest entry or op) run again. Independent steps run in a process pool.
+
+    python build_assets.py                         # build everything that is stale
+    python build_assets.py img/sunnie_minibus_sheet.png --force
+    python build_assets.py --dry-run               # list what would be rebuilt
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import inspect
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import cv2
+import numpy as np
+
+from image_io import load_image, save_image
+from compositing import Layer, composite
+from remove_background import remove_background
+from seam_blend import blend_tiles
+from recolor import Rule, recolor
+
+# ===== Configuration =====
+MANIFEST = 'assets.json'
+CACHE_DIR = '.asset_cache'
+# Bump to invalidate every cached step
+BUILD_VERSION = 1
+INTERPOLATION = {
+    'nearest': cv2.INTER_NEAREST,
+    'linear': cv2.INTER_LINEAR,
+    'area': cv2.INTER_AREA,
+    'cubic': cv2.INTER_CUBIC,
+    'lanczos': cv2.INTER_LANCZOS4,
+}
+
+
+# ===== Ops =====
+# Each op takes one or more RGBA images plus keyword parameters and returns an RGBA image.
+OPS = {}
+
+
+def op(fn):
+    OPS[fn.__name__] = fn
+    return fn
+
+
+@op
+def remove_bg(img, color='top-left', tolerance=30, metric='sum', flood=False):
+    """Make a key colour transparent (remove_background.py).
+    color: 'top-left', 'magenta' or [r, g, b]; flood: only regions connected to the border."""
+    return remove_background(img.copy(), color, tolerance, metric, flood)
+
+
+@op
+def trim(img, padding=0):
+    """Crop to the alpha bounding box (tile_user_minibus.py)."""
+    coords = cv2.findNonZero(img[..., 3])
+    if coords is None:
+        return img
+    x, y, w, h = cv2.boundingRect(coords)
+    x0, y0 = max(x - padding, 0), max(y - padding, 0)
+    return img[y0:y + h + padding, x0:x + w + padding].copy()
+
+
+@op
+def crop(img, box):
+    """box: [left, top, right, bottom] in pixels (crop_sunnie.py)."""
+    left, top, right, bottom = box
+    return img[top:bottom, left:right].copy()
+
+
+@op
+def resize(img, size, interpolation='area'):
+    return cv2.resize(img, tuple(size), interpolation=INTERPOLATION[interpolation])
+
+
+@op
+def fit(img, size, margin=(40, 20), interpolation='area'):
+    """Scale to fit inside size minus margin, keeping the aspect ratio (create_bus_sheet.py)."""
+    h, w = img.shape[:2]
+    scale = min((size[0] - margin[0]) / w, (size[1] - margin[1]) / h)
+    return resize(img, (int(w * scale), int(h * scale)), interpolation)
+
+
+@op
+def square(img):
+    """Pad with transparency to a centred square (make_favicon.py)."""
+    h, w = img.shape[:2]
+    side = max(w, h)
+    out = np.zeros((side, side, 4), np.uint8)
+    y, x = (side - h) // 2, (side - w) // 2
+    out[y:y + h, x:x + w] = img
+    return out
+
+
+@op
+def sheet(img, frame=(640, 210), offsets=(0, 4, 2), bottom=10):
+    """Horizontal animation sheet: one frame per y-offset, centred and anchored `bottom` px up."""
+    fw, fh = frame
+    h, w = img.shape[:2]
+    out = np.zeros((fh, fw * len(offsets), 4), np.uint8)
+    x, y = (fw - w) // 2, fh - h - bottom
+    for i, dy in enumerate(offsets):
+        out[y + dy:y + dy + h, i * fw + x:i * fw + x + w] = img
+    return out
+
+
+@op
+def hconcat(*imgs, interpolation='lanczos'):
+    """Side by side, each scaled to the first image's height (combine_bg.py)."""
+    h = imgs[0].shape[0]
+    scaled = [img if img.shape[0] == h else resize(img, (int(img.shape[1] * h / img.shape[0]), h), interpolation)
+              for img in imgs]
+    return np.concatenate(scaled, axis=1)
+
+
+@op
+def overlay(base, top, at=(0.0, 0.0), height=None, interpolation='nearest'):
+    """Alpha-composite `top` over `base` (composite_bus.py). `at` and `height` are fractions of base."""
+    bh, bw = base.shape[:2]
+    if height is not None:
+        th = int(bh * height)
+        top = resize(top, (int(top.shape[1] * th / top.shape[0]), th), interpolation)
+    return composite([Layer(top, int(bw * at[0]), int(bh * at[1]))], base=base)
+
+
+@op
+def stack(*imgs, at=None, size=None):
+    """Composite a layer stack bottom to top in one pass (compositing.py).
+    at: [x, y] pixel offset per image (default [0, 0]); size: [w, h] canvas (default: the first image)."""
+    at = at or [[0, 0]] * len(imgs)
+    return composite([Layer(img, x, y) for img, (x, y) in zip(imgs, at)], size or imgs[0].shape[1::-1])
+
+
+@op
+def edge_fade(base, top, fade=0.15):
+    """`top` over `base` with a linear fade to `base` over `fade` of the width at both edges
+    (blend_fixed_seam.py), so the result still joins its neighbours."""
+    h, w = base.shape[:2]
+    if top.shape[:2] != (h, w):
+        top = resize(top, (w, h), 'lanczos')
+    n = max(int(w * fade), 1)
+    x = np.arange(w)
+    mask = np.minimum(np.minimum(x / n, (w - 1 - x) / n), 1.0).astype(np.float32)[None, :, None]
+    return np.rint(top * mask + base * (1 - mask)).astype(np.uint8)
+
+
+@op
+def seamless(*tiles, overlap=0.15, levels=None):
+    """Join tiles into one background that wraps seamlessly, multi-band blending each overlap (seam_blend.py)."""
+    return blend_tiles(list(tiles), overlap, levels)[0]
+
+
+@op
+def recolor_hsv(img, hue=(15, 40), min_sat=100, min_val=100, target_hue=None, sat=1.0, val=1.0,
+                set_sat=None, protect_rows=None):
+    """Recolour one hue band through a compiled colour table (recolor.py; was recolor_bus.py,
+    recolor_bus_white.py). OpenCV hue units (0-179); hue[0] > hue[1] wraps through red.
+    protect_rows: [start, end) rows left untouched, e.g. the bus stripe."""
+    rule = Rule(tuple(hue), min_sat, min_val, target_hue, sat, val, set_sat,
+                tuple(protect_rows) if protect_rows is not None else None)
+    return recolor(img, rule)
+
+
+# ===== Step graph =====
+class Step:
+    def __init__(self, op_name, params, inputs):
+        self.op = op_name
+        self.params = params
+        self.inputs = inputs  # step ids or ('file', path)
+        self.key = None
+
+
+class Graph:
+    """Steps parsed from the manifest, deduplicated by content."""
+    def __init__(self, manifest):
+        self.steps = {}
+        self.named = manifest.get('steps', {})
+        self.resolved = {}
+        self.outputs = {path: self.add(spec) for path, spec in manifest['outputs'].items()}
+
+    def add(self, spec):
+        if isinstance(spec, str):
+            if spec.startswith('@'):
+                name = spec[1:]
+                if name not in self.named:
+                    raise KeyError(f"unknown step @{name}")
+                if name not in self.resolved:
+                    self.resolved[name] = self.add(self.named[name])
+                return self.resolved[name]
+            return ('file', spec)
+        spec = dict(spec)
+        op_name = spec.pop('op')
+        if op_name not in OPS:
+            raise KeyError(f"unknown op '{op_name}' (available: {', '.join(sorted(OPS))})")
+        inputs = spec.pop('inputs', None) or [spec.pop('input')]
+        step = Step(op_name, spec, [self.add(i) for i in inputs])
+        step_id = json.dumps([op_name, spec, step.inputs], sort_keys=True)
+        self.steps.setdefault(step_id, step)
+        return step_id
+
+    def sources(self, node):
+        if isinstance(node, tuple):
+            return {node[1]}
+        return set().union(*(self.sources(i) for i in self.steps[node].inputs))
+
+    def upstream(self, node):
+        """Step ids `node` depends on, including itself, dependencies first."""
+        if isinstance(node, tuple):
+            return []
+        order = []
+        for i in self.steps[node].inputs:
+            order += [s for s in self.upstream(i) if s not in order]
+        return order + [node]
+
+
+class Cache:
+    """.asset_cache/index.json: file hashes memoized by (mtime, size) and the key each output was built from."""
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+        self.steps_dir = os.path.join(root, 'steps')
+        os.makedirs(self.steps_dir, exist_ok=True)
+        self.index_path = os.path.join(root, 'index.json')
+        self.index = {'files': {}, 'outputs': {}}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as f:
+                self.index = json.load(f)
+
+    def file_hash(self, path):
+        st = os.stat(path)
+        memo = self.index['files'].get(path)
+        if memo and memo[:2] == [st.st_mtime_ns, st.st_size]:
+            return memo[2]
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+        self.index['files'][path] = [st.st_mtime_ns, st.st_size, h.hexdigest()]
+        return h.hexdigest()
+
+    def step_path(self, key):
+        return os.path.join(self.steps_dir, f'{key}.png')
+
+    def save(self):
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=1)
+
+
+_op_hashes = {}
+
+
+def op_hash(name):
+    """Hash of the op's source plus that of any other repo module it calls into."""
+    if name not in _op_hashes:
+        fn = OPS[name]
+        sources = [inspect.getsource(fn)]
+        here = os.path.dirname(os.path.abspath(__file__))
+        for ref in fn.__code__.co_names:
+            module = inspect.getmodule(fn.__globals__.get(ref))
+            path = getattr(module, '__file__', None)
+            if module is not None and module.__name__ != fn.__module__ and path \
+                    and os.path.dirname(os.path.abspath(path)) == here:
+                sources.append(inspect.getsource(module))
+        _op_hashes[name] = hashlib.sha256(''.join(sources).encode()).hexdigest()
+    return _op_hashes[name]
+
+
+def compute_keys(graph, cache):
+    """Content key of every node, sources first. Missing sources leave their dependants unkeyed."""
+    keys = {}
+
+    def key(node):
+        if isinstance(node, tuple):
+            path = node[1]
+            return cache.file_hash(path) if os.path.exists(path) else None
+        if node not in keys:
+            step = graph.steps[node]
+            input_keys = [key(i) for i in step.inputs]
+            keys[node] = None if None in input_keys else hashlib.sha256(json.dumps(
+                [BUILD_VERSION, step.op, op_hash(step.op), step.params, input_keys], sort_keys=True).encode()
+            ).hexdigest()
+        return keys[node]
+
+    for node in graph.outputs.values():
+        key(node)
+    return keys
+
+
+def run_step(op_name, params, input_paths, out_path):
+    """Worker: load inputs, apply the op, write the result to the cache."""
+    t0 = time.perf_counter()
+    result = OPS[op_name](*[load_image(p) for p in input_paths], **params)
+    tmp = out_path + '.tmp.png'
+    save_image(tmp, result)
+    os.replace(tmp, out_path)
+    return time.perf_counter() - t0
+
+
+def build(manifest_path=MANIFEST, targets=None, force=False, dry_run=False, workers=None):
+    t0 = time.perf_counter()
+    with open(manifest_path, encoding='utf-8') as f:
+        graph = Graph(json.load(f))
+    cache = Cache()
+    keys = compute_keys(graph, cache)
+
+    outputs = {p: n for p, n in graph.outputs.items() if not targets or p in targets}
+    unknown = set(targets or []) - set(outputs)
+    if unknown:
+        print(f"Error: not in {manifest_path}: {', '.join(sorted(unknown))}")
+        sys.exit(1)
+
+    failed, stale = [], {}
+    for path, node in outputs.items():
+        if keys[node] is None:
+            missing = sorted(s for s in graph.sources(node) if not os.path.exists(s))
+            print(f"❌ {path}: missing source {', '.join(missing)}")
+            failed.append(path)
+            continue
+        built = cache.index['outputs'].get(path)
+        up_to_date = (built and built['key'] == keys[node] and os.path.exists(path)
+                      and cache.file_hash(path) == built['sha'])
+        if force or not up_to_date:
+            stale[path] = node
+
+    # Steps whose result isn't cached yet, dependencies first
+    todo = []
+    for node in stale.values():
+        todo += [s for s in graph.upstream(node)
+                 if s not in todo and (force or not os.path.exists(cache.step_path(keys[s])))]
+    if dry_run:
+        for path in stale:
+            print(f"  stale: {path}")
+        print(f"{len(stale)} output(s) stale, {len(todo)} step(s) to run")
+        cache.save()
+        return
+
+    if todo:
+        workers = workers or min(len(todo), os.cpu_count())
+        done, pending = set(), {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while len(done) < len(todo):
+                for s in todo:
+                    step = graph.steps[s]
+                    deps = [i for i in step.inputs if not isinstance(i, tuple)]
+                    if s not in done and s not in pending.values() and all(d in done or d not in todo for d in deps):
+                        paths = [i[1] if isinstance(i, tuple) else cache.step_path(keys[i]) for i in step.inputs]
+                        pending[pool.submit(run_step, step.op, step.params, paths, cache.step_path(keys[s]))] = s
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    s = pending.pop(future)
+                    print(f"  {graph.steps[s].op:<12} {keys[s][:12]}  {future.result() * 1000:7.1f} ms")
+                    done.add(s)
+
+    for path, node in stale.items():
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        shutil.copyfile(cache.step_path(keys[node]), path)
+        cache.index['outputs'][path] = {'key': keys[node], 'sha': cache.file_hash(path)}
+        print(f"✅ {path}")
+    cache.save()
+
+    fresh = len(outputs) - len(stale) - len(failed)
+    print(f"\n{len(stale)} rebuilt, {fresh} up to date, {len(failed)} failed "
+          f"({len(todo)} step(s) run) in {time.perf_counter() - t0:.2f}s")
+    if failed:
+        sys.exit(1)
+
+
+def prune_cache(manifest_path=MANIFEST):
+    """Delete cached step results the current manifest no longer produces."""
+    with open(manifest_path, encoding='utf-8') as f:
+        graph = Graph(json.load(f))
+    cache = Cache()
+    live = {f'{k}.png' for k in compute_keys(graph, cache).values() if k}
+    removed = 0
+    for name in os.listdir(cache.steps_dir):
+        if name not in live:
+            os.remove(os.path.join(cache.steps_dir, name))
+            removed += 1
+    cache.index['files'] = {p: v for p, v in cache.index['files'].items() if os.path.exists(p)}
+    cache.save()
+    print(f"Removed {removed} stale cache entr{'y' if removed == 1 else 'ies'}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Build img/ assets from assets.json, rebuilding only stale outputs.')
+    parser.add_argument('targets', nargs='*', help='outputs to build (default: all)')
+    parser.add_argument('--manifest', default=MANIFEST)
+    parser.add_argument('--force', action='store_true', help='ignore the cache')
+    parser.add_argument('--dry-run', action='store_true', help='list stale outputs without building')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: all cores)')
+    parser.add_argument('--prune', action='store_true', help='delete unused cache entries and exit')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.prune:
+        prune_cache(args.manifest)
+    else:
+        build(args.manifest, args.targets, args.force, args.dry_run, args.workers)
@@ -0,0 +1,208 @@
+"""
+compositing.py — Fixed-point, premultiplied-alpha layer compositing.
+
+Replaces the composite_alpha() copied between adhoc_scripts/composite_bus*.py, which
+widens both images to float64 and blends one layer per call, channel by channel. Here
+a whole layer stack is composited in one pass over the canvas:
+  • every layer is premultiplied once (shared arrays once per stack), with OpenCV's
+    exact mRGBA conversion
+  • "over" is dst = src + dst·(255 − src_a)/255 with exact rounding division by 255,
+    computed two channels at a time in 16-bit lanes of each pixel's uint32, and
+    written back into the canvas in place
+  • the canvas is walked in row strips; each strip gets every layer that overlaps it,
+    clipped to the canvas, then is converted back to straight alpha
+so the only temporaries are strip-sized uint32 buffers.
+
+    from compositing import Layer, composite
+    sheet = composite([Layer(bus, x, y), Layer(sunnie, x + 90, y + 30)], size=(1920, 210))
+
+    python compositing.py bench        # vs. composite_alpha on a 1920×210 minibus sheet
+"""
+
+import time
+import argparse
+import tracemalloc
+from collections import namedtuple
+import cv2
+import numpy as np
+
+# ===== Configuration =====
+STRIP_ROWS = 64
+
+# A straight-alpha RGBA uint8 image placed with its top-left corner at (x, y); may hang off the canvas
+Layer = namedtuple('Layer', ['image', 'x', 'y'])
+
+
+# Two 8-bit channels per uint32 in 16-bit lanes: R|B and G|A of little-endian RGBA pixels
+LANES = np.uint32(0x00FF00FF)
+
+
+def _div255_lanes(x):
+    """Exact round(v / 255) for each 16-bit lane value v <= 255², in place."""
+    x += np.uint32(0x00800080)
+    x += (x >> 8) & LANES
+    x >>= 8
+    x &= LANES
+
+
+def as_pixels(img):
+    """(H, W, 4) uint8 view -> (H, W) uint32 view of the same memory."""
+    return img.view(np.uint32)[..., 0]
+
+
+def premultiply(img):
+    """Straight RGBA uint8 -> (premultiplied RGBA as uint32 pixels, 255 − alpha as uint8)."""
+    premultiplied = cv2.cvtColor(np.ascontiguousarray(img), cv2.COLOR_RGBA2mRGBA)
+    return as_pixels(premultiplied), 255 - premultiplied[..., 3]
+
+
+def unpremultiply(img):
+    """Premultiplied RGBA uint8 (contiguous) -> straight alpha, in place."""
+    return cv2.cvtColor(img, cv2.COLOR_mRGBA2RGBA, dst=img)
+
+
+def over(dst, src, inv_alpha, scratch):
+    """Premultiplied src pixels over dst pixels (uint32 views), in place. scratch: uint32, at least 2× dst's shape."""
+    h, w = dst.shape
+    lo, hi = scratch[0, :h, :w], scratch[1, :h, :w]
+    # dst·(255 − src_a)/255 on R|B, then on G|A shifted down
+    np.bitwise_and(dst, LANES, out=lo)
+    lo *= inv_alpha
+    _div255_lanes(lo)
+    np.right_shift(dst, 8, out=hi)
+    hi &= LANES
+    hi *= inv_alpha
+    _div255_lanes(hi)
+    hi <<= 8
+    lo |= hi
+    # src_c <= src_a and the scaled dst_c <= 255 - src_a, so no lane carries into the next
+    np.add(lo, src, out=dst)
+
+
+def composite(layers, size=None, base=None, strip_rows=STRIP_ROWS):
+    """
+    Composite `layers` bottom to top over `base` (straight RGBA, copied) or a transparent
+    canvas of `size` (width, height). Returns a straight-alpha RGBA uint8 image.
+    """
+    if base is not None:
+        pixels, _ = premultiply(base)
+        canvas = pixels.view(np.uint8).reshape(*pixels.shape, 4)
+    else:
+        canvas = np.zeros((size[1], size[0], 4), np.uint8)
+    height, width = canvas.shape[:2]
+
+    premultiplied = {}
+    placed = []
+    for image, x, y in layers:
+        # Skip layers entirely off the canvas; premultiply each distinct array once
+        if x >= width or y >= height or x + image.shape[1] <= 0 or y + image.shape[0] <= 0:
+            continue
+        if id(image) not in premultiplied:
+            premultiplied[id(image)] = premultiply(image)
+        placed.append((*premultiplied[id(image)], x, y))
+
+    widest = max((src.shape[1] for src, _, _, _ in placed), default=0)
+    scratch = np.empty((2, strip_rows, min(widest, width)), np.uint32)
+    for top in range(0, height, strip_rows):
+        bottom = min(top + strip_rows, height)
+        strip = canvas[top:bottom]
+        dst = as_pixels(strip)
+        for src, inv_alpha, x, y in placed:
+            y0, y1 = max(y, top), min(y + src.shape[0], bottom)
+            x0, x1 = max(x, 0), min(x + src.shape[1], width)
+            if y1 <= y0 or x1 <= x0:
+                continue
+            region = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+            over(dst[y0 - top:y1 - top, x0:x1], src[region], inv_alpha[region], scratch)
+        unpremultiply(strip)
+    return canvas
+
+
+def composite_alpha(bg, fg, x, y):
+    """The float64 one-layer version from adhoc_scripts/composite_bus_v2.py, kept as the benchmark baseline."""
+    h_bg, w_bg = bg.shape[:2]
+    h_fg, w_fg = fg.shape[:2]
+    y1, y2 = max(y, 0), min(y + h_fg, h_bg)
+    x1, x2 = max(x, 0), min(x + w_fg, w_bg)
+    if y2 <= y1 or x2 <= x1:
+        return
+    fg_crop = fg[y1 - y:y2 - y, x1 - x:x2 - x]
+    bg_crop = bg[y1:y2, x1:x2]
+    alpha_fg = fg_crop[:, :, 3] / 255.0
+    alpha_bg = bg_crop[:, :, 3] / 255.0
+    for c in range(0, 3):
+        bg_crop[:, :, c] = (alpha_fg * fg_crop[:, :, c] + alpha_bg * bg_crop[:, :, c] * (1 - alpha_fg))
+    bg_crop[:, :, 3] = (alpha_fg * 255 + alpha_bg * 255 * (1 - alpha_fg)).astype(np.uint8)
+    bg[y1:y2, x1:x2] = bg_crop
+
+
+def sheet_layers(frame=(640, 210), offsets=(0, 4, 2)):
+    """The minibus sheet as a layer stack: bus, Sunnie in the window and a soft shadow per frame."""
+    from image_io import load_image
+    from build_assets import trim, fit
+
+    bus = fit(trim(load_image('img/sunnie_minibus_no_bg.png')), frame)
+    sunnie = trim(load_image('img/sunnie_pose_1.png'))
+    sh = int(bus.shape[0] * 0.45)
+    sunnie = cv2.resize(sunnie, (int(sunnie.shape[1] * sh / sunnie.shape[0]), sh), interpolation=cv2.INTER_AREA)
+    shadow = np.zeros((24, bus.shape[1], 4), np.uint8)
+    shadow[..., 3] = np.linspace(96, 0, 24, dtype=np.uint8)[:, None]
+
+    fw, fh = frame
+    bx, by = (fw - bus.shape[1]) // 2, fh - bus.shape[0] - 10
+    layers = []
+    for i, dy in enumerate(offsets):
+        x, y = i * fw + bx, by + dy
+        layers += [Layer(shadow, x, y + bus.shape[0] - 12), Layer(bus, x, y),
+                   Layer(sunnie, x + int(bus.shape[1] * 0.35), y + int(bus.shape[0] * 0.15))]
+    return layers, (fw * len(offsets), fh)
+
+
+def bench(runs=20):
+    layers, size = sheet_layers()
+
+    def legacy():
+        sheet = np.zeros((size[1], size[0], 4), np.uint8)
+        for image, x, y in layers:
+            composite_alpha(sheet, image, x, y)
+        return sheet
+
+    def fixed():
+        return composite(layers, size)
+
+    results = {}
+    for name, fn in [('composite_alpha (float64)', legacy), ('composite (fixed-point)', fixed)]:
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            out = fn()
+        ms = (time.perf_counter() - t0) / runs * 1000
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = (ms, peak - out.nbytes, out)
+
+    print(f"{len(layers)} layers on a {size[0]}×{size[1]} sheet, {runs} runs\n")
+    # The output sheet itself is the same for both; the rest is temporaries
+    print(f"{'':<28}{'time (ms)':>10}{'temporaries (MB)':>18}")
+    for name, (ms, temporaries, _) in results.items():
+        print(f"{name:<28}{ms:>10.2f}{temporaries / 2 ** 20:>18.2f}")
+    (t_old, m_old, a), (t_new, m_new, b) = results.values()
+    opaque = a[..., 3] == 255
+    diff = np.abs(a.astype(np.int16) - b)
+    print(f"\n{t_old / t_new:.1f}x faster, {m_old / m_new:.1f}x less temporary memory; "
+          f"max difference {diff[opaque].max()} on opaque pixels, {diff[..., 3].max()} in alpha")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Fixed-point premultiplied-alpha compositing.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('bench', help='compare with composite_alpha on the minibus sheet')
+    p.add_argument('--runs', type=int, default=20)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    bench(args.runs)
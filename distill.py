@@ -0,0 +1,218 @@
+"""
+distill.py — Knowledge distillation of DigitCNN into smaller student models.
+
+The trained model/digit_cnn.pt is the teacher. Each student is trained on MNIST
+(with the usual batched affine augmentation) against a mix of the teacher's
+temperature-softened logits and the true labels:
+
+    loss = α·T²·KL(softmax(student/T) ‖ softmax(teacher/T)) + (1 − α)·CE(student, labels)
+
+Students keep DigitCNN's layout (3 conv blocks → Flatten → Dropout → Linear) but are
+narrower and/or use depthwise-separable convs in blocks 2 and 3. After training, each
+one is exported to ONNX and timed with onnxruntime on CPU, and a latency-vs-accuracy
+table is printed. The chosen student is saved as model/digit_cnn_student.onnx with
+the same `input`/`output` names. --install also writes it over model/digit_cnn.onnx,
+which js/recognition/digitCNN.js loads unchanged.
+
+    python distill.py                              # all students, auto-pick
+    python distill.py --students dws narrow --epochs 4 --pick dws --install
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torch.optim as optim
+
+import get_mnist_model as mnist
+from mnist_data import MNISTArrays, BatchLoader
+from onnx_export import export_onnx
+from quantize import measure_latency
+
+# ===== Configuration =====
+TEMPERATURE = 4.0
+# Weight of the distillation term; the rest goes to the hard-label loss
+ALPHA = 0.7
+# Auto-pick: fastest student within this many accuracy points of the teacher
+MAX_DROP = 0.5
+# name -> (block widths, depthwise-separable blocks 2 and 3)
+STUDENTS = {
+    'narrow': ((8, 16, 32), False),
+    'dws': ((16, 32, 64), True),
+    'dws-narrow': ((8, 16, 32), True),
+}
+
+
+def _block(in_ch, out_ch, separable):
+    if separable:
+        convs = [nn.Conv2d(in_ch, in_ch, 3, padding=1, groups=in_ch, bias=False),
+                 nn.Conv2d(in_ch, out_ch, 1)]
+    else:
+        convs = [nn.Conv2d(in_ch, out_ch, 3, padding=1)]
+    return convs + [nn.BatchNorm2d(out_ch), nn.ReLU(inplace=True), nn.MaxPool2d(2, 2)]
+
+
+class StudentCNN(nn.Module):
+    """DigitCNN-shaped student: 28x28 -> 14x14 -> 7x7 -> 3x3, then a linear head."""
+    def __init__(self, widths=(16, 32, 64), separable=False, num_classes=10):
+        super().__init__()
+        # A depthwise conv over the single input channel saves nothing, so block 1 stays a full conv
+        self.features = nn.Sequential(
+            *_block(1, widths[0], False),
+            *_block(widths[0], widths[1], separable),
+            *_block(widths[1], widths[2], separable),
+        )
+        self.classifier = nn.Sequential(
+            nn.Flatten(),
+            nn.Dropout(0.3),
+            nn.Linear(widths[2] * 3 * 3, num_classes),
+        )
+
+    def forward(self, x):
+        x = self.features(x)
+        x = self.classifier(x)
+        return x
+
+
+def build_student(name):
+    widths, separable = STUDENTS[name]
+    return StudentCNN(widths, separable)
+
+
+def distillation_loss(student_logits, teacher_logits, labels, temperature=TEMPERATURE, alpha=ALPHA):
+    soft = F.kl_div(F.log_softmax(student_logits / temperature, dim=1),
+                    F.log_softmax(teacher_logits / temperature, dim=1),
+                    reduction='batchmean', log_target=True)
+    hard = F.cross_entropy(student_logits, labels)
+    return alpha * temperature ** 2 * soft + (1 - alpha) * hard
+
+
+def load_teacher(checkpoint=None):
+    checkpoint = checkpoint or os.path.join(mnist.MODEL_DIR, 'digit_cnn.pt')
+    teacher = mnist.DigitCNN(num_classes=10)
+    teacher.load_state_dict(torch.load(checkpoint, map_location='cpu', weights_only=True))
+    return teacher.to(mnist.DEVICE).eval()
+
+
+def distill(student, teacher, train_batches, epochs=mnist.EPOCHS, lr=mnist.LR, temperature=TEMPERATURE,
+            alpha=ALPHA, seed=mnist.SEED, name='student'):
+    """Train `student` against `teacher`. Returns the training time in seconds."""
+    torch.manual_seed(seed)
+    student.to(mnist.DEVICE)
+    optimizer = optim.Adam(student.parameters(), lr=lr)
+    scheduler = optim.lr_scheduler.StepLR(optimizer, step_size=mnist.STEP_SIZE, gamma=mnist.GAMMA)
+
+    t0 = time.perf_counter()
+    for epoch in range(epochs):
+        student.train()
+        # Loss stays on-device and is synced once per epoch
+        total_loss = torch.zeros((), device=mnist.DEVICE)
+        steps = 0
+        for images, labels in train_batches(epoch):
+            images, labels = images.to(mnist.DEVICE), labels.to(mnist.DEVICE)
+            with torch.no_grad():
+                teacher_logits = teacher(images)
+            optimizer.zero_grad()
+            loss = distillation_loss(student(images), teacher_logits, labels, temperature, alpha)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.detach()
+            steps += 1
+        scheduler.step()
+        print(f"[{name}] Epoch {epoch + 1:2d}/{epochs}  kd_loss={total_loss.item() / max(steps, 1):.4f}")
+    return time.perf_counter() - t0
+
+
+def profile(model, test_loader, onnx_path):
+    """Test accuracy, params, and size/latency of the exported ONNX model."""
+    acc = mnist.evaluate_model(model.to(mnist.DEVICE), test_loader)
+    export_onnx(model, onnx_path, mnist.IMG_SIZE)
+    return {
+        'accuracy': acc,
+        'params': sum(p.numel() for p in model.parameters()),
+        'size_kb': os.path.getsize(onnx_path) / 1024,
+        'latency_ms': measure_latency(onnx_path),
+    }
+
+
+def pick_student(rows, teacher_row, max_drop=MAX_DROP):
+    """Fastest student within `max_drop` points of the teacher, or None."""
+    eligible = [name for name, r in rows.items() if teacher_row['accuracy'] - r['accuracy'] <= max_drop]
+    return min(eligible, key=lambda name: rows[name]['latency_ms']) if eligible else None
+
+
+def print_table(rows, teacher_row, chosen=None):
+    print(f"\n{'model':<14}{'params':>9}{'size (KB)':>11}{'latency (ms)':>14}{'speedup':>9}{'test acc':>10}{'Δ acc':>8}")
+    for name, r in [('teacher', teacher_row)] + list(rows.items()):
+        speedup = teacher_row['latency_ms'] / r['latency_ms']
+        marker = '  ←' if name == chosen else ''
+        print(f"{name:<14}{r['params']:>9,}{r['size_kb']:>11.1f}{r['latency_ms']:>14.3f}{speedup:>8.2f}x"
+              f"{r['accuracy']:>9.2f}%{r['accuracy'] - teacher_row['accuracy']:>+8.2f}{marker}")
+
+
+def run(students=tuple(STUDENTS), epochs=mnist.EPOCHS, temperature=TEMPERATURE, alpha=ALPHA, seed=mnist.SEED,
+        pick=None, max_drop=MAX_DROP, install=False, checkpoint=None):
+    print(f"Device: {mnist.DEVICE}  students: {', '.join(students)}  T={temperature}  α={alpha}")
+    teacher = load_teacher(checkpoint)
+    train_data = MNISTArrays('train')
+    test_loader = BatchLoader(MNISTArrays('test'), batch_size=1000, device=mnist.DEVICE)
+    train_batches = mnist.build_train_batches('batch', train_data, seed, epochs=epochs)
+
+    models, rows = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        teacher_row = profile(teacher, test_loader, os.path.join(tmp, 'teacher.onnx'))
+        teacher.to(mnist.DEVICE)
+        for name in students:
+            student = build_student(name)
+            seconds = distill(student, teacher, train_batches, epochs, temperature=temperature,
+                              alpha=alpha, seed=seed, name=name)
+            models[name] = student
+            rows[name] = {**profile(student, test_loader, os.path.join(tmp, f'{name}.onnx')),
+                          'train_seconds': seconds}
+
+    if pick is not None and pick not in models:
+        raise ValueError(f"--pick {pick} is not among the trained students ({', '.join(students)})")
+    chosen = pick or pick_student(rows, teacher_row, max_drop)
+    print_table(rows, teacher_row, chosen)
+    if chosen is None:
+        print(f"\n❌ No student is within {max_drop} accuracy points of the teacher; nothing exported")
+        sys.exit(1)
+
+    student = models[chosen]
+    onnx_path = os.path.join(mnist.MODEL_DIR, 'digit_cnn_student.onnx')
+    torch.save({'arch': chosen, 'state_dict': student.state_dict()},
+               os.path.join(mnist.MODEL_DIR, 'digit_cnn_student.pt'))
+    export_onnx(student, onnx_path, mnist.IMG_SIZE)
+    print(f"\n✅ Student '{chosen}' exported to {onnx_path}")
+    if install:
+        shutil.copyfile(onnx_path, os.path.join(mnist.MODEL_DIR, 'digit_cnn.onnx'))
+        print(f"   and installed as {os.path.join(mnist.MODEL_DIR, 'digit_cnn.onnx')} "
+              "(digit_cnn.pt still holds the teacher)")
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Distill DigitCNN into smaller student models.')
+    parser.add_argument('--students', nargs='+', choices=list(STUDENTS), default=list(STUDENTS))
+    parser.add_argument('--teacher', default=None, help='teacher state dict (default: model/digit_cnn.pt)')
+    parser.add_argument('--epochs', type=int, default=mnist.EPOCHS)
+    parser.add_argument('--temperature', type=float, default=TEMPERATURE)
+    parser.add_argument('--alpha', type=float, default=ALPHA, help='weight of the distillation term')
+    parser.add_argument('--seed', type=int, default=mnist.SEED)
+    parser.add_argument('--pick', choices=list(STUDENTS), default=None,
+                        help='student to export (default: fastest within --max-drop of the teacher)')
+    parser.add_argument('--max-drop', type=float, default=MAX_DROP)
+    parser.add_argument('--install', action='store_true',
+                        help='also overwrite model/digit_cnn.onnx with the chosen student')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    run(students=args.students, epochs=args.epochs, temperature=args.temperature, alpha=args.alpha,
+        seed=args.seed, pick=args.pick, max_drop=args.max_drop, install=args.install, checkpoint=args.teacher)
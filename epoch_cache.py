@@ -0,0 +1,251 @@
+"""
+epoch_cache.py — Offline augmented-epoch cache for MNIST training.
+
+A process pool renders N augmented epochs ahead of time into sharded uint8
+.npy memmaps, so training only has to stream pre-warped images from disk.
+
+Layout:
+    data/MNIST/epoch_cache/<key>/epoch_0003/shard_000.npy
+                                           /meta.json
+
+<key> is a hash of everything that changes the pixels (augmentation params,
+RNG seed, source dataset), so hyperparameter changes that don't touch
+augmentation reuse the same shards. The directory is size-bounded: once it
+grows past `max_bytes` the oldest epochs are evicted.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import torch
+
+from augment import DEGREES, TRANSLATE, SCALE, batch_random_affine
+from mnist_data import DATA_ROOT, MNISTArrays, normalize
+
+# ===== Configuration =====
+CACHE_DIR = os.path.join(DATA_ROOT, 'MNIST', 'epoch_cache')
+SHARD_SIZE = 10000
+MAX_BYTES = 2 * 1024 ** 3
+CACHE_VERSION = 1
+
+
+def augment_params(degrees=DEGREES, translate=TRANSLATE, scale=SCALE, mode='nearest'):
+    """Augmentation settings as a JSON-friendly dict (stored in shard metadata)."""
+    return {'degrees': degrees, 'translate': list(translate), 'scale': list(scale), 'mode': mode}
+
+
+def cache_key(params, seed, data):
+    """Hash of everything that affects the rendered pixels."""
+    fingerprint = {
+        'version': CACHE_VERSION,
+        'augment': params,
+        'seed': seed,
+        'split': data.split,
+        'num_images': len(data),
+        # The pixels themselves, so a replaced or re-extracted image file with the same labels misses
+        'images': hashlib.sha1(np.ascontiguousarray(data.images.numpy())).hexdigest(),
+        'labels': hashlib.sha1(data.labels.numpy().tobytes()).hexdigest(),
+    }
+    blob = json.dumps(fingerprint, sort_keys=True).encode()
+    return hashlib.sha1(blob).hexdigest()[:16]
+
+
+def shard_seed(seed, epoch, shard):
+    """Independent, reproducible RNG stream for one shard of one epoch."""
+    return int(np.random.SeedSequence([seed, epoch, shard]).generate_state(1, dtype=np.uint64)[0] >> 1)
+
+
+def _init_worker():
+    # One intra-op thread per process; the pool provides the parallelism
+    torch.set_num_threads(1)
+
+
+def render_shard(job):
+    """Worker: augment images[start:end] of the source split and write them as a uint8 .npy shard."""
+    split, root, start, end, params, seed, epoch, shard, out_path = job
+    images = MNISTArrays(split, root).images[start:end]
+    generator = torch.Generator().manual_seed(shard_seed(seed, epoch, shard))
+
+    tmp_path = out_path + '.tmp.npy'
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=tuple(images.shape))
+    for i in range(0, images.shape[0], 1024):
+        batch = images[i:i + 1024].unsqueeze(1).float().div_(255.0)
+        warped = batch_random_affine(batch, params['degrees'], tuple(params['translate']),
+                                     tuple(params['scale']), params['mode'], generator=generator)
+        out[i:i + batch.shape[0]] = warped.squeeze(1).mul_(255.0).round_().clamp_(0, 255).to(torch.uint8).numpy()
+    out.flush()
+    del out
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+class EpochCache:
+    """Augmented epochs of one MNIST split for a fixed augmentation + seed."""
+    def __init__(self, data, seed=0, params=None, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES,
+                 shard_size=SHARD_SIZE, root=DATA_ROOT):
+        self.data = data
+        self.seed = seed
+        self.params = params or augment_params()
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.shard_size = shard_size
+        self.root = root
+        self.key = cache_key(self.params, seed, data)
+        self.key_dir = os.path.join(cache_dir, self.key)
+
+    def epoch_dir(self, epoch):
+        return os.path.join(self.key_dir, f"epoch_{epoch:04d}")
+
+    def has_epoch(self, epoch):
+        return os.path.exists(os.path.join(self.epoch_dir(epoch), 'meta.json'))
+
+    def pregenerate(self, epochs, workers=None):
+        """Render any missing epochs in `epochs` with a process pool. Returns the epochs rendered."""
+        missing = [e for e in epochs if not self.has_epoch(e)]
+        if not missing:
+            return []
+
+        n = len(self.data)
+        jobs = []
+        for epoch in missing:
+            os.makedirs(self.epoch_dir(epoch), exist_ok=True)
+            for shard, start in enumerate(range(0, n, self.shard_size)):
+                out_path = os.path.join(self.epoch_dir(epoch), f"shard_{shard:03d}.npy")
+                jobs.append((self.data.split, self.root, start, min(start + self.shard_size, n),
+                             self.params, self.seed, epoch, shard, out_path))
+
+        t0 = time.perf_counter()
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            list(pool.map(render_shard, jobs))
+
+        for epoch in missing:
+            self._write_meta(epoch)
+        elapsed = time.perf_counter() - t0
+        print(f"Rendered {len(missing)} augmented epoch(s) with {workers} workers in {elapsed:.1f}s "
+              f"({len(missing) * n / elapsed:.0f} samples/s) -> {self.key_dir}")
+
+        evict(self.cache_dir, self.max_bytes, keep=[self.epoch_dir(e) for e in epochs])
+        return missing
+
+    def _write_meta(self, epoch):
+        epoch_dir = self.epoch_dir(epoch)
+        n = len(self.data)
+        shards = []
+        for shard, start in enumerate(range(0, n, self.shard_size)):
+            shards.append({'file': f"shard_{shard:03d}.npy", 'start': start,
+                           'count': min(self.shard_size, n - start)})
+        meta = {
+            'key': self.key,
+            'epoch': epoch,
+            'seed': self.seed,
+            'augment': self.params,
+            'split': self.data.split,
+            'num_images': n,
+            'shards': shards,
+            'bytes': sum(os.path.getsize(os.path.join(epoch_dir, s['file'])) for s in shards),
+            'created': time.time(),
+        }
+        with open(os.path.join(epoch_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+    def load_epoch(self, epoch):
+        """Memory-map the shards of one epoch. Renders it first if it is not cached."""
+        if not self.has_epoch(epoch):
+            self.pregenerate([epoch])
+        epoch_dir = self.epoch_dir(epoch)
+        with open(os.path.join(epoch_dir, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+        shards = [torch.from_numpy(np.load(os.path.join(epoch_dir, s['file']), mmap_mode='c'))
+                  for s in meta['shards']]
+        return ShardedEpoch(shards, self.data.labels, meta['shards'][0]['count'])
+
+
+class ShardedEpoch:
+    """One cached epoch: uint8 shards plus the (unaugmented) label vector."""
+    def __init__(self, shards, labels, shard_size):
+        self.shards = shards
+        self.labels = labels
+        self.shard_size = shard_size
+
+    def __len__(self):
+        return self.labels.shape[0]
+
+    def gather(self, idx):
+        """Collect images for global indices `idx`, one indexed read per shard touched."""
+        out = torch.empty((idx.shape[0],) + tuple(self.shards[0].shape[1:]), dtype=torch.uint8)
+        shard_of = idx // self.shard_size
+        for s in shard_of.unique().tolist():
+            sel = (shard_of == s).nonzero(as_tuple=True)[0]
+            out[sel] = self.shards[s][idx[sel] - s * self.shard_size]
+        return out
+
+    def batches(self, batch_size=64, shuffle=True, device='cpu', generator=None):
+        """Yield normalized (images, labels) batches, same contract as mnist_data.BatchLoader."""
+        n = len(self)
+        order = torch.randperm(n, generator=generator) if shuffle else torch.arange(n)
+        for start in range(0, n, batch_size):
+            idx = order[start:start + batch_size]
+            images = self.gather(idx).to(device).unsqueeze(1).float().div_(255.0)
+            yield normalize(images), self.labels[idx].to(device)
+
+
+def _epoch_dirs(cache_dir):
+    """All cached epochs as (created, bytes, path), oldest first."""
+    epochs = []
+    if not os.path.isdir(cache_dir):
+        return epochs
+    for key in os.listdir(cache_dir):
+        key_dir = os.path.join(cache_dir, key)
+        if not os.path.isdir(key_dir):
+            continue
+        for name in os.listdir(key_dir):
+            epoch_dir = os.path.join(key_dir, name)
+            meta_path = os.path.join(epoch_dir, 'meta.json')
+            if os.path.exists(meta_path):
+                with open(meta_path, encoding='utf-8') as f:
+                    meta = json.load(f)
+                epochs.append((meta['created'], meta['bytes'], epoch_dir))
+    return sorted(epochs)
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_BYTES, keep=()):
+    """Delete the oldest cached epochs until the cache fits in `max_bytes`."""
+    epochs = _epoch_dirs(cache_dir)
+    total = sum(size for _, size, _ in epochs)
+    keep = {os.path.abspath(p) for p in keep}
+    for _, size, epoch_dir in epochs:
+        if total <= max_bytes:
+            break
+        if os.path.abspath(epoch_dir) in keep:
+            continue
+        shutil.rmtree(epoch_dir)
+        total -= size
+        print(f"Evicted {epoch_dir} ({size / 1024 ** 2:.0f} MB)")
+
+        key_dir = os.path.dirname(epoch_dir)
+        if not os.listdir(key_dir):
+            os.rmdir(key_dir)
+    if total > max_bytes:
+        print(f"⚠️  Epoch cache is {total / 1024 ** 2:.0f} MB, over its {max_bytes / 1024 ** 2:.0f} MB budget")
+    return total
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Pre-render augmented MNIST epochs into the epoch cache.')
+    parser.add_argument('--epochs', type=int, default=6, help='number of augmented epochs to render')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: all cores)')
+    parser.add_argument('--max-gb', type=float, default=MAX_BYTES / 1024 ** 3, help='cache size budget')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    cache = EpochCache(MNISTArrays('train'), seed=args.seed, max_bytes=int(args.max_gb * 1024 ** 3))
+    cache.pregenerate(range(args.epochs), workers=args.workers)
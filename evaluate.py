@@ -0,0 +1,170 @@
+"""
+evaluate.py — Standalone batched evaluation of .pt and .onnx digit/Greek models.
+
+Scores a PyTorch checkpoint (digit_cnn.pt / greek_cnn.pth) or an ONNX model
+(digit_cnn.onnx, greek_cnn.onnx, quantized variants...) on a test set in large
+batches. ONNX models run through onnxruntime with a configurable number of
+intra-op threads. Prints accuracy, a per-class confusion matrix and throughput.
+
+    python evaluate.py model/digit_cnn.onnx --threads 4
+    python evaluate.py model/digit_cnn.pt
+    python evaluate.py model/greek_cnn.onnx --data data/greek_test.npz
+
+28×28 models default to the MNIST test set. Other input sizes need --data: an
+.npz with `images` (N, H, W) uint8 (light strokes on dark) and `labels` (N,).
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+# ===== Configuration =====
+MODEL_DIR = os.path.join(os.path.dirname(__file__), 'model')
+BATCH_SIZE = 2048
+
+
+def load_torch_predictor(path):
+    """Wrap a DigitCNN/GreekCNN state dict as predict(np batch) -> np logits."""
+    import torch
+    state = torch.load(path, map_location='cpu', weights_only=True)
+    # GreekCNN's head is Pool → Flatten → Dropout → Linear, DigitCNN's is Flatten → Dropout → Linear
+    if 'classifier.3.weight' in state:
+        from export_onnx import GreekCNN, IMG_SIZE
+        model = GreekCNN(num_classes=state['classifier.3.weight'].shape[0])
+    else:
+        from get_mnist_model import DigitCNN, IMG_SIZE
+        model = DigitCNN(num_classes=state['classifier.2.weight'].shape[0])
+    model.load_state_dict(state)
+    model.eval()
+
+    def predict(batch):
+        with torch.inference_mode():
+            return model(torch.from_numpy(batch)).numpy()
+    return predict, IMG_SIZE
+
+
+def create_session(path, threads=None, opt_level=None):
+    """onnxruntime CPU session with a fixed intra-op thread count (None = ORT default)."""
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    if opt_level is not None:
+        options.graph_optimization_level = opt_level
+    return ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+
+def load_onnx_predictor(path, threads=None):
+    """Wrap an ONNX model as predict(np batch) -> np logits."""
+    session = create_session(path, threads)
+    input_meta = session.get_inputs()[0]
+    img_size = input_meta.shape[-1]
+    output_name = session.get_outputs()[0].name
+
+    def predict(batch):
+        return session.run([output_name], {input_meta.name: batch})[0]
+    return predict, img_size
+
+
+def load_predictor(path, threads=None):
+    if path.endswith('.onnx'):
+        return load_onnx_predictor(path, threads)
+    return load_torch_predictor(path)
+
+
+def load_test_set(img_size, data=None):
+    """Normalized float32 (N, 1, S, S) test images in [-1, 1] and int64 labels."""
+    if data:
+        archive = np.load(data)
+        images, labels = archive['images'], archive['labels'].astype(np.int64)
+    elif img_size == 28:
+        from mnist_data import load_arrays
+        images, labels = load_arrays('test')
+        labels = np.asarray(labels, dtype=np.int64)
+    else:
+        raise ValueError(f"No default test set for {img_size}×{img_size} models, pass --data")
+
+    images = resize(np.asarray(images, dtype=np.float32)[:, None] / 255.0, img_size)
+    return (images - 0.5) / 0.5, labels
+
+
+def resize(images, img_size):
+    """Antialiased bilinear resize of float (N, 1, H, W) images to img_size × img_size."""
+    if images.shape[-1] == img_size:
+        return images
+    import torch
+    import torch.nn.functional as F
+    return F.interpolate(torch.from_numpy(np.ascontiguousarray(images)), size=(img_size, img_size),
+                         mode='bilinear', antialias=True, align_corners=False).numpy()
+
+
+def evaluate(predict, images, labels, batch_size=BATCH_SIZE):
+    """Run the whole test set; returns (predictions, seconds). One warm-up batch is excluded."""
+    predict(images[:min(batch_size, len(images))])
+    t0 = time.perf_counter()
+    preds = np.concatenate([predict(images[i:i + batch_size]).argmax(1)
+                            for i in range(0, len(images), batch_size)])
+    return preds, time.perf_counter() - t0
+
+
+def confusion_matrix(labels, preds, num_classes):
+    """Rows are true classes, columns predicted classes."""
+    return np.bincount(labels * num_classes + preds, minlength=num_classes ** 2).reshape(num_classes, num_classes)
+
+
+def class_symbols(num_classes):
+    """Symbols from model/class_names.json when it matches, otherwise class indices."""
+    path = os.path.join(MODEL_DIR, 'class_names.json')
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            names = json.load(f)
+        if len(names) == num_classes:
+            return [names[str(i)]['symbol'] for i in range(num_classes)]
+    return [str(i) for i in range(num_classes)]
+
+
+def print_report(name, labels, preds, seconds, num_classes):
+    matrix = confusion_matrix(labels, preds, num_classes)
+    accuracy = 100.0 * np.trace(matrix) / len(labels)
+    symbols = class_symbols(num_classes)
+
+    print(f"\n{name}")
+    print(f"Accuracy:   {accuracy:.2f}%  ({np.trace(matrix)}/{len(labels)})")
+    print(f"Throughput: {len(labels) / seconds:,.0f} images/s  ({seconds * 1000:.0f} ms total)")
+    print("\nConfusion matrix (rows = true, cols = predicted):")
+    print('      ' + ''.join(f"{s:>6}" for s in symbols) + '   acc')
+    for i, row in enumerate(matrix):
+        class_acc = 100.0 * row[i] / max(row.sum(), 1)
+        print(f"{symbols[i]:>6}" + ''.join(f"{v:>6}" for v in row) + f"{class_acc:>6.1f}%")
+    return {'accuracy': accuracy, 'images_per_sec': len(labels) / seconds, 'seconds': seconds,
+            'confusion_matrix': matrix.tolist()}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Evaluate a .pt or .onnx model on its test set.')
+    parser.add_argument('model', nargs='?', default=os.path.join(MODEL_DIR, 'digit_cnn.onnx'))
+    parser.add_argument('--data', default=None, help='.npz test set with images/labels (default: MNIST test)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--threads', type=int, default=None, help='onnxruntime intra-op threads')
+    parser.add_argument('--json', default=None, help='also write the report to this JSON file')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if not os.path.exists(args.model):
+        print(f"Error: model not found at {args.model}")
+        sys.exit(1)
+
+    predict, img_size = load_predictor(args.model, args.threads)
+    images, labels = load_test_set(img_size, args.data)
+    preds, seconds = evaluate(predict, images, labels, args.batch_size)
+    num_classes = int(predict(images[:1]).shape[1])
+    report = print_report(args.model, labels, preds, seconds, num_classes)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'model': args.model, **report}, f, indent=2)
@@ -1,10 +1,15 @@
 """
 export_onnx.py — Export the trained Greek CNN to ONNX format.
 Workaround for torch.onnx issues on Python 3.14.
+
+Export, optimization and the PyTorch-vs-ONNX parity check live in onnx_export.py,
+shared with get_mnist_model.py (pass --no-optimize to skip onnx_optimize, --fp16 to
+also write greek_cnn.fp16.onnx).
 """
 
 import os
 import json
+import argparse
 import torch
 import torch.nn as nn
 
@@ -43,6 +48,13 @@ class GreekCNN(nn.Module):
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export model/greek_cnn.pth to ONNX.')
+    parser.add_argument('--no-optimize', action='store_true', help='skip the onnx_optimize pass')
+    parser.add_argument('--fp16', action='store_true', help='also write an fp16-weights greek_cnn.fp16.onnx')
+    parser.add_argument('--report', metavar='PATH', default=None,
+                        help='write export time, size, parity and latency per batch size to this JSON file')
+    args = parser.parse_args()
+
     # Load checkpoint
     ckpt_path = os.path.join(MODEL_DIR, 'greek_cnn.pth')
     if not os.path.exists(ckpt_path):
@@ -53,30 +65,11 @@ if __name__ == '__main__':
     model.load_state_dict(torch.load(ckpt_path, map_location='cpu', weights_only=True))
     model.eval()
 
-    dummy_input = torch.randn(1, 1, IMG_SIZE, IMG_SIZE)
     onnx_path = os.path.join(MODEL_DIR, 'greek_cnn.onnx')
+    # Parity is checked on MNIST test images upscaled to 64×64
+    from onnx_export import export_onnx
+    export_onnx(model, onnx_path, IMG_SIZE, optimize=not args.no_optimize, fp16=args.fp16,
+                report_path=args.report)
 
-    torch.onnx.export(
-        model, dummy_input, onnx_path,
-        input_names=['input'],
-        output_names=['output'],
-        dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}},
-        opset_version=13,
-    )
-
-    # Verify
-    import onnx
-    onnx_model = onnx.load(onnx_path)
-    
-    # Force embed external data into the ONNX file
-    onnx.save_model(onnx_model, onnx_path, save_as_external_data=False)
-    
-    onnx_model = onnx.load(onnx_path)
-    onnx.checker.check_model(onnx_model)
-    
-    # Clean up the external data file if torch created it
-    if os.path.exists(onnx_path + ".data"):
-        os.remove(onnx_path + ".data")
-        
     print(f"✅ ONNX model exported and verified: {onnx_path}")
     print(f"   Size: {os.path.getsize(onnx_path) / 1024:.1f} KB")
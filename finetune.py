@@ -0,0 +1,176 @@
+"""
+finetune.py — Incremental fine-tuning of DigitCNN, warm-started from model/digit_cnn.pt.
+
+Instead of retraining from random init, this loads the saved state dict, optionally
+freezes the `features` blocks, and trains for a small number of steps on new data
+(e.g. collected classroom drawings) mixed with a replay sample of MNIST so the
+model doesn't forget. The result is re-exported to ONNX and the old and new
+accuracies are printed side by side.
+
+New data is either
+  • an .npz file with `images` (N, 28, 28) uint8 and `labels` (N,), or
+  • a directory of `<digit>/<anything>.png` images,
+drawn as light strokes on a dark background like MNIST.
+
+    python finetune.py data/classroom --steps 300 --freeze-features
+"""
+
+import os
+import copy
+import time
+import argparse
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+from PIL import Image
+
+import get_mnist_model as mnist
+from augment import BatchRandomAffine
+from mnist_data import MNISTArrays, BatchLoader, normalize
+
+# ===== Configuration =====
+STEPS = 300
+BATCH_SIZE = 64
+LR = 1e-4
+# Fraction of each batch drawn from the new data; the rest is MNIST replay
+NEW_FRACTION = 0.5
+# Fraction of the new data held out to measure accuracy on it
+HOLDOUT = 0.2
+
+
+class ArrayData:
+    """Just enough of MNISTArrays' interface (images/labels/subset) for BatchLoader."""
+    def __init__(self, images, labels, split='new'):
+        self.images = images
+        self.labels = labels
+        self.split = split
+
+    def __len__(self):
+        return self.images.shape[0]
+
+    def subset(self, indices):
+        return ArrayData(self.images[indices], self.labels[indices], self.split)
+
+
+def load_new_data(path):
+    """Load new drawings as uint8 (N, 28, 28) images and int64 labels."""
+    if path.endswith('.npz'):
+        archive = np.load(path)
+        images, labels = archive['images'], archive['labels']
+    else:
+        images, labels = [], []
+        for label in sorted(os.listdir(path)):
+            class_dir = os.path.join(path, label)
+            if not (os.path.isdir(class_dir) and label.isdigit()):
+                continue
+            for name in sorted(os.listdir(class_dir)):
+                if name.lower().endswith('.png'):
+                    img = Image.open(os.path.join(class_dir, name)).convert('L')
+                    if img.size != (mnist.IMG_SIZE, mnist.IMG_SIZE):
+                        img = img.resize((mnist.IMG_SIZE, mnist.IMG_SIZE), Image.Resampling.BOX)
+                    images.append(np.asarray(img))
+                    labels.append(int(label))
+        if not images:
+            raise ValueError(f"No <digit>/*.png drawings found in {path}")
+        images, labels = np.stack(images), np.array(labels)
+
+    return ArrayData(torch.from_numpy(np.ascontiguousarray(images, dtype=np.uint8)),
+                     torch.from_numpy(np.asarray(labels)).long())
+
+
+def split_holdout(data, fraction=HOLDOUT, seed=0):
+    """Random (train, holdout) split of the new data."""
+    order = torch.randperm(len(data), generator=torch.Generator().manual_seed(seed))
+    n_holdout = int(len(data) * fraction) if len(data) > 1 else 0
+    return data.subset(order[n_holdout:]), data.subset(order[:n_holdout])
+
+
+def mixed_batches(new_data, replay_data, steps, batch_size, new_fraction, augment, device, generator):
+    """Yield `steps` normalized batches mixing new drawings with a replay sample of MNIST."""
+    n_new = max(1, int(round(batch_size * new_fraction)))
+    n_replay = batch_size - n_new
+    for _ in range(steps):
+        new_idx = torch.randint(len(new_data), (n_new,), generator=generator)
+        replay_idx = torch.randint(len(replay_data), (n_replay,), generator=generator)
+        images = torch.cat([new_data.images[new_idx], replay_data.images[replay_idx]])
+        labels = torch.cat([new_data.labels[new_idx], replay_data.labels[replay_idx]])
+        images = augment(images.to(device).unsqueeze(1).float().div_(255.0))
+        yield normalize(images), labels.to(device)
+
+
+def finetune(new_path, checkpoint=None, steps=STEPS, batch_size=BATCH_SIZE, lr=LR,
+             new_fraction=NEW_FRACTION, freeze_features=False, seed=0, export=True):
+    device = mnist.DEVICE
+    checkpoint = checkpoint or os.path.join(mnist.MODEL_DIR, 'digit_cnn.pt')
+    torch.manual_seed(seed)
+
+    model = mnist.DigitCNN(num_classes=10)
+    model.load_state_dict(torch.load(checkpoint, map_location='cpu', weights_only=True))
+    model.to(device)
+    old_model = copy.deepcopy(model)
+
+    new_train, new_holdout = split_holdout(load_new_data(new_path), seed=seed)
+    replay = MNISTArrays('train')
+    test_loader = BatchLoader(MNISTArrays('test'), batch_size=1000, device=device)
+    holdout_loader = BatchLoader(new_holdout, batch_size=1000, device=device) if len(new_holdout) else None
+    print(f"Fine-tuning {checkpoint} on {len(new_train)} new drawings "
+          f"({len(new_holdout)} held out) + MNIST replay, {steps} steps")
+
+    if freeze_features:
+        for p in model.features.parameters():
+            p.requires_grad_(False)
+    params = [p for p in model.parameters() if p.requires_grad]
+    optimizer = optim.Adam(params, lr=lr)
+    criterion = nn.CrossEntropyLoss()
+    augment = BatchRandomAffine()
+
+    t0 = time.perf_counter()
+    model.train()
+    if freeze_features:
+        # Keep the frozen blocks' BatchNorm running stats as trained
+        model.features.eval()
+    generator = torch.Generator().manual_seed(seed)
+    for images, labels in mixed_batches(new_train, replay, steps, batch_size, new_fraction,
+                                        augment, device, generator):
+        optimizer.zero_grad()
+        loss = criterion(model(images), labels)
+        loss.backward()
+        optimizer.step()
+    elapsed = time.perf_counter() - t0
+
+    rows = [('MNIST test', test_loader)]
+    if holdout_loader is not None:
+        rows.append(('new data (held out)', holdout_loader))
+    print(f"\nFine-tuned in {elapsed:.1f}s")
+    print(f"{'':<22}{'before':>9}{'after':>9}{'Δ':>8}")
+    for name, loader in rows:
+        before = mnist.evaluate_model(old_model, loader)
+        after = mnist.evaluate_model(model, loader)
+        print(f"{name:<22}{before:>8.1f}%{after:>8.1f}%{after - before:>+8.1f}")
+
+    if export:
+        mnist.export_model(model)
+    return model
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Fine-tune DigitCNN from model/digit_cnn.pt on new drawings.')
+    parser.add_argument('data', help='.npz with images/labels, or a directory of <digit>/*.png drawings')
+    parser.add_argument('--checkpoint', default=None, help='state dict to start from (default: model/digit_cnn.pt)')
+    parser.add_argument('--steps', type=int, default=STEPS)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--lr', type=float, default=LR)
+    parser.add_argument('--new-fraction', type=float, default=NEW_FRACTION,
+                        help='share of each batch taken from the new data (rest is MNIST replay)')
+    parser.add_argument('--freeze-features', action='store_true', help='only train the classifier head')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-export', action='store_true', help="don't overwrite model/digit_cnn.pt/.onnx")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    finetune(args.data, checkpoint=args.checkpoint, steps=args.steps, batch_size=args.batch_size,
+             lr=args.lr, new_fraction=args.new_fraction, freeze_features=args.freeze_features,
+             seed=args.seed, export=not args.no_export)
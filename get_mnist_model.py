@@ -1,11 +1,18 @@
 import os
 import json
+import argparse
 import torch
 import torch.nn as nn
 import torch.optim as optim
 from torch.utils.data import DataLoader
 from torchvision import datasets, transforms
-import onnx
+
+from augment import BatchRandomAffine
+from mnist_data import DATA_ROOT, MNISTArrays, BatchLoader
+from epoch_cache import EpochCache
+from telemetry import TrainTelemetry, format_breakdown
+from quantize import MAX_DROP, quantize_model
+from onnx_export import export_onnx
 
 # ===== Configuration =====
 MODEL_DIR = os.path.join(os.path.dirname(__file__), 'model')
@@ -13,7 +20,19 @@ IMG_SIZE = 28
 BATCH_SIZE = 64
 EPOCHS = 6
 LR = 0.001
+# StepLR schedule: multiply the learning rate by GAMMA every STEP_SIZE epochs
+STEP_SIZE = 4
+GAMMA = 0.5
 DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+# 'batch': vectorized affine warp per collated batch (augment.py)
+# 'pil':   original per-sample transforms.RandomAffine inside the dataset
+# 'cache': stream epochs pre-rendered by a process pool (epoch_cache.py)
+AUGMENT = 'batch'
+SEED = 0
+# Execution modes, combinable with '+' (e.g. 'bf16+channels_last')
+EXEC_MODES = ('bf16', 'channels_last', 'compile')
+# Max drop in test accuracy (percentage points) allowed vs. the fp32 reference run
+ACC_TOLERANCE = 0.5
 
 # ===== CNN Architecture =====
 class DigitCNN(nn.Module):
@@ -50,81 +69,154 @@ class DigitCNN(nn.Module):
         x = self.classifier(x)
         return x
 
-def train():
-    print(f"Device: {DEVICE}")
-    os.makedirs(MODEL_DIR, exist_ok=True)
-    os.makedirs('data', exist_ok=True)
+def parse_mode(mode):
+    """'bf16+channels_last' -> {'bf16', 'channels_last'}. 'fp32' is plain eager execution."""
+    flags = set(mode.split('+')) - {'fp32'}
+    unknown = flags - set(EXEC_MODES)
+    if unknown:
+        raise ValueError(f"Unknown execution mode(s): {', '.join(sorted(unknown))}")
+    return flags
 
-    # Training transforms - add data augmentation for robustness
+def build_train_batches(augment, train_data, seed, workers=None, batch_size=BATCH_SIZE, epochs=EPOCHS):
+    """Return a function epoch -> iterable of normalized (images, labels) training batches."""
+    # Training augmentation for robustness
     # Since kids drawing usually aren't perfectly centered and sized!
-    train_transform = transforms.Compose([
-        transforms.RandomAffine(degrees=20, translate=(0.15, 0.15), scale=(0.7, 1.2)),
-        transforms.ToTensor(),          # [0, 1] range
-        transforms.Normalize([0.5], [0.5]), # Normalize to [-1, 1]
-    ])
-
-    # Test transforms standard
-    test_transform = transforms.Compose([
-        transforms.ToTensor(),          # [0, 1] range
-        transforms.Normalize([0.5], [0.5]), # Normalize to [-1, 1]
-    ])
-
-    # Load datasets
-    print("Downloading/Loading MNIST...")
-    train_set = datasets.MNIST(root='./data', train=True, download=True, transform=train_transform)
-    test_set = datasets.MNIST(root='./data', train=False, download=True, transform=test_transform)
-
-    train_loader = DataLoader(train_set, batch_size=BATCH_SIZE, shuffle=True, num_workers=0)
-    test_loader = DataLoader(test_set, batch_size=BATCH_SIZE, shuffle=False, num_workers=0)
+    if augment == 'pil':
+        # Original per-sample PIL path through torchvision's dataset
+        train_transform = transforms.Compose([
+            transforms.RandomAffine(degrees=20, translate=(0.15, 0.15), scale=(0.7, 1.2)),
+            transforms.ToTensor(),          # [0, 1] range
+            transforms.Normalize([0.5], [0.5]), # Normalize to [-1, 1]
+        ])
+        train_set = datasets.MNIST(root=DATA_ROOT, train=True, download=True, transform=train_transform)
+        train_loader = DataLoader(train_set, batch_size=batch_size, shuffle=True, num_workers=0)
+        return lambda epoch: train_loader
+    elif augment == 'batch':
+        # Warp whole batches in [0, 1]; the loader normalizes afterwards so the fill stays black
+        batch_augment = BatchRandomAffine(degrees=20, translate=(0.15, 0.15), scale=(0.7, 1.2))
+        train_loader = BatchLoader(train_data, batch_size=batch_size, shuffle=True,
+                                   augment=batch_augment, device=DEVICE)
+        return lambda epoch: train_loader
+    elif augment == 'cache':
+        # Pre-warped epochs from the on-disk cache; only missing epochs get rendered
+        epoch_cache = EpochCache(train_data, seed=seed)
+        epoch_cache.pregenerate(range(epochs), workers=workers)
+        return lambda epoch: epoch_cache.load_epoch(epoch).batches(batch_size, shuffle=True, device=DEVICE)
+    else:
+        raise ValueError(f"Unknown augment mode: {augment}")
+
+def evaluate_model(model, test_loader, channels_last=False):
+    """Top-1 accuracy (%) over a loader, counting correct predictions on-device."""
+    model.eval()
+    test_correct = torch.zeros((), dtype=torch.long, device=DEVICE)
+    test_total = 0
+    with torch.no_grad():
+        for images, labels in test_loader:
+            images, labels = images.to(DEVICE), labels.to(DEVICE)
+            if channels_last:
+                images = images.contiguous(memory_format=torch.channels_last)
+            outputs = model(images)
+            test_total += labels.size(0)
+            test_correct += outputs.argmax(1).eq(labels).sum()
+    return 100.0 * test_correct.item() / test_total
+
+def fit(mode, train_batches, test_loader, seed=SEED, telemetry_path=None, sync_every=0, run_info=None,
+        epochs=EPOCHS, lr=LR, step_size=STEP_SIZE, gamma=GAMMA, val_loader=None, on_epoch=None, verbose=True):
+    """
+    Train a fresh DigitCNN in one execution mode.
+    Returns (model, test_acc, stats) where `model` is the plain fp32 eager module.
+
+    With `val_loader`, validation accuracy is measured after every epoch and passed to
+    `on_epoch(epoch, val_acc)`; returning False stops training early (stats['pruned']).
+    """
+    flags = parse_mode(mode)
+    torch.manual_seed(seed)
 
     # Build model
     model = DigitCNN(num_classes=10).to(DEVICE)
+    if 'channels_last' in flags:
+        model = model.to(memory_format=torch.channels_last)
+    # torch.compile wraps the module; `model` keeps the original for export
+    step_model = torch.compile(model) if 'compile' in flags else model
+    autocast_device = 'cuda' if DEVICE.startswith('cuda') else 'cpu'
+
     criterion = nn.CrossEntropyLoss()
-    optimizer = optim.Adam(model.parameters(), lr=LR)
-    scheduler = optim.lr_scheduler.StepLR(optimizer, step_size=4, gamma=0.5)
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    scheduler = optim.lr_scheduler.StepLR(optimizer, step_size=step_size, gamma=gamma)
+
+    # Metrics stay on-device and are synced once per epoch (or every `sync_every` steps)
+    telemetry = TrainTelemetry(telemetry_path, sync_every=sync_every, device=DEVICE, run_info={
+        'mode': mode, 'seed': seed, 'epochs': epochs, 'lr': lr,
+        'step_size': step_size, 'gamma': gamma, 'device': DEVICE, 'threads': torch.get_num_threads(), **(run_info or {}),
+    })
+    epoch_records = []
+    val_accs = []
+    pruned = False
 
     # Fast Training loop
-    for epoch in range(EPOCHS):
+    for epoch in range(epochs):
         model.train()
-        train_loss = 0
-        train_correct = 0
-        train_total = 0
+        telemetry.start_epoch(epoch + 1)
 
-        for images, labels in train_loader:
+        for images, labels in telemetry.timed(train_batches(epoch)):
             images, labels = images.to(DEVICE), labels.to(DEVICE)
+            if 'channels_last' in flags:
+                images = images.contiguous(memory_format=torch.channels_last)
             optimizer.zero_grad()
-            outputs = model(images)
-            loss = criterion(outputs, labels)
+            with torch.autocast(autocast_device, dtype=torch.bfloat16, enabled='bf16' in flags):
+                outputs = step_model(images)
+                loss = criterion(outputs, labels)
+            telemetry.mark('forward')
             loss.backward()
+            telemetry.mark('backward')
             optimizer.step()
+            telemetry.mark('optimizer')
+            telemetry.update(loss, outputs, labels)
 
-            train_loss += loss.item() * images.size(0)
-            _, predicted = outputs.max(1)
-            train_total += labels.size(0)
-            train_correct += predicted.eq(labels).sum().item()
-
-        avg_train_loss = train_loss / train_total
-        train_acc = 100.0 * train_correct / train_total
         current_lr = optimizer.param_groups[0]['lr']
-        print(f"Epoch {epoch+1:2d}/{EPOCHS}  lr={current_lr:.6f}  train_loss={avg_train_loss:.4f}  train_acc={train_acc:.1f}%")
+        stats = telemetry.end_epoch(lr=current_lr)
+        epoch_records.append(stats)
+        if verbose:
+            print(f"[{mode}] Epoch {epoch+1:2d}/{epochs}  lr={current_lr:.6f}  train_loss={stats['loss']:.4f}  train_acc={stats['acc']:.1f}%  "
+                  f"{stats['samples_per_sec']:.0f} samples/s  [{format_breakdown(stats)}]")
         
         scheduler.step()
 
+        if val_loader is not None:
+            with torch.autocast(autocast_device, dtype=torch.bfloat16, enabled='bf16' in flags):
+                val_accs.append(evaluate_model(step_model, val_loader, channels_last='channels_last' in flags))
+            if on_epoch is not None and on_epoch(epoch + 1, val_accs[-1]) is False:
+                pruned = True
+                break
+
     # Evaluate
-    model.eval()
-    test_correct = 0
-    test_total = 0
-    with torch.no_grad():
-        for images, labels in test_loader:
-            images, labels = images.to(DEVICE), labels.to(DEVICE)
-            outputs = model(images)
-            _, predicted = outputs.max(1)
-            test_total += labels.size(0)
-            test_correct += predicted.eq(labels).sum().item()
-            
-    test_acc = 100.0 * test_correct / test_total
-    print(f"Overall Test Accuracy: {test_acc:.1f}%")
+    with torch.autocast(autocast_device, dtype=torch.bfloat16, enabled='bf16' in flags):
+        test_acc = evaluate_model(step_model, test_loader, channels_last='channels_last' in flags)
+    if verbose:
+        print(f"[{mode}] Overall Test Accuracy: {test_acc:.1f}%")
+    telemetry.log('test', mode=mode, acc=test_acc)
+    telemetry.close()
 
+    # Back to a plain fp32 contiguous module so the export interface never changes
+    model = model.to(memory_format=torch.contiguous_format).float()
+    # Steady-state throughput skips the first epoch (warm-up, compilation)
+    steady = epoch_records[1:] or epoch_records
+    summary = {
+        'train_seconds': sum(r['seconds'] for r in epoch_records),
+        'samples_per_sec': sum(r['samples'] for r in steady) / sum(r['seconds'] for r in steady),
+        'epochs_run': len(epoch_records),
+        'val_accs': val_accs,
+        'pruned': pruned,
+    }
+    return model, test_acc, summary
+
+def export_model(model, optimize=True, fp16=False, report_path=None):
+    """
+    Save class names, the PyTorch state dict and the fp32 ONNX model to MODEL_DIR.
+    The ONNX graph is run through onnx_optimize unless `optimize` is False; `fp16`
+    additionally writes a digit_cnn.fp16.onnx fp16-weights variant. The export is
+    verified against the PyTorch model (see onnx_export.py).
+    """
     # Save class names mapping
     class_map = {}
     for i in range(10):
@@ -139,28 +231,107 @@ def train():
     # Save PyTorch model just in case
     torch.save(model.state_dict(), os.path.join(MODEL_DIR, 'digit_cnn.pt'))
 
-    # Export to ONNX
+    # Export to ONNX, optimize and check parity with the PyTorch model
     print("\nExporting to ONNX...")
-    model.to('cpu')
-    model.eval()
-    dummy_input = torch.randn(1, 1, IMG_SIZE, IMG_SIZE)
     onnx_path = os.path.join(MODEL_DIR, 'digit_cnn.onnx')
-
-    torch.onnx.export(
-        model, dummy_input, onnx_path,
-        input_names=['input'],
-        output_names=['output'],
-        dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}},
-        opset_version=13,
-    )
-    
-    onnx_model = onnx.load(onnx_path)
-    onnx.save_model(onnx_model, onnx_path, save_as_external_data=False)
-    
-    if os.path.exists(onnx_path + ".data"):
-        os.remove(onnx_path + ".data")
+    export_onnx(model, onnx_path, IMG_SIZE, optimize=optimize, fp16=fp16, report_path=report_path)
 
     print(f"✅ complete! Model exported to {onnx_path}")
+    return onnx_path
+
+def train(augment=AUGMENT, seed=SEED, workers=None, telemetry_path=None, sync_every=0,
+          modes=('fp32',), acc_tolerance=ACC_TOLERANCE, quantize=False, max_int8_drop=MAX_DROP,
+          optimize=True, fp16=False, export_report=None):
+    """
+    Train DigitCNN in each execution mode in `modes` and export the first one.
+    When any non-fp32 mode is requested an fp32 reference run is added, each mode's
+    test accuracy must stay within `acc_tolerance` points of it, and the summary
+    reports every mode's speedup over fp32. With `quantize`, a static INT8
+    digit_cnn.int8.onnx is produced after export (see quantize.py).
+    """
+    print(f"Device: {DEVICE}  augment: {augment}  seed: {seed}  modes: {', '.join(modes)}")
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    for mode in modes:
+        parse_mode(mode)
+
+    # Load datasets (parsed once from data/MNIST/raw, then memory-mapped)
+    print("Loading MNIST...")
+    train_data = MNISTArrays('train')
+    test_data = MNISTArrays('test')
+    train_batches = build_train_batches(augment, train_data, seed, workers)
+    test_loader = BatchLoader(test_data, batch_size=BATCH_SIZE, shuffle=False, device=DEVICE)
+
+    # Non-fp32 modes are checked against an fp32 reference run
+    run_modes = list(modes)
+    if all(parse_mode(m) for m in run_modes):
+        run_modes.append('fp32')
+
+    results = {}
+    for mode in run_modes:
+        results[mode] = fit(mode, train_batches, test_loader, seed=seed, telemetry_path=telemetry_path,
+                            sync_every=sync_every, run_info={'augment': augment, 'batch_size': BATCH_SIZE})
+
+    if len(run_modes) > 1:
+        ref_mode = next(m for m in run_modes if not parse_mode(m))
+        _, ref_acc, ref_stats = results[ref_mode]
+        failed = []
+        print(f"\n{'mode':<28}{'train time':>12}{'samples/s':>12}{'speedup':>10}{'test acc':>10}{'Δ acc':>8}")
+        for mode in run_modes:
+            _, acc, stats = results[mode]
+            speedup = stats['samples_per_sec'] / ref_stats['samples_per_sec']
+            delta = acc - ref_acc
+            print(f"{mode:<28}{stats['train_seconds']:>11.1f}s{stats['samples_per_sec']:>12.0f}"
+                  f"{speedup:>9.2f}x{acc:>9.1f}%{delta:>+8.2f}")
+            if delta < -acc_tolerance:
+                failed.append(mode)
+        if failed:
+            print(f"❌ Test accuracy of {', '.join(failed)} dropped more than {acc_tolerance} points below fp32")
+            exit(1)
+
+    model, _, _ = results[modes[0]]
+    onnx_path = export_model(model, optimize=optimize, fp16=fp16, report_path=export_report)
+    if quantize:
+        quantize_model(onnx_path, max_drop=max_int8_drop)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train DigitCNN on MNIST and export to ONNX.')
+    parser.add_argument('--augment', choices=['batch', 'pil', 'cache'], default=AUGMENT,
+                        help="'batch' warps whole batches on-tensor, 'pil' uses per-sample RandomAffine, "
+                             "'cache' streams pre-rendered epochs from data/MNIST/epoch_cache")
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--pregenerate', type=int, metavar='N', default=0,
+                        help='only render N augmented epochs into the epoch cache, then exit')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='process pool size for --pregenerate / --augment cache (default: all cores)')
+    parser.add_argument('--telemetry', metavar='PATH', default=None,
+                        help='append per-epoch metrics and step timing breakdown to this JSONL file')
+    parser.add_argument('--sync-every', type=int, default=0,
+                        help='also sync metrics and log an interval record every N steps (0 = once per epoch)')
+    parser.add_argument('--modes', nargs='+', default=['fp32'], metavar='MODE',
+                        help="execution modes to train and compare: fp32, bf16, channels_last, compile, "
+                             "or combinations like bf16+channels_last; the first one is exported")
+    parser.add_argument('--acc-tolerance', type=float, default=ACC_TOLERANCE,
+                        help='max test accuracy drop (points) of any mode vs. fp32')
+    parser.add_argument('--quantize', action='store_true',
+                        help='also write a static INT8 model/digit_cnn.int8.onnx after export')
+    parser.add_argument('--max-int8-drop', type=float, default=MAX_DROP,
+                        help='fail if the INT8 model loses more than this many accuracy points')
+    parser.add_argument('--no-optimize', action='store_true',
+                        help='export the ONNX graph as-is, without the onnx_optimize pass')
+    parser.add_argument('--fp16', action='store_true',
+                        help='also write an fp16-weights model/digit_cnn.fp16.onnx')
+    parser.add_argument('--export-report', metavar='PATH', default=None,
+                        help='write export time, size, parity and latency per batch size to this JSON file')
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    train()
+    args = parse_args()
+    if args.pregenerate:
+        EpochCache(MNISTArrays('train'), seed=args.seed).pregenerate(range(args.pregenerate), workers=args.workers)
+    else:
+        train(augment=args.augment, seed=args.seed, workers=args.workers,
+              telemetry_path=args.telemetry, sync_every=args.sync_every,
+              modes=args.modes, acc_tolerance=args.acc_tolerance,
+              quantize=args.quantize, max_int8_drop=args.max_int8_drop,
+              optimize=not args.no_optimize, fp16=args.fp16,
+              export_report=args.export_report)
@@ -0,0 +1,27 @@
+"""
+image_io.py — RGBA image loading and saving shared by the asset tools.
+
+Images are (H, W, 4) uint8 arrays in RGBA order. Grayscale and RGB files gain an
+opaque alpha channel on load, and fully opaque images are written back without one.
+"""
+
+import os
+import cv2
+
+
+def load_image(path):
+    img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise FileNotFoundError(f"could not read image {path}")
+    if img.ndim == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2RGBA)
+    if img.shape[2] == 3:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGBA)
+    return cv2.cvtColor(img, cv2.COLOR_BGRA2RGBA)
+
+
+def save_image(path, img):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    opaque = (img[..., 3] == 255).all()
+    if not cv2.imwrite(path, cv2.cvtColor(img, cv2.COLOR_RGBA2BGR if opaque else cv2.COLOR_RGBA2BGRA)):
+        raise OSError(f"could not write {path}")
@@ -10,16 +10,8 @@ class BootScene extends Phaser.Scene {
     preload() {
         this.load.image('classroom_bg', 'img/classroom_bg.png');
         this.load.image('title_bg', 'img/title_bg.png');
-        this.load.image('sunnie_umbrella', 'img/sunnie_umbrella_no_bg.png');
-        // 3-frame horizontal spritesheet (640×210 per frame) generated from sunnie_minibus.png
-        this.load.spritesheet('sunnie_minibus', 'img/sunnie_minibus_sheet.png', {
-            frameWidth: 640,
-            frameHeight: 210,
-        });
-
-        for (let i = 1; i <= 5; i++) {
-            this.load.image(`sunnie_${i}`, `img/sunnie_pose_${i}.png`);
-        }
+        // Sunnie's poses, the umbrella and the 3 minibus frames (640×210 each), packed by atlas_packer.py
+        this.load.multiatlas('sprites', 'img/sprites.json', 'img/');
     }
 
     create() {
@@ -40,7 +40,7 @@ class GameOverScene extends Phaser.Scene {
         });
 
         // Sunnie Umbrella Sprite
-        this.sunnie = this.add.image(w * 0.2, h - 250, 'sunnie_umbrella');
+        this.sunnie = this.add.image(w * 0.2, h - 250, 'sprites', 'sunnie_umbrella');
         this.sunnie.setScale(0.8);
         this.sunnie.setDepth(10);
 
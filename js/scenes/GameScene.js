@@ -74,7 +74,7 @@ class GameScene extends Phaser.Scene {
         bg.setDepth(-10); // Far back
 
         // Render Sunnie character on the BOTTOM LEFT
-        this.sunnie = this.add.image(w * 0.15, h - 150, 'sunnie_1');
+        this.sunnie = this.add.image(w * 0.15, h - 150, 'sprites', 'sunnie_1');
         this.sunnie.setScale(0.7); // Scale appropriately
         this.sunnie.setDepth(-5); // In front of background, behind balloons (which default to 0-1)
 
@@ -206,7 +206,7 @@ class GameScene extends Phaser.Scene {
         // Change pose every 5 successful draws
         // Max pose index is 5, loop back if needed
         const poseIndex = Math.floor(this.successfulPops / 5) % 5 + 1;
-        this.sunnie.setTexture(`sunnie_${poseIndex}`);
+        this.sunnie.setFrame(`sunnie_${poseIndex}`);
 
         // Add a fun little pop animation when she changes poses
         if (this.successfulPops % 5 === 0) {
@@ -82,7 +82,7 @@ class TitleScene extends Phaser.Scene {
         if (!this.anims.exists('minibus_eat')) {
             this.anims.create({
                 key: 'minibus_eat',
-                frames: this.anims.generateFrameNumbers('sunnie_minibus', { start: 0, end: 2 }),
+                frames: this.anims.generateFrameNames('sprites', { prefix: 'sunnie_minibus_', start: 0, end: 2 }),
                 frameRate: 2,
                 repeat: -1,
             });
@@ -90,7 +90,7 @@ class TitleScene extends Phaser.Scene {
 
         // Start 80% away from the left initially
         const startX = w * 0.8;
-        this.minibus = this.add.sprite(startX, busY, 'sunnie_minibus');
+        this.minibus = this.add.sprite(startX, busY, 'sprites', 'sunnie_minibus_0');
         this.minibus.setScale(busScale);
         this.minibus.play('minibus_eat');
 
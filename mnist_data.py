@@ -0,0 +1,162 @@
+"""
+mnist_data.py — Memory-mapped MNIST loader that reads the idx files in data/MNIST/raw directly.
+
+The idx3/idx1 files (gzipped or not) are parsed once into uint8 `.npy` caches in
+data/MNIST/cache. Later runs memory-map those caches, so training, evaluation and
+calibration start in milliseconds. Samples are handed out as zero-copy uint8 tensor
+views and converted/normalized to [-1, 1] one batch at a time.
+"""
+
+import os
+import gzip
+import tempfile
+import numpy as np
+import torch
+
+# ===== Configuration =====
+DATA_ROOT = os.path.join(os.path.dirname(__file__), 'data')
+IDX_FILES = {
+    'train': ('train-images-idx3-ubyte', 'train-labels-idx1-ubyte'),
+    'test': ('t10k-images-idx3-ubyte', 't10k-labels-idx1-ubyte'),
+}
+# idx type codes -> numpy dtypes (all multi-byte types are big-endian)
+IDX_DTYPES = {
+    0x08: np.uint8, 0x09: np.int8, 0x0B: '>i2', 0x0C: '>i4', 0x0D: '>f4', 0x0E: '>f8',
+}
+
+
+def read_idx(path):
+    """Parse an idx file (plain or .gz) into a numpy array."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        data = f.read()
+
+    if data[0] != 0 or data[1] != 0:
+        raise ValueError(f"{path} is not an idx file (bad magic)")
+    dtype = IDX_DTYPES[data[2]]
+    ndim = data[3]
+    shape = tuple(int(d) for d in np.frombuffer(data, dtype='>i4', count=ndim, offset=4))
+    array = np.frombuffer(data, dtype=dtype, offset=4 + 4 * ndim)
+    return array.reshape(shape)
+
+
+def _raw_path(root, name, split):
+    """Locate an idx file in root/MNIST/raw, preferring the uncompressed copy."""
+    raw_dir = os.path.join(root, 'MNIST', 'raw')
+    for candidate in (os.path.join(raw_dir, name), os.path.join(raw_dir, name + '.gz')):
+        if os.path.exists(candidate):
+            return candidate
+
+    # Fall back to torchvision's downloader, which fills the same raw directory
+    print(f"{name} not found in {raw_dir}, downloading MNIST...")
+    from torchvision import datasets
+    datasets.MNIST(root=root, train=(split == 'train'), download=True)
+    return os.path.join(raw_dir, name)
+
+
+def _cached_npy(root, split, kind, raw_path):
+    """Return the path of the uint8 .npy cache for one idx file, (re)building it if stale."""
+    cache_dir = os.path.join(root, 'MNIST', 'cache')
+    cache_path = os.path.join(cache_dir, f"{split}-{kind}.npy")
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(raw_path):
+        return cache_path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    array = read_idx(raw_path).astype(np.uint8, copy=False)
+    # A unique temp file per writer, so parallel cold starts (sweep.py workers) can't clobber each other
+    with tempfile.NamedTemporaryFile(dir=cache_dir, prefix=f"{split}-{kind}.", suffix='.tmp.npy',
+                                     delete=False) as f:
+        np.save(f, array)
+    os.replace(f.name, cache_path)
+    return cache_path
+
+
+def load_arrays(split='train', root=DATA_ROOT):
+    """
+    Return (images, labels) for 'train' or 'test' as copy-on-write numpy memmaps.
+    images: uint8 (N, 28, 28), labels: uint8 (N,).
+    """
+    image_name, label_name = IDX_FILES[split]
+    arrays = []
+    for kind, name in (('images', image_name), ('labels', label_name)):
+        raw_path = _raw_path(root, name, split)
+        # mmap_mode='c' keeps the pages shared but gives torch a writable buffer
+        arrays.append(np.load(_cached_npy(root, split, kind, raw_path), mmap_mode='c'))
+    return arrays[0], arrays[1]
+
+
+class MNISTArrays:
+    """MNIST split as zero-copy uint8 tensor views over the memory-mapped cache."""
+    def __init__(self, split='train', root=DATA_ROOT):
+        images, labels = load_arrays(split, root)
+        self.split = split
+        self.images = torch.from_numpy(images)          # (N, 28, 28) uint8, no copy
+        self.labels = torch.from_numpy(labels).long()   # 70k labels, copying is negligible
+
+    def __len__(self):
+        return self.images.shape[0]
+
+    def subset(self, indices):
+        """Restrict to a subset of samples (e.g. a validation split or calibration set)."""
+        subset = MNISTArrays.__new__(MNISTArrays)
+        subset.split = self.split
+        subset.images = self.images[indices]
+        subset.labels = self.labels[indices]
+        return subset
+
+
+def normalize(images):
+    """Map a float batch in [0, 1] to [-1, 1] in place, like transforms.Normalize([0.5], [0.5])."""
+    return images.sub_(0.5).div_(0.5)
+
+
+class BatchLoader:
+    """
+    Minimal DataLoader replacement over uint8 tensors.
+
+    Each batch is gathered (or sliced, when not shuffling) from the uint8 images,
+    moved to `device`, converted to float in [0, 1], passed through the optional
+    batch `augment` callable, and normalized to [-1, 1]. Yields (images, labels)
+    with images shaped (B, 1, 28, 28).
+    """
+    def __init__(self, data, batch_size=64, shuffle=False, drop_last=False,
+                 augment=None, device='cpu', generator=None):
+        self.images = data.images
+        self.labels = data.labels
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.augment = augment
+        self.device = device
+        self.generator = generator
+
+    def __len__(self):
+        n = self.images.shape[0]
+        if self.drop_last:
+            return n // self.batch_size
+        return (n + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        n = self.images.shape[0]
+        order = torch.randperm(n, generator=self.generator) if self.shuffle else None
+
+        for i in range(len(self)):
+            start, end = i * self.batch_size, min((i + 1) * self.batch_size, n)
+            if order is None:
+                images, labels = self.images[start:end], self.labels[start:end]
+            else:
+                idx = order[start:end]
+                images, labels = self.images[idx], self.labels[idx]
+
+            images = images.to(self.device).unsqueeze(1).float().div_(255.0)
+            if self.augment is not None:
+                images = self.augment(images)
+            yield normalize(images), labels.to(self.device)
+
+
+if __name__ == '__main__':
+    import time
+    for split in ('train', 'test'):
+        t0 = time.perf_counter()
+        data = MNISTArrays(split)
+        print(f"{split}: {len(data)} images loaded in {(time.perf_counter() - t0) * 1000:.1f} ms")
@@ -0,0 +1,141 @@
+"""
+onnx_export.py — Shared ONNX export and verification for DigitCNN and GreekCNN.
+
+Used by get_mnist_model.py and export_onnx.py. export_onnx():
+  1. exports the model with a dynamic `batch_size` axis and embeds all weights in the file
+  2. runs onnx.checker and the onnx_optimize pass (optionally writing an fp16-weights variant)
+  3. runs PyTorch and onnxruntime on the same real MNIST test images at several batch
+     sizes (upscaled for 64×64 models) and fails if the logits disagree
+  4. reports export time, file size and PyTorch vs ONNX latency per batch size
+"""
+
+import os
+import json
+import time
+import numpy as np
+import onnx
+import torch
+
+# ===== Configuration =====
+PARITY_BATCH_SIZES = (1, 7, 64)
+PARITY_ATOL = 1e-4
+# fp16 weights round every parameter, so their logits only agree loosely
+FP16_ATOL = 5e-2
+LATENCY_RUNS = 20
+
+
+class ParityError(RuntimeError):
+    """Exported ONNX model disagrees with the PyTorch model it came from."""
+
+
+def parity_images(img_size, count=max(PARITY_BATCH_SIZES)):
+    """First `count` MNIST test images, normalized and resized to img_size."""
+    from mnist_data import load_arrays
+    from evaluate import resize
+    images, _ = load_arrays('test')
+    images = resize(np.asarray(images[:count], dtype=np.float32)[:, None] / 255.0, img_size)
+    return (images - 0.5) / 0.5
+
+
+def _median_ms(fn, runs=LATENCY_RUNS):
+    fn()
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return 1000 * float(np.median(times))
+
+
+def verify_parity(model, onnx_path, images, batch_sizes=PARITY_BATCH_SIZES, atol=PARITY_ATOL):
+    """
+    Compare PyTorch and onnxruntime logits at each batch size. Returns per-batch-size
+    max abs difference and median latencies; raises ParityError past `atol`.
+    """
+    from evaluate import create_session
+    session = create_session(onnx_path)
+    input_name = session.get_inputs()[0].name
+    model.eval()
+
+    results = {}
+    for batch_size in batch_sizes:
+        batch = np.ascontiguousarray(images[:batch_size])
+        x = torch.from_numpy(batch)
+        with torch.inference_mode():
+            expected = model(x).numpy()
+        actual = session.run(None, {input_name: batch})[0]
+        if actual.shape != expected.shape:
+            raise ParityError(f"{onnx_path}: output shape {actual.shape} at batch {batch_size}, "
+                              f"expected {expected.shape}")
+        diff = float(np.abs(actual - expected).max())
+        with torch.inference_mode():
+            torch_ms = _median_ms(lambda: model(x))
+        results[batch_size] = {
+            'max_abs_diff': diff,
+            'argmax_agree': float((actual.argmax(1) == expected.argmax(1)).mean()),
+            'torch_ms': torch_ms,
+            'onnx_ms': _median_ms(lambda: session.run(None, {input_name: batch})),
+        }
+        if diff > atol:
+            raise ParityError(f"{onnx_path}: logits differ by {diff:.2e} at batch {batch_size} (atol {atol})")
+    return results
+
+
+def export_onnx(model, onnx_path, img_size, optimize=True, fp16=False,
+                batch_sizes=PARITY_BATCH_SIZES, report_path=None):
+    """Export, check, optimize and verify `model`. Returns the report dict."""
+    model.to('cpu')
+    model.eval()
+    dummy_input = torch.randn(1, 1, img_size, img_size)
+
+    t0 = time.perf_counter()
+    torch.onnx.export(
+        model, dummy_input, onnx_path,
+        input_names=['input'],
+        output_names=['output'],
+        dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}},
+        opset_version=13,
+    )
+
+    # Force embed external data into the ONNX file
+    onnx_model = onnx.load(onnx_path)
+    onnx.save_model(onnx_model, onnx_path, save_as_external_data=False)
+    # Clean up the external data file if torch created it
+    if os.path.exists(onnx_path + ".data"):
+        os.remove(onnx_path + ".data")
+    onnx.checker.check_model(onnx.load(onnx_path))
+    export_seconds = time.perf_counter() - t0
+
+    if optimize:
+        from onnx_optimize import optimize_file
+        optimize_file(onnx_path, fp16=fp16)
+
+    images = parity_images(img_size, max(batch_sizes))
+    report = {
+        'model': onnx_path,
+        'export_seconds': export_seconds,
+        'size_kb': os.path.getsize(onnx_path) / 1024,
+        'parity': verify_parity(model, onnx_path, images, batch_sizes),
+    }
+    if optimize and fp16:
+        root, ext = os.path.splitext(onnx_path)
+        fp16_path = f"{root}.fp16{ext}"
+        report['fp16'] = {'model': fp16_path, 'size_kb': os.path.getsize(fp16_path) / 1024,
+                          'parity': verify_parity(model, fp16_path, images, batch_sizes, atol=FP16_ATOL)}
+
+    print_report(report)
+    if report_path:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def print_report(report):
+    print(f"\nExported {report['model']} in {report['export_seconds']:.1f}s ({report['size_kb']:.1f} KB)")
+    for entry in [report] + ([report['fp16']] if 'fp16' in report else []):
+        print(f"Parity vs PyTorch: {entry['model']}")
+        print(f"{'batch':>7}{'max |Δ|':>11}{'argmax':>9}{'torch (ms)':>12}{'onnx (ms)':>11}")
+        for batch_size, r in entry['parity'].items():
+            print(f"{batch_size:>7}{r['max_abs_diff']:>11.2e}{100 * r['argmax_agree']:>8.1f}%"
+                  f"{r['torch_ms']:>12.3f}{r['onnx_ms']:>11.3f}")
@@ -0,0 +1,325 @@
+"""
+onnx_optimize.py — Graph optimization pass for exported CNN ONNX models.
+
+Rewrites the graph with plain ONNX ops (so onnxruntime-web runs it unchanged):
+  • removes Identity and inference-time Dropout nodes
+  • folds BatchNormalization into the preceding Conv's weights and bias
+  • fuses MatMul + Add into Gemm, and Shape/Concat/Reshape batch flattening into Flatten
+  • constant-folds nodes whose inputs are all constants, then drops dead nodes/initializers
+and can also emit an fp16-weights variant (fp16 initializers + Cast, same fp32 interface).
+
+Prints before/after node count, file size and measured onnxruntime latency, and checks
+that the optimized model's outputs still match the original.
+
+    python onnx_optimize.py model/digit_cnn.onnx --fp16
+"""
+
+import os
+import argparse
+import numpy as np
+import onnx
+from onnx import helper, numpy_helper, TensorProto
+
+# ===== Configuration =====
+BN_EPSILON = 1e-5
+PARITY_ATOL = 1e-4
+
+
+class Graph:
+    """Small mutable view over a GraphProto: initializers as numpy, producer/consumer lookups."""
+    def __init__(self, model):
+        self.model = model
+        self.graph = model.graph
+        self.inits = {t.name: numpy_helper.to_array(t) for t in self.graph.initializer}
+        self.nodes = list(self.graph.node)
+        self.outputs = {o.name for o in self.graph.output}
+
+    def consumers(self, name):
+        return [n for n in self.nodes if name in n.input]
+
+    def producer(self, name):
+        return next((n for n in self.nodes if name in n.output), None)
+
+    def rename_input(self, old, new):
+        """Point every consumer (and graph output) of `old` at `new`."""
+        for node in self.nodes:
+            for i, name in enumerate(node.input):
+                if name == old:
+                    node.input[i] = new
+        for out in self.graph.output:
+            if out.name == old:
+                out.name = new
+                self.outputs = {o.name for o in self.graph.output}
+
+    def commit(self):
+        del self.graph.node[:]
+        self.graph.node.extend(self.nodes)
+        del self.graph.initializer[:]
+        self.graph.initializer.extend(numpy_helper.from_array(v, k) for k, v in self.inits.items())
+        return self.model
+
+
+def _attr(node, name, default=None):
+    for a in node.attribute:
+        if a.name == name:
+            return helper.get_attribute_value(a)
+    return default
+
+
+def remove_passthrough(g):
+    """Drop Identity nodes and Dropout nodes whose mask output is unused."""
+    removed = 0
+    for node in list(g.nodes):
+        if node.op_type == 'Identity' or (node.op_type == 'Dropout' and
+                                          (len(node.output) < 2 or not g.consumers(node.output[1]))):
+            src, dst = node.input[0], node.output[0]
+            g.nodes.remove(node)
+            if dst in g.outputs:
+                # Keep the graph output name stable; rename the producer's output instead
+                producer = g.producer(src)
+                if producer is None or src in g.outputs or len(g.consumers(src)) > 0:
+                    g.nodes.append(helper.make_node('Identity', [src], [dst]))
+                    continue
+                producer.output[list(producer.output).index(src)] = dst
+            else:
+                g.rename_input(dst, src)
+            removed += 1
+    return removed
+
+
+def fold_batchnorm(g):
+    """Conv → BatchNormalization becomes a single Conv with rescaled weights and bias."""
+    folded = 0
+    for bn in [n for n in g.nodes if n.op_type == 'BatchNormalization']:
+        conv = g.producer(bn.input[0])
+        if (conv is None or conv.op_type != 'Conv' or len(g.consumers(conv.output[0])) != 1
+                or conv.output[0] in g.outputs or len(bn.output) > 1 and any(g.consumers(o) for o in bn.output[1:])):
+            continue
+        if conv.input[1] not in g.inits or not all(name in g.inits for name in bn.input[1:5]):
+            continue
+
+        scale, bias, mean, var = (g.inits[name].astype(np.float32) for name in bn.input[1:5])
+        eps = _attr(bn, 'epsilon', BN_EPSILON)
+        w = g.inits[conv.input[1]].astype(np.float32)
+        b = g.inits[conv.input[2]].astype(np.float32) if len(conv.input) > 2 else np.zeros(w.shape[0], np.float32)
+
+        factor = scale / np.sqrt(var + eps)
+        w_name, b_name = conv.input[1] + '_bnfold', (conv.input[1] + '_bnfold_bias')
+        g.inits[w_name] = (w * factor.reshape(-1, 1, 1, 1)).astype(np.float32)
+        g.inits[b_name] = ((b - mean) * factor + bias).astype(np.float32)
+        conv.input[1] = w_name
+        if len(conv.input) > 2:
+            conv.input[2] = b_name
+        else:
+            conv.input.append(b_name)
+
+        conv.output[0] = bn.output[0]
+        g.nodes.remove(bn)
+        folded += 1
+    return folded
+
+
+def fuse_matmul_add(g):
+    """MatMul(x, W) + b with constant 2-D W and 1-D b becomes Gemm(x, W, b)."""
+    fused = 0
+    for matmul in [n for n in g.nodes if n.op_type == 'MatMul']:
+        weight = g.inits.get(matmul.input[1])
+        consumers = g.consumers(matmul.output[0])
+        if weight is None or weight.ndim != 2 or len(consumers) != 1 or consumers[0].op_type != 'Add':
+            continue
+        add = consumers[0]
+        bias_name = add.input[1] if add.input[0] == matmul.output[0] else add.input[0]
+        bias = g.inits.get(bias_name)
+        if bias is None or bias.ndim != 1 or matmul.output[0] in g.outputs:
+            continue
+        gemm = helper.make_node('Gemm', [matmul.input[0], matmul.input[1], bias_name], [add.output[0]],
+                                name=(matmul.name or 'matmul') + '_gemm')
+        g.nodes[g.nodes.index(matmul)] = gemm
+        g.nodes.remove(add)
+        fused += 1
+    return fused
+
+
+def fuse_flatten(g):
+    """
+    Reshape(x, Concat(Shape(input)[0:1], [k])) — how exporters spell x.view(x.size(0), -1) —
+    becomes Flatten(x, axis=1). The batch dim is the only dynamic one in these CNNs.
+    """
+    fused = 0
+    for reshape in [n for n in g.nodes if n.op_type == 'Reshape']:
+        concat = g.producer(reshape.input[1])
+        if concat is None or concat.op_type != 'Concat' or len(concat.input) != 2:
+            continue
+        shape, tail = g.producer(concat.input[0]), g.inits.get(concat.input[1])
+        if (shape is None or shape.op_type != 'Shape' or _attr(shape, 'start', 0) != 0
+                or _attr(shape, 'end') != 1 or tail is None or tail.size != 1):
+            continue
+        g.nodes[g.nodes.index(reshape)] = helper.make_node(
+            'Flatten', [reshape.input[0]], [reshape.output[0]], axis=1, name=(reshape.name or 'reshape') + '_flatten')
+        fused += 1
+    return fused
+
+
+def constant_fold(g):
+    """Evaluate nodes whose inputs are all initializers and store their outputs as initializers."""
+    from onnx.reference import ReferenceEvaluator
+    folded = 0
+    for node in list(g.nodes):
+        if node.op_type == 'Constant':
+            g.inits[node.output[0]] = numpy_helper.to_array(_attr(node, 'value'))
+            g.nodes.remove(node)
+            folded += 1
+            continue
+        inputs = [name for name in node.input if name]
+        if not inputs or not all(name in g.inits for name in inputs) or any(o in g.outputs for o in node.output):
+            continue
+        opset = next(o.version for o in g.model.opset_import if o.domain in ('', 'ai.onnx'))
+        single = helper.make_model(
+            helper.make_graph([node], 'fold',
+                              [helper.make_tensor_value_info(n, TensorProto.UNDEFINED, None) for n in inputs],
+                              [helper.make_tensor_value_info(n, TensorProto.UNDEFINED, None) for n in node.output]),
+            opset_imports=[helper.make_opsetid('', opset)])
+        results = ReferenceEvaluator(single).run(None, {n: g.inits[n] for n in inputs})
+        for name, value in zip(node.output, results):
+            g.inits[name] = np.asarray(value)
+        g.nodes.remove(node)
+        folded += 1
+    return folded
+
+
+def remove_dead(g):
+    """Drop nodes that don't reach a graph output, then unused initializers."""
+    needed = set(g.outputs)
+    keep = []
+    for node in reversed(g.nodes):
+        if any(o in needed for o in node.output):
+            keep.append(node)
+            needed.update(node.input)
+    removed = len(g.nodes) - len(keep)
+    g.nodes = list(reversed(keep))
+    for name in list(g.inits):
+        if name not in needed:
+            del g.inits[name]
+    return removed
+
+
+def optimize_model(model):
+    """Apply all passes until nothing changes. Returns (model, per-pass change counts)."""
+    g = Graph(model)
+    counts = {}
+    passes = [('passthrough', remove_passthrough), ('bn_fold', fold_batchnorm), ('gemm', fuse_matmul_add),
+              ('flatten', fuse_flatten), ('const_fold', constant_fold), ('dead', remove_dead)]
+    changed = True
+    while changed:
+        changed = False
+        for name, fn in passes:
+            n = fn(g)
+            counts[name] = counts.get(name, 0) + n
+            changed |= n > 0
+    model = g.commit()
+    # Value info of removed tensors would be stale
+    del model.graph.value_info[:]
+    onnx.checker.check_model(model)
+    return model, counts
+
+
+def to_fp16_weights(model):
+    """Store float initializers as float16 with a Cast back to float32 in front; I/O stays fp32."""
+    model = onnx.ModelProto.FromString(model.SerializeToString())
+    g = Graph(model)
+    casts = []
+    for name, value in list(g.inits.items()):
+        if value.dtype == np.float32 and value.size > 1:
+            half = name + '_fp16'
+            g.inits[half] = value.astype(np.float16)
+            del g.inits[name]
+            casts.append(helper.make_node('Cast', [half], [name], to=TensorProto.FLOAT, name=half + '_cast'))
+    g.nodes = casts + g.nodes
+    model = g.commit()
+    onnx.checker.check_model(model)
+    return model
+
+
+def _max_abs_diff(path_a, path_b, img_size, batch=8):
+    from evaluate import create_session
+    x = np.random.default_rng(0).standard_normal((batch, 1, img_size, img_size)).astype(np.float32)
+    outs = []
+    for path in (path_a, path_b):
+        session = create_session(path)
+        outs.append(session.run(None, {session.get_inputs()[0].name: x})[0])
+    return float(np.abs(outs[0] - outs[1]).max())
+
+
+def _temp_path(path):
+    """A temp .onnx next to `path`, so os.replace into place stays on one filesystem.
+    Created by a plain write, it gets the same umask permissions as a freshly exported model."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.tmp{ext}"
+
+
+def optimize_file(onnx_path, output_path=None, fp16=False):
+    """
+    Optimize an .onnx file (in place by default), print a report and return it. The outputs
+    are written to temp files and only moved into place once they match the original, so a
+    failed parity check leaves output_path as it was.
+    """
+    from quantize import measure_latency
+
+    output_path = output_path or onnx_path
+    original = onnx.load(onnx_path)
+    img_size = original.graph.input[0].type.tensor_type.shape.dim[-1].dim_value
+    before = {'nodes': len(original.graph.node), 'size_kb': os.path.getsize(onnx_path) / 1024,
+              'latency_ms': measure_latency(onnx_path)}
+
+    root, ext = os.path.splitext(output_path)
+    fp16_path = f"{root}.fp16{ext}"
+    staged = {output_path: _temp_path(output_path)}
+    if fp16:
+        staged[fp16_path] = _temp_path(fp16_path)
+    try:
+        model, counts = optimize_model(original)
+        tmp_optimized = staged[output_path]
+        onnx.save_model(model, tmp_optimized, save_as_external_data=False)
+        diff = _max_abs_diff(onnx_path, tmp_optimized, img_size)
+        if diff > PARITY_ATOL:
+            raise RuntimeError(f"Optimized graph output differs from the original by {diff:.2e}; "
+                               f"{output_path} left unchanged")
+        after = {'nodes': len(model.graph.node), 'size_kb': os.path.getsize(tmp_optimized) / 1024,
+                 'latency_ms': measure_latency(tmp_optimized)}
+
+        rows = [('original', before), ('optimized', after)]
+        report = {'passes': counts, 'before': before, 'after': after, 'max_abs_diff': diff}
+        if fp16:
+            tmp_fp16 = staged[fp16_path]
+            onnx.save_model(to_fp16_weights(model), tmp_fp16, save_as_external_data=False)
+            report['fp16'] = {'nodes': len(onnx.load(tmp_fp16).graph.node), 'size_kb': os.path.getsize(tmp_fp16) / 1024,
+                              'latency_ms': measure_latency(tmp_fp16),
+                              'max_abs_diff': _max_abs_diff(onnx_path, tmp_fp16, img_size)}
+            rows.append(('fp16 weights', report['fp16']))
+
+        for final, tmp in staged.items():
+            os.replace(tmp, final)
+    finally:
+        for tmp in staged.values():
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    applied = ', '.join(f"{k}={v}" for k, v in counts.items() if v) or 'already optimal'
+    print(f"\nOptimized {onnx_path}: {applied}")
+    print(f"{'':<14}{'nodes':>7}{'size (KB)':>11}{'latency (ms)':>14}")
+    for name, r in rows:
+        print(f"{name:<14}{r['nodes']:>7}{r['size_kb']:>11.1f}{r['latency_ms']:>14.3f}")
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Optimize an exported ONNX CNN graph.')
+    parser.add_argument('model', help='input .onnx')
+    parser.add_argument('--output', default=None, help='default: overwrite the input')
+    parser.add_argument('--fp16', action='store_true', help='also write a <name>.fp16.onnx fp16-weights variant')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    optimize_file(args.model, args.output, fp16=args.fp16)
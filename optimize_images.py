@@ -0,0 +1,278 @@
+"""
+optimize_images.py — WebP, AVIF and palette PNG variants of the game images at 1x and 2x.
+
+img/ ships full-size PNGs (the title backgrounds alone are ~3.9 MB each), which is slow
+to load over school Wi-Fi. For every image this writes, at each device resolution:
+  • AVIF and WebP at the lowest encoder quality that keeps SSIM to the source above the
+    image's quality floor (binary search over a quality ladder)
+  • a palette-quantized PNG with the fewest colours that passes the same floor
+  • a lossless PNG at 1x, as the fallback every browser can decode
+Sources are treated as 2x; 1x is a half-size INTER_AREA downscale and is compared with
+the source downscaled the same way. SSIM and PSNR are computed on premultiplied RGBA, so
+colour hidden under transparent pixels doesn't count. Files are processed in parallel.
+
+The manifest lists, per image and resolution, every variant that passed and is smaller
+than the lossless PNG, smallest first, ending with that PNG. The game picks the first
+one whose type it can decode:
+
+    {"img/title_bg.png": {"floor": 0.95,
+                          "1x": [{"path": "img/opt/title_bg@1x.avif", "type": "image/avif",
+                                  "bytes": 61234, "ssim": 0.9561, "psnr": 33.1}, ..., {"type": "image/png", ...}],
+                          "2x": [...]}}
+
+    python optimize_images.py                                    # every PNG in img/ -> img/opt/
+    python optimize_images.py img/title_bg.png --floor 'title_bg*=0.95' --formats webp avif
+"""
+
+import io
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import fnmatch
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+from PIL import Image
+
+from image_io import load_image
+
+# ===== Configuration =====
+OUTPUT_DIR = 'img/opt'
+MANIFEST = 'img/opt/manifest.json'
+# Sources are authored for 2x (retina) displays
+SOURCE_SCALE = 2
+SCALES = (1, 2)
+FORMATS = ('avif', 'webp', 'png8')
+# Minimum SSIM to the source; FLOORS overrides it by file-name pattern (first match wins)
+DEFAULT_FLOOR = 0.97
+FLOORS = {
+    # Scaled to the screen height and scrolled, so fine detail is never seen at full size
+    'title_bg*': 0.95,
+    'classroom_bg*': 0.95,
+}
+# Encoder settings tried, from smallest output to largest
+LADDERS = {
+    'avif': [20, 30, 40, 50, 60, 70, 80, 90],
+    'webp': [30, 40, 50, 60, 70, 80, 90, 95],
+    'png8': [16, 32, 64, 128, 256],
+}
+MIME = {'avif': 'image/avif', 'webp': 'image/webp', 'png8': 'image/png', 'png': 'image/png'}
+EXTENSION = {'avif': '.avif', 'webp': '.webp', 'png8': '-q.png', 'png': '.png'}
+
+
+def encode(img, fmt, setting):
+    """RGBA uint8 -> encoded bytes. setting: encoder quality, or palette size for png8."""
+    pil = Image.fromarray(img, 'RGBA')
+    if (img[..., 3] == 255).all():
+        pil = pil.convert('RGB')
+    buf = io.BytesIO()
+    if fmt == 'avif':
+        pil.save(buf, 'AVIF', quality=setting, speed=6)
+    elif fmt == 'webp':
+        pil.save(buf, 'WEBP', quality=setting, method=6)
+    elif fmt == 'png8':
+        # Median cut only handles RGB; octree handles alpha
+        method = Image.Quantize.MEDIANCUT if pil.mode == 'RGB' else Image.Quantize.FASTOCTREE
+        pil.quantize(setting, method=method).save(buf, 'PNG', optimize=True)
+    else:
+        pil.save(buf, 'PNG', optimize=True)
+    return buf.getvalue()
+
+
+def decode(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert('RGBA'))
+
+
+def premultiplied(img):
+    return cv2.cvtColor(np.ascontiguousarray(img), cv2.COLOR_RGBA2mRGBA).astype(np.float32)
+
+
+def ssim_psnr(ref, test):
+    """
+    Mean SSIM (11×11 Gaussian window) and PSNR over the premultiplied RGBA channels, taken
+    over pixels within a window of something visible in either image; otherwise a sprite's
+    empty margins would count as perfect matches.
+    """
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    a, b = premultiplied(ref), premultiplied(test)
+    visible = ((ref[..., 3] > 0) | (test[..., 3] > 0)).view(np.uint8)
+    region = cv2.dilate(visible, np.ones((11, 11), np.uint8)).view(bool)
+    if not region.any():
+        return 1.0, float('inf')
+    mse = float(np.mean((a[region] - b[region]) ** 2))
+    psnr = float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+    ssim = []
+    # One channel at a time keeps the float temporaries to a few image planes
+    for c in range(4):
+        x, y = a[..., c], b[..., c]
+        blur = lambda z: cv2.GaussianBlur(z, (11, 11), 1.5)
+        mx, my = blur(x), blur(y)
+        sxx, syy, sxy = blur(x * x) - mx * mx, blur(y * y) - my * my, blur(x * y) - mx * my
+        s = ((2 * mx * my + c1) * (2 * sxy + c2)) / ((mx * mx + my * my + c1) * (sxx + syy + c2))
+        ssim.append(float(s[region].mean()))
+    return float(np.mean(ssim)), psnr
+
+
+def floor_for(path, overrides=()):
+    name = os.path.basename(path)
+    for pattern, floor in [*overrides, *FLOORS.items()]:
+        if fnmatch.fnmatch(name, pattern):
+            return floor
+    return DEFAULT_FLOOR
+
+
+def scaled(img, scale):
+    if scale == SOURCE_SCALE:
+        return img
+    h, w = img.shape[:2]
+    size = (max(round(w * scale / SOURCE_SCALE), 1), max(round(h * scale / SOURCE_SCALE), 1))
+    return cv2.resize(img, size, interpolation=cv2.INTER_AREA if scale < SOURCE_SCALE else cv2.INTER_LANCZOS4)
+
+
+def variant_path(src, output_dir, scale, fmt):
+    stem = os.path.splitext(os.path.basename(src))[0]
+    return os.path.join(output_dir, f'{stem}@{scale}x{EXTENSION[fmt]}')
+
+
+def optimize(job):
+    """
+    Worker: (src, scale, fmt, floor, output_dir) -> variant dict. Finds the smallest ladder
+    setting whose SSIM clears `floor` and writes it; 'passed' is False if none does.
+    """
+    src, scale, fmt, floor, output_dir = job
+    t0 = time.perf_counter()
+    ref = scaled(load_image(src), scale)
+    path = variant_path(src, output_dir, scale, fmt)
+    os.makedirs(output_dir, exist_ok=True)
+
+    if fmt == 'png':
+        data = encode(ref, fmt, None)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return {'src': src, 'scale': scale, 'format': fmt, 'path': path, 'bytes': len(data),
+                'ssim': 1.0, 'psnr': float('inf'), 'setting': None, 'passed': True,
+                'seconds': time.perf_counter() - t0}
+
+    # Quality is close enough to monotonic in the setting for a binary search
+    ladder = LADDERS[fmt]
+    tried = {}
+    lo, hi = 0, len(ladder) - 1
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        data = encode(ref, fmt, ladder[mid])
+        tried[mid] = (data, *ssim_psnr(ref, decode(data)))
+        if tried[mid][1] >= floor:
+            hi = mid - 1
+        else:
+            lo = mid + 1
+    passed = lo < len(ladder)
+    best = lo if passed else max(tried, key=lambda i: tried[i][1])
+    data, ssim, psnr = tried[best]
+    if passed:
+        with open(path, 'wb') as f:
+            f.write(data)
+    return {'src': src, 'scale': scale, 'format': fmt, 'path': path, 'bytes': len(data), 'ssim': ssim,
+            'psnr': psnr, 'setting': ladder[best], 'passed': passed, 'seconds': time.perf_counter() - t0}
+
+
+def build_manifest(results, floors, scales=SCALES):
+    """{src: {'floor': f, '1x': [variants smallest first, lossless PNG last], ...}}, for the variants that passed."""
+    manifest = {src: {'floor': floor, **{f'{scale}x': [] for scale in scales}} for src, floor in floors.items()}
+    for r in results:
+        if r['passed']:
+            manifest[r['src']][f"{r['scale']}x"].append(
+                {'path': r['path'], 'type': MIME[r['format']], 'bytes': r['bytes'], 'ssim': round(r['ssim'], 4),
+                 'psnr': round(r['psnr'], 2) if np.isfinite(r['psnr']) else None})
+    for src, entry in manifest.items():
+        if SOURCE_SCALE in scales:
+            # The source itself is the lossless fallback at its own resolution
+            entry[f'{SOURCE_SCALE}x'].append(
+                {'path': src, 'type': 'image/png', 'bytes': os.path.getsize(src), 'ssim': 1.0, 'psnr': None})
+        for scale in scales:
+            variants = entry[f'{scale}x']
+            # A lossy variant no smaller than the lossless PNG is never worth picking
+            lossless = [v['bytes'] for v in variants if v['psnr'] is None]
+            if lossless:
+                variants[:] = [v for v in variants if v['psnr'] is None or v['bytes'] < min(lossless)]
+            # Smallest first; the lossless PNG goes last as the fallback every browser decodes
+            variants.sort(key=lambda v: (v['psnr'] is None, v['bytes']))
+    return manifest
+
+
+def report(results):
+    """Bytes saved vs. SSIM/PSNR per variant, against the source PNG's size."""
+    print(f"\n{'image':<32}{'res':>4} {'format':<6}{'setting':>8}{'KB':>9}{'saved':>8}{'SSIM':>8}{'PSNR':>7}")
+    for r in sorted(results, key=lambda r: (r['src'], r['scale'], r['bytes'])):
+        saved = 1 - r['bytes'] / os.path.getsize(r['src'])
+        psnr = f"{r['psnr']:.1f}" if np.isfinite(r['psnr']) else 'inf'
+        mark = '✅' if r['passed'] else '❌'
+        print(f"{os.path.basename(r['src']):<32}{r['scale']:>3}x {r['format']:<6}{r['setting'] or '-':>8}"
+              f"{r['bytes'] / 1024:>9.1f}{100 * saved:>7.1f}%{r['ssim']:>8.4f}{psnr:>7} {mark}")
+
+
+def run(inputs, output_dir, manifest_path, scales=SCALES, formats=FORMATS, overrides=(), workers=None):
+    sources = []
+    for path in inputs:
+        sources += sorted(glob.glob(os.path.join(path, '*.png'))) if os.path.isdir(path) else [path]
+    if not sources:
+        print("Error: no PNG files found")
+        sys.exit(1)
+    missing = [src for src in sources if not os.path.isfile(src)]
+    if missing:
+        print(f"Error: not found: {', '.join(missing)}")
+        sys.exit(1)
+    floors = {src: floor_for(src, overrides) for src in sources}
+    jobs = [(src, scale, fmt, floors[src], output_dir)
+            for src in sources for scale in scales
+            for fmt in (*formats, *(['png'] if scale != SOURCE_SCALE else []))]
+    # Largest images first so the long jobs don't end up last
+    jobs.sort(key=lambda j: -os.path.getsize(j[0]))
+
+    t0 = time.perf_counter()
+    workers = workers or min(len(jobs), os.cpu_count())
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(optimize, jobs))
+    report(results)
+
+    manifest = build_manifest(results, floors, scales)
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1)
+        f.write('\n')
+
+    source_bytes = sum(os.path.getsize(src) for src in sources)
+    best_bytes = sum(min(v['bytes'] for v in entry[f'{scale}x']) for entry in manifest.values() for scale in scales)
+    failed = sum(not r['passed'] for r in results)
+    print(f"\n✅ {len(sources)} image(s), {sum(r['passed'] for r in results)} variants in "
+          f"{time.perf_counter() - t0:.1f}s; smallest per resolution {best_bytes / 2 ** 20:.2f} MB "
+          f"vs {source_bytes / 2 ** 20:.2f} MB of source PNGs"
+          f"{f', {failed} below their quality floor' if failed else ''} → {manifest_path}")
+
+
+def parse_floor(text):
+    pattern, _, value = text.rpartition('=')
+    try:
+        return pattern, float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"floor must be PATTERN=SSIM, e.g. 'title_bg*=0.95': {text}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Write WebP/AVIF/palette PNG variants of images at 1x and 2x.')
+    parser.add_argument('inputs', nargs='*', default=['img'], help='PNG files or directories (default: img)')
+    parser.add_argument('-o', '--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--manifest', default=MANIFEST)
+    parser.add_argument('--scales', type=int, nargs='+', default=list(SCALES), help='device pixel ratios')
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+    parser.add_argument('--floor', type=parse_floor, action='append', default=[],
+                        help='minimum SSIM for file names matching a pattern, e.g. title_bg*=0.95 (repeatable)')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: all cores)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    run(args.inputs, args.output_dir, args.manifest, args.scales, args.formats, args.floor, args.workers)
@@ -0,0 +1,328 @@
+"""
+preprocess.py — Vectorized NumPy port of DigitCNN._preprocessCanvas (js/recognition/digitCNN.js).
+
+Takes a batch of RGBA canvas captures (N, H, W, 4) uint8, at device resolution like
+canvas.getImageData, and returns exactly what the game feeds the model:
+  1. bounding box of pixels with alpha > 20, in CSS pixels (÷ devicePixelRatio)
+  2. 15% padding (of the longer side) on each side, clamped to the canvas
+  3. squared around the padded box's centre
+  4. drawImage of that square onto a 28×28 black canvas (Chrome's bilinear: sample
+     positions snapped to 1/16 pixel, premultiplied 8-bit colour, results truncated)
+  5. gray = (r + g + b) / 3 / 255, normalized to [-1, 1]
+Empty canvases give an all-zero tensor, as in the browser.
+
+Everything runs on whole batches with NumPy indexing, with no per-image Python loop.
+
+    python preprocess.py check                          # vs tensors dumped from headless Chrome
+    python preprocess.py check --literal                # vs the literal port, synthetic drawings
+    python preprocess.py bench --count 20000
+    python preprocess.py build data/classroom_raw --out data/classroom.npz --dpr 2 --workers 8
+
+`build` turns a directory of `<label>/*.png` canvas captures into an .npz of uint8
+28×28 images and labels (the format finetune.py reads), decoding and preprocessing
+chunks of captures in a process pool (--workers). Browser fixtures are an .npz
+with a `dpr` array and, for the i-th devicePixelRatio, `canvases_i` (N, H, W, 4) uint8
+and `expected_i` (N, 1, 28, 28) float32 from _preprocessCanvas;
+adhoc_scripts/dump_preprocess_fixtures.py regenerates data/preprocess_fixtures.npz.
+"""
+
+import os
+import sys
+import math
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# ===== Configuration =====
+IMG_SIZE = 28
+ALPHA_THRESHOLD = 20
+PADDING = 0.15
+# Canvas pixels are 8-bit, so the browser's values are only exact to a couple of LSBs
+PARITY_ATOL = 3 / 255 * 2
+# Skia maps destination pixels to the source in fixed point, so a sample sitting on a 1/16
+# boundary can land in the neighbouring bin; on a stroke edge that is ~10 levels. Allow a
+# few such pixels against the browser (the dumped fixtures have 16 in 18816)
+OUTLIER_RATE = 0.0025
+SUBPIXEL_STEPS = 16
+# Captures per worker task; a 320×240 RGBA capture is 300 KB decoded
+CHUNK_SIZE = 128
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'preprocess_fixtures.npz')
+
+
+def _pixels_u32(canvases):
+    """(N, H, W) uint32 view of RGBA pixels; alpha is the top byte, so v >= a << 24 ⇔ alpha >= a."""
+    return np.ascontiguousarray(canvases).view('<u4')[..., 0]
+
+
+def bounding_boxes(canvases, dpr=1.0, chunk=4):
+    """
+    (x, y, width, height) in CSS pixels of alpha > 20 pixels, as float64 (N,) arrays,
+    and a (N,) mask of non-empty canvases.
+    """
+    n, h, w = canvases.shape[:3]
+    pixels = _pixels_u32(canvases)
+    rows, cols = np.empty((n, h), bool), np.empty((n, w), bool)
+    threshold = (ALPHA_THRESHOLD + 1) << 24
+    # A few canvases at a time stay in cache for both reductions
+    for i in range(0, n, chunk):
+        block = pixels[i:i + chunk]
+        rows[i:i + chunk] = block.max(axis=2) >= threshold
+        cols[i:i + chunk] = block.max(axis=1) >= threshold
+    found = rows.any(axis=1)
+    min_x, max_x = cols.argmax(axis=1), w - 1 - cols[:, ::-1].argmax(axis=1)
+    min_y, max_y = rows.argmax(axis=1), h - 1 - rows[:, ::-1].argmax(axis=1)
+    return min_x / dpr, min_y / dpr, (max_x - min_x) / dpr, (max_y - min_y) / dpr, found
+
+
+def crop_squares(canvases, dpr=1.0):
+    """Source square (sx, sy, side) in device pixels for each canvas, plus the non-empty mask."""
+    x, y, bw, bh, found = bounding_boxes(canvases, dpr)
+    padding = np.maximum(bw, bh) * PADDING
+    bx = np.maximum(0.0, x - padding)
+    by = np.maximum(0.0, y - padding)
+    bw = np.minimum(canvases.shape[2] / dpr - bx, bw + padding * 2)
+    bh = np.minimum(canvases.shape[1] / dpr - by, bh + padding * 2)
+    side = np.maximum(bw, bh)
+    cx = bx + bw / 2 - side / 2
+    cy = by + bh / 2 - side / 2
+    return cx * dpr, cy * dpr, side * dpr, found
+
+
+def _sample_coords(start, side, limit, img_size):
+    """Bilinear taps along one axis: (i0, i1, weight of i1, inside-canvas mask), each (N, S)."""
+    pos = start[:, None] + (np.arange(img_size) + 0.5) * (side[:, None] / img_size)
+    inside = (pos >= 0) & (pos <= limit)
+    pos = np.clip(pos - 0.5, 0, limit - 1)
+    i0 = np.floor(pos).astype(np.int32)
+    i1 = np.minimum(i0 + 1, limit - 1)
+    weight = np.floor((pos - i0) * SUBPIXEL_STEPS) / SUBPIXEL_STEPS
+    return i0, i1, weight.astype(np.float32), inside
+
+
+def draw_crops(canvases, sx, sy, side, img_size=IMG_SIZE):
+    """
+    drawImage(canvas, sx, sy, side, side, 0, 0, S, S) onto black, as (N, S, S, 3) uint8.
+    Bilinear over premultiplied colour with clamp-to-edge inside the canvas; destination
+    pixels whose source falls outside the canvas stay black (the spec clips the source rect).
+    Premultiplied values are rounded to 8 bits as the canvas stores them, and with weights
+    in sixteenths every sum is exact in float32, so truncating matches Skia bit for bit.
+    """
+    n, h, w = canvases.shape[:3]
+    x0, x1, fx, in_x = _sample_coords(sx, side, w, img_size)
+    y0, y1, fy, in_y = _sample_coords(sy, side, h, img_size)
+
+    # All four bilinear taps in one gather over the flattened 32-bit pixels
+    flat = _pixels_u32(canvases).reshape(n, h * w)
+    rows0, rows1 = (y0 * w)[:, :, None], (y1 * w)[:, :, None]
+    index = np.stack([rows0 + x0[:, None, :], rows0 + x1[:, None, :],
+                      rows1 + x0[:, None, :], rows1 + x1[:, None, :]], axis=1)
+    taps = np.take_along_axis(flat, index.reshape(n, -1), axis=1)
+    # Planar (tap, channel, N, S, S) so the per-pixel weights broadcast over contiguous axes
+    taps = taps.view(np.uint8).reshape(n, 4, img_size, img_size, 4).transpose(1, 4, 0, 2, 3).astype(np.float32)
+
+    premultiplied = np.rint(taps[:, :3] * (taps[:, 3:] * np.float32(1 / 255.0)))
+    fx, fy = fx[:, None, :], fy[:, :, None]
+    inside = in_y[:, :, None] & in_x[:, None, :]
+    weights = np.stack([(1 - fy) * (1 - fx), (1 - fy) * fx, fy * (1 - fx), fy * fx]) * inside
+    rgb = np.einsum('tnij,tcnij->nijc', weights, premultiplied)
+    return np.floor(rgb).clip(0, 255).astype(np.uint8)
+
+
+def preprocess_gray(canvases, dpr=1.0, img_size=IMG_SIZE):
+    """Grayscale crops in [0, 1], (N, S, S) float32, and the non-empty mask."""
+    canvases = np.asarray(canvases)
+    sx, sy, side, found = crop_squares(canvases, dpr)
+    pixels = draw_crops(canvases, sx, sy, side, img_size)
+    gray = pixels.astype(np.float32).sum(axis=-1) / 3 / 255.0
+    return gray, found
+
+
+def preprocess_batch(canvases, dpr=1.0, img_size=IMG_SIZE):
+    """Model input (N, 1, S, S) float32 in [-1, 1], identical to _preprocessCanvas per canvas."""
+    gray, found = preprocess_gray(canvases, dpr, img_size)
+    tensor = (gray - 0.5) / 0.5
+    # Empty canvas: the browser returns a zero-filled tensor, not a black image
+    tensor[~found] = 0.0
+    return tensor[:, None]
+
+
+def to_uint8(gray):
+    """[0, 1] crops as MNIST-style uint8 images (light strokes on dark)."""
+    return np.rint(gray * 255).astype(np.uint8)
+
+
+def preprocess_reference(canvas, dpr=1.0, img_size=IMG_SIZE):
+    """Line-by-line port of _getBoundingBox/_preprocessCanvas for one canvas, for parity checks."""
+    h, w = canvas.shape[:2]
+    min_x, min_y, max_x, max_y, found = w, h, 0, 0, False
+    for y in range(h):
+        for x in range(w):
+            if canvas[y, x, 3] > ALPHA_THRESHOLD:
+                min_x, min_y = min(min_x, x), min(min_y, y)
+                max_x, max_y = max(max_x, x), max(max_y, y)
+                found = True
+    if not found:
+        return np.zeros((1, img_size, img_size), np.float32)
+
+    bx_, by_, bw_, bh_ = min_x / dpr, min_y / dpr, (max_x - min_x) / dpr, (max_y - min_y) / dpr
+    padding = max(bw_, bh_) * PADDING
+    bx, by = max(0, bx_ - padding), max(0, by_ - padding)
+    bw = min(w / dpr - bx, bw_ + padding * 2)
+    bh = min(h / dpr - by, bh_ + padding * 2)
+    side = max(bw, bh)
+    cx, cy = bx + bw / 2 - side / 2, by + bh / 2 - side / 2
+    sx, sy, s = cx * dpr, cy * dpr, side * dpr
+
+    out = np.zeros((1, img_size, img_size), np.float32)
+    for i in range(img_size):
+        for j in range(img_size):
+            px, py = sx + (j + 0.5) * s / img_size, sy + (i + 0.5) * s / img_size
+            rgb = [0.0, 0.0, 0.0]
+            if 0 <= px <= w and 0 <= py <= h:
+                px, py = min(max(px - 0.5, 0), w - 1), min(max(py - 0.5, 0), h - 1)
+                x0, y0 = int(px), int(py)
+                x1, y1 = min(x0 + 1, w - 1), min(y0 + 1, h - 1)
+                fx = math.floor((px - x0) * SUBPIXEL_STEPS) / SUBPIXEL_STEPS
+                fy = math.floor((py - y0) * SUBPIXEL_STEPS) / SUBPIXEL_STEPS
+                for c in range(3):
+                    def v(yy, xx):
+                        return round(float(canvas[yy, xx, c]) * float(canvas[yy, xx, 3]) / 255.0)
+                    rgb[c] = math.floor((v(y0, x0) * (1 - fx) + v(y0, x1) * fx) * (1 - fy)
+                                        + (v(y1, x0) * (1 - fx) + v(y1, x1) * fx) * fy)
+            gray = (rgb[0] + rgb[1] + rgb[2]) / 3 / 255.0
+            out[0, i, j] = (gray - 0.5) / 0.5
+    return out
+
+
+def synthetic_canvases(count, height=240, width=320, seed=0):
+    """Random chalk scribbles (DrawingCanvas style: #f8f9fa, width 10, round caps) on transparent canvases."""
+    from PIL import Image, ImageDraw
+    rng = np.random.default_rng(seed)
+    canvases = np.zeros((count, height, width, 4), np.uint8)
+    for k in range(count):
+        if k % 10 == 9:
+            continue  # keep a few empty canvases
+        img = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(img)
+        for _ in range(rng.integers(1, 4)):
+            pts = [tuple(p) for p in rng.uniform((0, 0), (width, height), size=(rng.integers(2, 6), 2))]
+            draw.line(pts, fill=(248, 249, 250, 255), width=10, joint='curve')
+        canvases[k] = np.asarray(img)
+    return canvases
+
+
+def load_fixtures(path):
+    """[(dpr, canvases, expected)] for each devicePixelRatio in a browser fixture archive."""
+    archive = np.load(path)
+    return [(float(dpr), archive[f'canvases_{i}'], archive[f'expected_{i}']) for i, dpr in enumerate(archive['dpr'])]
+
+
+def check(fixtures=FIXTURES, count=20):
+    """Compare preprocess_batch against browser fixtures, or the literal port when fixtures is None."""
+    if fixtures:
+        groups, source, allowed = load_fixtures(fixtures), fixtures, OUTLIER_RATE
+    else:
+        canvases = synthetic_canvases(count)
+        groups = [(1.0, canvases, np.stack([preprocess_reference(c) for c in canvases]))]
+        # Same arithmetic on both sides, so every pixel has to agree
+        source, allowed = f"{count} synthetic drawings (literal port)", 0.0
+    diffs = []
+    for dpr, canvases, expected in groups:
+        diffs.append(np.abs(preprocess_batch(canvases, dpr, expected.shape[-1]) - expected).ravel())
+        print(f"  dpr {dpr:g}: {len(canvases)} canvases of {canvases.shape[2]}×{canvases.shape[1]}, "
+              f"max |Δ| = {diffs[-1].max():.4f}")
+    diffs = np.concatenate(diffs)
+    outliers = float((diffs > PARITY_ATOL).mean())
+    ok = outliers <= allowed
+    print(f"{'✅' if ok else '❌'} max |Δ| = {diffs.max():.4f}, {outliers:.2%} of pixels beyond "
+          f"{PARITY_ATOL:.4f} (allowed {allowed:.2%}) against {source}")
+    return ok
+
+
+def bench(count=20000, height=240, width=320, batch_size=1024):
+    # Batches cycle through one pool of synthetic drawings, so memory stays at one batch
+    pool = synthetic_canvases(batch_size, height, width)
+    preprocess_batch(pool)
+    t0 = time.perf_counter()
+    for i in range(0, count, batch_size):
+        preprocess_batch(pool[:min(batch_size, count - i)])
+    elapsed = time.perf_counter() - t0
+    print(f"{count} canvases of {width}×{height}: {count / elapsed:,.0f} drawings/s ({elapsed:.2f}s)")
+
+
+def preprocess_chunk(job):
+    """Worker: [(png path, label)] -> (uint8 images, int64 labels) of the non-empty captures, in order."""
+    from PIL import Image
+    items, dpr, img_size = job
+    canvases = [np.asarray(Image.open(path).convert('RGBA')) for path, _ in items]
+    images = np.empty((len(items), img_size, img_size), np.uint8)
+    found = np.empty(len(items), bool)
+    groups = {}
+    for i, canvas in enumerate(canvases):
+        groups.setdefault(canvas.shape, []).append(i)
+    # Same-sized captures are processed as one batch
+    for index in groups.values():
+        gray, found[index] = preprocess_gray(np.stack([canvases[i] for i in index]), dpr, img_size)
+        images[index] = to_uint8(gray)
+    labels = np.array([label for _, label in items], np.int64)
+    return images[found], labels[found]
+
+
+def build(directory, out, dpr=1.0, img_size=IMG_SIZE, workers=None, chunk_size=CHUNK_SIZE):
+    """<label>/*.png canvas captures -> .npz with uint8 `images` and int64 `labels`, in file order."""
+    workers = workers or os.cpu_count()
+    items = []
+    for label in sorted(os.listdir(directory)):
+        class_dir = os.path.join(directory, label)
+        if not (os.path.isdir(class_dir) and label.isdigit()):
+            continue
+        items += [(os.path.join(class_dir, name), int(label))
+                  for name in sorted(os.listdir(class_dir)) if name.lower().endswith('.png')]
+    if not items:
+        raise ValueError(f"No <label>/*.png canvas captures found in {directory}")
+
+    t0 = time.perf_counter()
+    images, labels = [], []
+    # PNG decoding dominates, so chunks of paths go to the pool and come back in order
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = ((items[i:i + chunk_size], dpr, img_size) for i in range(0, len(items), chunk_size))
+        for chunk_images, chunk_labels in pool.map(preprocess_chunk, jobs):
+            images.append(chunk_images)
+            labels.append(chunk_labels)
+    images, labels = np.concatenate(images), np.concatenate(labels)
+    elapsed = time.perf_counter() - t0
+    np.savez_compressed(out, images=images, labels=labels)
+    print(f"✅ {len(images)} drawings preprocessed to {out} in {elapsed:.2f}s "
+          f"({len(items) / elapsed:,.0f} captures/s, {workers} worker(s))")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Batch port of the browser digit preprocessing.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('check', help='parity against browser fixtures or the literal port')
+    p.add_argument('--fixtures', default=FIXTURES, help='.npz dumped by adhoc_scripts/dump_preprocess_fixtures.py')
+    p.add_argument('--literal', action='store_true', help='compare with the literal port on synthetic drawings')
+    p.add_argument('--count', type=int, default=20, help='synthetic drawings for --literal')
+    p = sub.add_parser('bench', help='throughput on synthetic canvases')
+    p.add_argument('--count', type=int, default=20000)
+    p.add_argument('--size', default='320x240', help='canvas WIDTHxHEIGHT in device pixels')
+    p = sub.add_parser('build', help='preprocess <label>/*.png captures into an .npz dataset')
+    p.add_argument('directory')
+    p.add_argument('--out', required=True)
+    p.add_argument('--dpr', type=float, default=1.0, help='devicePixelRatio the captures were taken at')
+    p.add_argument('--img-size', type=int, default=IMG_SIZE)
+    p.add_argument('--workers', type=int, default=None, help='process pool size (default: all cores)')
+    p.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='captures per worker task')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.command == 'check':
+        sys.exit(0 if check(None if args.literal else args.fixtures, args.count) else 1)
+    elif args.command == 'bench':
+        width, height = (int(v) for v in args.size.split('x'))
+        bench(args.count, height, width)
+    else:
+        build(args.directory, args.out, args.dpr, args.img_size, args.workers, args.chunk_size)
@@ -0,0 +1,283 @@
+"""
+prune.py — Structured channel pruning with fine-tuning for DigitCNN and GreekCNN.
+
+Filters of each Conv → BatchNorm pair are ranked by |BN γ| (a channel whose scale is
+near zero contributes almost nothing after normalization). The lowest-ranked
+channels are physically removed: the conv's output filters, the BN parameters, the
+next conv's input channels and, after the last block, the matching Linear columns.
+The result is a genuinely smaller dense model, fine-tuned briefly and exported
+through onnx_export (parity-checked against the pruned PyTorch model).
+
+Each prune ratio in the sweep is reported with FLOPs, params, ONNX size, onnxruntime
+latency and accuracy, before and after fine-tuning.
+
+    python prune.py                                         # DigitCNN, MNIST
+    python prune.py --ratios 0.25 0.5 0.75 --export 0.5     # writes model/digit_cnn_pruned.onnx
+    python prune.py --model greek --data data/greek_train.npz --test-data data/greek_test.npz
+
+GreekCNN has no bundled dataset, so its fine-tuning and accuracy need --data /
+--test-data (.npz with `images` (N, 64, 64) uint8 and `labels`); without them only
+FLOPs, size and latency are reported.
+"""
+
+import os
+import copy
+import math
+import argparse
+import tempfile
+import itertools
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.optim as optim
+
+import get_mnist_model as mnist
+from augment import BatchRandomAffine
+from finetune import ArrayData
+from mnist_data import MNISTArrays, BatchLoader
+from onnx_export import export_onnx
+from quantize import measure_latency
+
+# ===== Configuration =====
+RATIOS = (0.25, 0.5, 0.75)
+FINETUNE_STEPS = 500
+LR = 5e-4
+BATCH_SIZE = 64
+# Never prune a layer below this many channels
+MIN_CHANNELS = 4
+
+
+def conv_bn_pairs(model):
+    """(index of Conv, index of BN) pairs in model.features, in order."""
+    layers = list(model.features)
+    return [(i, i + 1) for i, layer in enumerate(layers[:-1])
+            if isinstance(layer, nn.Conv2d) and isinstance(layers[i + 1], nn.BatchNorm2d)]
+
+
+def channel_ranking(bn):
+    """Channel indices of `bn`, most important (largest |γ|) first."""
+    return torch.argsort(bn.weight.detach().abs(), descending=True)
+
+
+def _conv(conv, out_idx=None, in_idx=None):
+    weight = conv.weight.detach()
+    if out_idx is not None:
+        weight = weight[out_idx]
+    if in_idx is not None:
+        weight = weight[:, in_idx]
+    new = nn.Conv2d(weight.shape[1], weight.shape[0], conv.kernel_size, conv.stride, conv.padding,
+                    bias=conv.bias is not None)
+    new.weight.data.copy_(weight)
+    if conv.bias is not None:
+        new.bias.data.copy_(conv.bias.detach()[out_idx] if out_idx is not None else conv.bias.detach())
+    return new
+
+
+def _bn(bn, idx):
+    new = nn.BatchNorm2d(len(idx), eps=bn.eps, momentum=bn.momentum)
+    for name in ('weight', 'bias'):
+        getattr(new, name).data.copy_(getattr(bn, name).detach()[idx])
+    for name in ('running_mean', 'running_var'):
+        getattr(new, name).copy_(getattr(bn, name)[idx])
+    new.num_batches_tracked.copy_(bn.num_batches_tracked)
+    return new
+
+
+def _linear(linear, channels, idx):
+    """Keep the input columns of channels `idx`; Flatten lays out each channel's positions contiguously."""
+    per_channel = linear.in_features // channels
+    cols = (idx[:, None] * per_channel + torch.arange(per_channel)).reshape(-1)
+    new = nn.Linear(len(cols), linear.out_features)
+    new.weight.data.copy_(linear.weight.detach()[:, cols])
+    new.bias.data.copy_(linear.bias.detach())
+    return new
+
+
+def shrink(model, keep):
+    """Copy of `model` keeping channel indices keep[i] of the i-th conv block."""
+    model = copy.deepcopy(model).cpu()
+    features = model.features
+    prev_idx = None
+    for (conv_i, bn_i), idx in zip(conv_bn_pairs(model), keep):
+        channels = features[bn_i].num_features
+        features[conv_i] = _conv(features[conv_i], out_idx=idx, in_idx=prev_idx)
+        features[bn_i] = _bn(features[bn_i], idx)
+        prev_idx = idx
+
+    linear_i, linear = next((i, m) for i, m in enumerate(model.classifier) if isinstance(m, nn.Linear))
+    model.classifier[linear_i] = _linear(linear, channels, prev_idx)
+    return model
+
+
+def prune_model(model, ratio, min_channels=MIN_CHANNELS):
+    """Copy of `model` with `ratio` of every conv block's channels removed (lowest |γ| first)."""
+    keep = []
+    for _, bn_i in conv_bn_pairs(model):
+        bn = model.features[bn_i]
+        n = max(min_channels, int(math.ceil(bn.num_features * (1 - ratio))))
+        # Sorted so surviving channels keep their original relative order
+        keep.append(torch.sort(channel_ranking(bn)[:n]).values)
+    return shrink(model, keep)
+
+
+def block_widths(model):
+    return [model.features[bn_i].num_features for _, bn_i in conv_bn_pairs(model)]
+
+
+def load_pruned(path):
+    """Rebuild a model saved by `sweep(export_ratio=...)` from its block widths and state dict."""
+    saved = torch.load(path, map_location='cpu', weights_only=True)
+    model, _, _ = load_model(saved['model'], checkpoint=False)
+    model = shrink(model, [torch.arange(w) for w in saved['widths']])
+    model.load_state_dict(saved['state_dict'])
+    return model.eval()
+
+
+def count_flops(model, img_size):
+    """Multiply-accumulates of Conv2d and Linear layers for one image."""
+    macs = []
+
+    def hook(module, inputs, output):
+        if isinstance(module, nn.Conv2d):
+            kernel = module.weight[0].numel()  # in_channels / groups × kh × kw
+            macs.append(output.numel() * kernel)
+        else:
+            macs.append(module.in_features * module.out_features)
+
+    handles = [m.register_forward_hook(hook) for m in model.modules() if isinstance(m, (nn.Conv2d, nn.Linear))]
+    model.eval()
+    with torch.no_grad():
+        model(torch.zeros(1, 1, img_size, img_size, device=next(model.parameters()).device))
+    for h in handles:
+        h.remove()
+    return sum(macs)
+
+
+def load_model(name, checkpoint=None):
+    """(model, img_size, file stem) for 'digit' or 'greek'. checkpoint=False skips loading weights."""
+    if name == 'digit':
+        model, img_size, stem = mnist.DigitCNN(num_classes=10), mnist.IMG_SIZE, 'digit_cnn'
+        default = os.path.join(mnist.MODEL_DIR, 'digit_cnn.pt')
+    else:
+        from export_onnx import GreekCNN, IMG_SIZE
+        model, img_size, stem = GreekCNN(num_classes=12), IMG_SIZE, 'greek_cnn'
+        default = os.path.join(mnist.MODEL_DIR, 'greek_cnn.pth')
+    if checkpoint is not False:
+        model.load_state_dict(torch.load(checkpoint or default, map_location='cpu', weights_only=True))
+    return model.eval(), img_size, stem
+
+
+def load_npz(path):
+    archive = np.load(path)
+    return ArrayData(torch.from_numpy(np.ascontiguousarray(archive['images'], dtype=np.uint8)),
+                     torch.from_numpy(archive['labels']).long())
+
+
+def fine_tune(model, train_loader, steps=FINETUNE_STEPS, lr=LR):
+    """`steps` Adam steps over (repeated) passes of `train_loader`."""
+    model.to(mnist.DEVICE).train()
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+    criterion = nn.CrossEntropyLoss()
+    batches = itertools.chain.from_iterable(itertools.repeat(train_loader))
+    for images, labels in itertools.islice(batches, steps):
+        optimizer.zero_grad()
+        loss = criterion(model(images), labels)
+        loss.backward()
+        optimizer.step()
+    return model.eval()
+
+
+def profile(model, img_size, test_loader, onnx_path):
+    """FLOPs, params, accuracy (None without test data) and exported ONNX size/latency."""
+    model.to(mnist.DEVICE)
+    row = {
+        'macs': count_flops(model, img_size),
+        'params': sum(p.numel() for p in model.parameters()),
+        'accuracy': mnist.evaluate_model(model, test_loader) if test_loader is not None else None,
+    }
+    export_onnx(model, onnx_path, img_size)
+    row['size_kb'] = os.path.getsize(onnx_path) / 1024
+    row['latency_ms'] = measure_latency(onnx_path)
+    return row
+
+
+def print_table(rows):
+    def acc(value):
+        return f"{value:>9.2f}%" if value is not None else f"{'n/a':>10}"
+
+    base = rows['base']
+    print(f"\n{'ratio':>6}{'MMACs':>9}{'params':>10}{'size (KB)':>11}{'latency (ms)':>14}{'speedup':>9}"
+          f"{'acc pruned':>12}{'acc tuned':>11}")
+    for ratio, r in rows.items():
+        label = ratio if ratio == 'base' else f"{ratio:.2f}"
+        print(f"{label:>6}{r['macs'] / 1e6:>9.2f}{r['params']:>10,}{r['size_kb']:>11.1f}{r['latency_ms']:>14.3f}"
+              f"{base['latency_ms'] / r['latency_ms']:>8.2f}x{acc(r.get('acc_pruned')):>12}{acc(r['accuracy']):>11}")
+
+
+def sweep(name='digit', ratios=RATIOS, steps=FINETUNE_STEPS, lr=LR, data=None, test_data=None,
+          checkpoint=None, export_ratio=None, seed=mnist.SEED):
+    torch.manual_seed(seed)
+    model, img_size, stem = load_model(name, checkpoint)
+    if export_ratio is not None and export_ratio not in ratios:
+        ratios = list(ratios) + [export_ratio]
+
+    if name == 'digit':
+        train_data, test_set = MNISTArrays('train'), MNISTArrays('test')
+    else:
+        train_data = load_npz(data) if data else None
+        test_set = load_npz(test_data) if test_data else None
+    augment = BatchRandomAffine()
+    train_loader = (BatchLoader(train_data, batch_size=BATCH_SIZE, shuffle=True, augment=augment, device=mnist.DEVICE,
+                                generator=torch.Generator().manual_seed(seed)) if train_data is not None else None)
+    test_loader = BatchLoader(test_set, batch_size=1000, device=mnist.DEVICE) if test_set is not None else None
+    if train_loader is None:
+        print("⚠️  No training data for fine-tuning; pruned models are reported without it")
+
+    # The unpruned model lives under its own key, so a requested ratio of 0 can't overwrite it
+    rows, pruned_models = {}, {}
+    with tempfile.TemporaryDirectory() as tmp:
+        rows['base'] = profile(model, img_size, test_loader, os.path.join(tmp, 'base.onnx'))
+        for ratio in ratios:
+            print(f"\nPruning {ratio:.0%} of the channels in every block...")
+            pruned = prune_model(model, ratio)
+            acc_pruned = (mnist.evaluate_model(pruned.to(mnist.DEVICE), test_loader)
+                          if test_loader is not None else None)
+            if train_loader is not None:
+                fine_tune(pruned, train_loader, steps, lr)
+            rows[ratio] = {**profile(pruned, img_size, test_loader, os.path.join(tmp, f'pruned_{ratio}.onnx')),
+                           'acc_pruned': acc_pruned}
+            pruned_models[ratio] = pruned
+
+    print_table(rows)
+
+    if export_ratio is not None:
+        pruned = pruned_models[export_ratio].cpu()
+        onnx_path = os.path.join(mnist.MODEL_DIR, f'{stem}_pruned.onnx')
+        # Layer shapes no longer match the class defaults, so keep the widths to rebuild it (load_pruned)
+        torch.save({'model': name, 'widths': block_widths(pruned), 'state_dict': pruned.state_dict()},
+                   os.path.join(mnist.MODEL_DIR, f'{stem}_pruned.pt'))
+        export_onnx(pruned, onnx_path, img_size)
+        print(f"\n✅ {export_ratio:.0%}-pruned model exported to {onnx_path}")
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Structured channel pruning + fine-tuning sweep.')
+    parser.add_argument('--model', choices=['digit', 'greek'], default='digit')
+    parser.add_argument('--checkpoint', default=None, help='state dict (default: model/digit_cnn.pt or greek_cnn.pth)')
+    parser.add_argument('--ratios', type=float, nargs='+', default=list(RATIOS),
+                        help='fractions of channels to remove from every block')
+    parser.add_argument('--steps', type=int, default=FINETUNE_STEPS, help='fine-tuning steps per ratio')
+    parser.add_argument('--lr', type=float, default=LR)
+    parser.add_argument('--data', default=None, help='.npz training set (required to fine-tune GreekCNN)')
+    parser.add_argument('--test-data', default=None, help='.npz test set (required to score GreekCNN)')
+    parser.add_argument('--export', type=float, default=None, metavar='RATIO',
+                        help='write model/<name>_pruned.onnx/.pt at this prune ratio')
+    parser.add_argument('--seed', type=int, default=mnist.SEED)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    sweep(args.model, ratios=args.ratios, steps=args.steps, lr=args.lr, data=args.data, test_data=args.test_data,
+          checkpoint=args.checkpoint, export_ratio=args.export, seed=args.seed)
@@ -0,0 +1,165 @@
+"""
+quantize.py — Static INT8 post-training quantization of digit_cnn.onnx.
+
+Produces model/digit_cnn.int8.onnx (QDQ format, per-channel weights) calibrated on
+a subset of the MNIST images in data/MNIST/raw, then reports file size, accuracy
+and CPU latency against the fp32 model. Exits non-zero (and removes the INT8
+file) if accuracy drops by more than --max-drop points.
+
+    python quantize.py                      # model/digit_cnn.onnx -> model/digit_cnn.int8.onnx
+    python quantize.py --calib-size 2000 --max-drop 0.3
+
+Calibration uses the training split when its images are present. Otherwise it
+falls back to the first images of the test split and scores accuracy on the rest,
+so calibration and evaluation images never overlap.
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+from evaluate import create_session, load_onnx_predictor, evaluate
+from mnist_data import DATA_ROOT, IDX_FILES, load_arrays
+
+# ===== Configuration =====
+MODEL_DIR = os.path.join(os.path.dirname(__file__), 'model')
+CALIB_SIZE = 1000
+CALIB_BATCH = 100
+# Max allowed drop in test accuracy (percentage points) vs. the fp32 model
+MAX_DROP = 0.5
+
+
+def int8_path(onnx_path):
+    root, ext = os.path.splitext(onnx_path)
+    return f"{root}.int8{ext}"
+
+
+def _normalized(images):
+    return ((np.asarray(images, dtype=np.float32)[:, None] / 255.0) - 0.5) / 0.5
+
+
+def calibration_split(root=DATA_ROOT):
+    """'train' if its images are in data/MNIST/raw, else 'test'."""
+    raw_dir = os.path.join(root, 'MNIST', 'raw')
+    name = IDX_FILES['train'][0]
+    if any(os.path.exists(os.path.join(raw_dir, n)) for n in (name, name + '.gz')):
+        return 'train'
+    return 'test'
+
+
+def load_calibration_and_test(calib_size=CALIB_SIZE, seed=0):
+    """Return (calibration images, test images, test labels), all normalized float32."""
+    test_images, test_labels = load_arrays('test')
+    test_images, test_labels = _normalized(test_images), np.asarray(test_labels, dtype=np.int64)
+
+    split = calibration_split()
+    rng = np.random.default_rng(seed)
+    if split == 'train':
+        train_images, _ = load_arrays('train')
+        idx = np.sort(rng.choice(len(train_images), calib_size, replace=False))
+        calib = _normalized(train_images[idx])
+    else:
+        print(f"⚠️  Training images not in data/MNIST/raw; calibrating on the first {calib_size} test "
+              f"images and scoring accuracy on the remaining {len(test_images) - calib_size}")
+        calib = test_images[:calib_size]
+        test_images, test_labels = test_images[calib_size:], test_labels[calib_size:]
+    return calib, test_images, test_labels
+
+
+class MNISTCalibrationReader:
+    """onnxruntime CalibrationDataReader over pre-normalized calibration images."""
+    def __init__(self, images, input_name, batch_size=CALIB_BATCH):
+        self.batches = iter([{input_name: images[i:i + batch_size]}
+                             for i in range(0, len(images), batch_size)])
+
+    def get_next(self):
+        return next(self.batches, None)
+
+
+def measure_latency(path, runs=200, threads=1):
+    """Median batch-1 latency in ms on CPU."""
+    session = create_session(path, threads)
+    input_meta = session.get_inputs()[0]
+    input_name, img_size = input_meta.name, input_meta.shape[-1]
+    x = np.zeros((1, 1, img_size, img_size), dtype=np.float32)
+    for _ in range(10):
+        session.run(None, {input_name: x})
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        session.run(None, {input_name: x})
+        times.append(time.perf_counter() - t0)
+    return 1000 * float(np.median(times))
+
+
+def quantize_model(onnx_path=None, output_path=None, calib_size=CALIB_SIZE, max_drop=MAX_DROP,
+                   per_channel=True, method='minmax'):
+    """Quantize, evaluate and report. Returns the report dict; exits with status 1 on too large a drop."""
+    from onnxruntime.quantization import (CalibrationMethod, QuantFormat, QuantType, quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    onnx_path = onnx_path or os.path.join(MODEL_DIR, 'digit_cnn.onnx')
+    output_path = output_path or int8_path(onnx_path)
+    calib, test_images, test_labels = load_calibration_and_test(calib_size)
+
+    print(f"\nQuantizing {onnx_path} (static INT8, QDQ, {len(calib)} calibration images)...")
+    input_name = create_session(onnx_path).get_inputs()[0].name
+    with tempfile.TemporaryDirectory() as tmp:
+        # Shape inference + graph cleanup first, as onnxruntime recommends for static quantization
+        prepped = os.path.join(tmp, 'prepped.onnx')
+        quant_pre_process(onnx_path, prepped, skip_symbolic_shape=True)
+        quantize_static(
+            prepped, output_path, MNISTCalibrationReader(calib, input_name),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel,
+            calibrate_method={'minmax': CalibrationMethod.MinMax,
+                              'entropy': CalibrationMethod.Entropy,
+                              'percentile': CalibrationMethod.Percentile}[method],
+        )
+
+    report = {}
+    for name, path in (('fp32', onnx_path), ('int8', output_path)):
+        predict, _ = load_onnx_predictor(path)
+        preds, _ = evaluate(predict, test_images, test_labels)
+        report[name] = {
+            'size_kb': os.path.getsize(path) / 1024,
+            'accuracy': 100.0 * float((preds == test_labels).mean()),
+            'latency_ms': measure_latency(path),
+        }
+
+    fp32, int8 = report['fp32'], report['int8']
+    print(f"\n{'':<14}{'fp32':>10}{'int8':>10}{'Δ':>10}")
+    print(f"{'size (KB)':<14}{fp32['size_kb']:>10.1f}{int8['size_kb']:>10.1f}{int8['size_kb'] - fp32['size_kb']:>+10.1f}")
+    print(f"{'accuracy (%)':<14}{fp32['accuracy']:>10.2f}{int8['accuracy']:>10.2f}{int8['accuracy'] - fp32['accuracy']:>+10.2f}")
+    print(f"{'latency (ms)':<14}{fp32['latency_ms']:>10.3f}{int8['latency_ms']:>10.3f}{int8['latency_ms'] - fp32['latency_ms']:>+10.3f}")
+
+    drop = fp32['accuracy'] - int8['accuracy']
+    if drop > max_drop:
+        os.remove(output_path)
+        print(f"❌ INT8 accuracy dropped {drop:.2f} points (limit {max_drop}); removed {output_path}")
+        sys.exit(1)
+    print(f"✅ INT8 model saved to {output_path}")
+    return report
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Static INT8 quantization of an MNIST ONNX model.')
+    parser.add_argument('model', nargs='?', default=os.path.join(MODEL_DIR, 'digit_cnn.onnx'))
+    parser.add_argument('--output', default=None, help='default: <model>.int8.onnx')
+    parser.add_argument('--calib-size', type=int, default=CALIB_SIZE, help='number of calibration images')
+    parser.add_argument('--method', choices=['minmax', 'entropy', 'percentile'], default='minmax')
+    parser.add_argument('--per-tensor', action='store_true', help='per-tensor instead of per-channel weights')
+    parser.add_argument('--max-drop', type=float, default=MAX_DROP,
+                        help='fail if accuracy drops more than this many points')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    quantize_model(args.model, args.output, calib_size=args.calib_size, max_drop=args.max_drop,
+                   per_channel=not args.per_tensor, method=args.method)
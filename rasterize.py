@@ -0,0 +1,243 @@
+"""
+rasterize.py — Bulk rasterizer for DrawingCanvas stroke logs.
+
+DrawingCanvas (and the $P templates in js/recognition/templates.js) record drawings
+as `{x, y, id}` points in CSS pixels, where `id` is the stroke number. This renders
+them the way the game sees them:
+  • consecutive points of a stroke joined by 10px round-capped lines (DrawingCanvas._applyStyle)
+  • cropped to the ink bounding box, padded 15% and squared (DigitCNN._preprocessCanvas)
+  • chalk (#f8f9fa) on black, as uint8 images; normalize with mnist_data.normalize
+Lines are drawn from an exact distance field to each segment, so edges are
+anti-aliased at the output resolution (28×28, or 64×64 for the Greek model).
+
+Input is JSONL, one drawing per line: {"points": [{"x":.., "y":.., "id":..}, ...], "label": ..}
+("label" is required) with optional "width"/"height" of the canvas (the padded box is clamped to it, as in
+the browser). Chunks of drawings are rendered in a process pool and written as they
+finish, so millions of drawings stream to disk in fixed-size shards:
+
+    python rasterize.py logs/strokes.jsonl --out data/strokes28 --workers 8
+    python rasterize.py logs/greek.jsonl --out data/greek64 --size 64
+
+Output: images-00000.npy (N, S, S) uint8, labels-00000.npy, ... and manifest.json.
+ShardedDrawings(out_dir) reads them back as one memory-mapped dataset.
+"""
+
+import os
+import sys
+import json
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+
+from preprocess import IMG_SIZE, PADDING
+
+# ===== Configuration =====
+LINE_WIDTH = 10
+# Mean of #f8f9fa, the chalk colour
+CHALK = (0xf8 + 0xf9 + 0xfa) / 3 / 255.0
+CHUNK_SIZE = 2048
+SHARD_SIZE = 65536
+# Upper bound on floats per distance-field block (pixels × segments × drawings)
+BLOCK_ELEMENTS = 1 << 16
+FAR = 1e6
+
+
+def parse_drawing(record):
+    """JSON record -> (segments (K, 4) float32 in CSS px, canvas (width, height) or None, label)."""
+    points = record['points']
+    xy = np.array([(p['x'], p['y']) for p in points], dtype=np.float32).reshape(-1, 2)
+    ids = np.array([p.get('id', 0) for p in points])
+    # Segments join consecutive points of the same stroke, as in DrawingCanvas._redraw
+    same = ids[1:] == ids[:-1]
+    segments = np.concatenate([xy[:-1], xy[1:]], axis=1)[same]
+    canvas = (record['width'], record['height']) if 'width' in record and 'height' in record else None
+    if 'label' not in record:
+        raise ValueError('drawing has no "label"')
+    return segments, canvas, record['label']
+
+
+def crop_square(segments, canvas=None):
+    """(sx, sy, side) of the padded square crop in CSS px, or None for an empty drawing."""
+    if len(segments) == 0:
+        return None
+    pts = segments.reshape(-1, 2)
+    # Round caps extend the ink by half the line width around every point
+    lo, hi = pts.min(axis=0) - LINE_WIDTH / 2, pts.max(axis=0) + LINE_WIDTH / 2
+    if canvas is not None:
+        lo, hi = np.maximum(lo, 0), np.minimum(hi, canvas)
+    x, y = max(lo[0], 0.0), max(lo[1], 0.0)
+    bw, bh = hi[0] - x, hi[1] - y
+    padding = max(bw, bh) * PADDING
+    bx, by = max(0.0, x - padding), max(0.0, y - padding)
+    bw, bh = bw + padding * 2, bh + padding * 2
+    if canvas is not None:
+        bw, bh = min(canvas[0] - bx, bw), min(canvas[1] - by, bh)
+    side = max(bw, bh)
+    return bx + bw / 2 - side / 2, by + bh / 2 - side / 2, side
+
+
+def render_block(segments, half_widths, img_size):
+    """
+    Coverage images for a block of drawings.
+    segments: (B, K, 4) in output pixel units, padded with far-away dummies.
+    half_widths: (B,) line half-width in output pixels. Returns (B, S, S) float32 in [0, 1].
+    """
+    centres = np.arange(img_size, dtype=np.float32) + 0.5
+    px = np.broadcast_to(centres[None, :], (img_size, img_size)).reshape(1, -1, 1)
+    py = np.broadcast_to(centres[:, None], (img_size, img_size)).reshape(1, -1, 1)
+
+    ax, ay = segments[:, None, :, 0], segments[:, None, :, 1]
+    dx, dy = segments[:, None, :, 2] - ax, segments[:, None, :, 3] - ay
+    length2 = np.maximum(dx * dx + dy * dy, 1e-12)
+    t = np.clip(((px - ax) * dx + (py - ay) * dy) / length2, 0.0, 1.0)
+    ex, ey = px - (ax + t * dx), py - (ay + t * dy)
+    dist = np.sqrt((ex * ex + ey * ey).min(axis=2))
+    # Box-filter approximation: fully covered inside the line, linear ramp over the edge pixel
+    coverage = np.clip(half_widths[:, None] + 0.5 - dist, 0.0, 1.0)
+    return coverage.reshape(-1, img_size, img_size)
+
+
+def render_drawings(drawings, img_size=IMG_SIZE):
+    """List of (segments, canvas) -> (N, S, S) uint8 chalk-on-black images."""
+    images = np.zeros((len(drawings), img_size, img_size), np.uint8)
+    prepared = []
+    for i, (segments, canvas) in enumerate(drawings):
+        crop = crop_square(segments, canvas)
+        if crop is None:
+            continue
+        sx, sy, side = crop
+        scale = img_size / side
+        seg = (segments - np.array([sx, sy, sx, sy], np.float32)) * np.float32(scale)
+        prepared.append((i, seg, LINE_WIDTH / 2 * scale))
+
+    # Similar segment counts together keep the padding small
+    prepared.sort(key=lambda item: len(item[1]))
+    start = 0
+    while start < len(prepared):
+        end = start + 1
+        while end < len(prepared) and (end - start + 1) * len(prepared[end][1]) * img_size ** 2 <= BLOCK_ELEMENTS:
+            end += 1
+        block = prepared[start:end]
+        k = len(block[-1][1])
+        segments = np.full((len(block), k, 4), FAR, np.float32)
+        for j, (_, seg, _) in enumerate(block):
+            segments[j, :len(seg)] = seg
+        half_widths = np.array([hw for _, _, hw in block], np.float32)
+        coverage = render_block(segments, half_widths, img_size)
+        images[[i for i, _, _ in block]] = np.rint(coverage * (CHALK * 255)).astype(np.uint8)
+        start += len(block)
+    return images
+
+
+def render_chunk(job):
+    """Worker: (line number, raw JSONL line) pairs -> (images, labels)."""
+    lines, img_size = job
+    parsed = []
+    for number, line in lines:
+        try:
+            parsed.append(parse_drawing(json.loads(line)))
+        except ValueError as e:
+            raise ValueError(f"line {number}: {e}") from None
+    images = render_drawings([(segments, canvas) for segments, canvas, _ in parsed], img_size)
+    return images, np.array([label for _, _, label in parsed])
+
+
+class ShardWriter:
+    """Appends rendered chunks and flushes fixed-size shards plus a manifest as it goes."""
+    def __init__(self, out_dir, img_size, shard_size=SHARD_SIZE):
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.img_size = img_size
+        self.shard_size = shard_size
+        self.images, self.labels = [], []
+        self.buffered = 0
+        self.shards = []
+
+    def add(self, images, labels):
+        self.images.append(images)
+        self.labels.append(labels)
+        self.buffered += len(images)
+        while self.buffered >= self.shard_size:
+            self._flush(self.shard_size)
+
+    def _flush(self, count):
+        images, labels = np.concatenate(self.images), np.concatenate(self.labels)
+        index = len(self.shards)
+        np.save(os.path.join(self.out_dir, f'images-{index:05d}.npy'), images[:count])
+        np.save(os.path.join(self.out_dir, f'labels-{index:05d}.npy'), labels[:count])
+        self.shards.append(count)
+        self.images, self.labels = [images[count:]], [labels[count:]]
+        self.buffered -= count
+        self._write_manifest()
+
+    def _write_manifest(self):
+        manifest = {'img_size': self.img_size, 'line_width': LINE_WIDTH, 'shards': self.shards,
+                    'count': sum(self.shards)}
+        with open(os.path.join(self.out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+
+    def close(self):
+        if self.buffered:
+            self._flush(self.buffered)
+        return sum(self.shards)
+
+
+class ShardedDrawings:
+    """Memory-mapped view over a rasterize.py output directory: .images / .labels per shard, len()."""
+    def __init__(self, out_dir):
+        with open(os.path.join(out_dir, 'manifest.json'), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.images = [np.load(os.path.join(out_dir, f'images-{i:05d}.npy'), mmap_mode='r')
+                       for i in range(len(self.manifest['shards']))]
+        self.labels = [np.load(os.path.join(out_dir, f'labels-{i:05d}.npy'))
+                       for i in range(len(self.manifest['shards']))]
+
+    def __len__(self):
+        return self.manifest['count']
+
+    def arrays(self):
+        """All images and labels as in-memory arrays."""
+        return np.concatenate(self.images), np.concatenate(self.labels)
+
+
+def rasterize(path, out_dir, img_size=IMG_SIZE, workers=None, chunk_size=CHUNK_SIZE, shard_size=SHARD_SIZE):
+    workers = workers or os.cpu_count()
+    writer = ShardWriter(out_dir, img_size, shard_size)
+    with open(path, encoding='utf-8') as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        lines = ((number, line) for number, line in enumerate(f, 1) if line.strip())
+        chunks = iter(lambda: list(itertools.islice(lines, chunk_size)), [])
+        pending, done_count = [], 0
+        # A bounded window of chunks in flight; results are written back in input order
+        for chunk in itertools.chain(chunks, [None]):
+            if chunk is not None:
+                pending.append(pool.submit(render_chunk, (chunk, img_size)))
+            while pending and (chunk is None or len(pending) >= 2 * workers):
+                wait([pending[0]], return_when=FIRST_COMPLETED)
+                images, labels = pending.pop(0).result()
+                writer.add(images, labels)
+                done_count += len(images)
+                print(f"\r  {done_count:,} drawings rasterized", end='', flush=True)
+    total = writer.close()
+    print(f"\n✅ {total:,} drawings written to {out_dir} ({len(writer.shards)} shard(s))")
+    return total
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Rasterize DrawingCanvas stroke logs into training images.')
+    parser.add_argument('strokes', help='JSONL, one {"points": [{x, y, id}, ...], "label": ...} per line')
+    parser.add_argument('--out', required=True, help='output directory for .npy shards')
+    parser.add_argument('--size', type=int, default=IMG_SIZE, help='output size (28 digits, 64 Greek)')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='drawings per worker task')
+    parser.add_argument('--shard-size', type=int, default=SHARD_SIZE, help='drawings per output shard')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    try:
+        rasterize(args.strokes, args.out, args.size, args.workers, args.chunk_size, args.shard_size)
+    except ValueError as e:
+        print(f"\nError: {args.strokes}: {e}")
+        sys.exit(1)
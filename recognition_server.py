@@ -0,0 +1,387 @@
+"""
+recognition_server.py — LAN recognition server with dynamic micro-batching over digit_cnn.onnx.
+
+For classroom devices too slow for onnxruntime-web. The model is loaded once, and
+concurrent requests are coalesced into micro-batches (up to --max-batch images, waiting
+at most --max-wait-ms for the batch to fill) that run through the model's dynamic
+batch axis in a worker thread, so the event loop keeps accepting connections. Request
+decoding (base64, PNG, canvas preprocessing) runs in worker threads as well.
+
+    python recognition_server.py serve --port 8765 --max-batch 32 --max-wait-ms 5
+    python recognition_server.py load --url http://127.0.0.1:8765 --students 32 --requests 50
+
+Endpoints (plain asyncio HTTP/1.1, keep-alive, CORS open for the game page):
+  POST /recognize   JSON {"tensor": [784 floats]}  — the exact input DigitCNN feeds the model
+                    JSON {"png": "<base64>", "dpr": 2} or a raw image/png body — an RGBA canvas
+                    capture, preprocessed like the browser (preprocess.py)
+                    -> {name, symbol, confidence, Name, Score}, as DigitCNN.recognize returns
+  GET  /metrics     request/batch counters, batch size histogram, latency and queue-wait percentiles
+  GET  /health
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import base64
+import asyncio
+import argparse
+import numpy as np
+
+from evaluate import MODEL_DIR, create_session
+
+# ===== Configuration =====
+HOST = '0.0.0.0'
+PORT = 8765
+MAX_BATCH = 32
+MAX_WAIT_MS = 5.0
+IMG_SIZE = 28
+MAX_BODY = 8 << 20
+# Latency samples kept for the metrics percentiles
+METRICS_WINDOW = 10000
+
+
+def softmax(logits):
+    e = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def load_class_names(num_classes):
+    path = os.path.join(MODEL_DIR, 'class_names.json')
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    return {str(i): {'name': str(i), 'symbol': str(i)} for i in range(num_classes)}
+
+
+def decode_input(body, content_type):
+    """Request body -> (1, 28, 28) float32 model input."""
+    if content_type.startswith('image/png'):
+        png, dpr = body, 1.0
+    else:
+        payload = json.loads(body)
+        if 'tensor' in payload:
+            x = np.asarray(payload['tensor'], dtype=np.float32)
+            if x.size != IMG_SIZE * IMG_SIZE:
+                raise ValueError(f"tensor must have {IMG_SIZE * IMG_SIZE} values, got {x.size}")
+            return x.reshape(1, IMG_SIZE, IMG_SIZE)
+        png, dpr = base64.b64decode(payload['png']), float(payload.get('dpr', 1.0))
+
+    from PIL import Image
+    from preprocess import preprocess_batch
+    canvas = np.asarray(Image.open(io.BytesIO(png)).convert('RGBA'))
+    return preprocess_batch(canvas[None], dpr, IMG_SIZE)[0]
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batch_sizes = {}
+        self.latencies = []
+        self.queue_waits = []
+        self.inference_ms = []
+
+    def record_batch(self, size, inference_ms):
+        self.batches += 1
+        self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+        self.inference_ms = (self.inference_ms + [inference_ms])[-METRICS_WINDOW:]
+
+    def record_request(self, latency_ms, wait_ms):
+        self.requests += 1
+        self.latencies.append(latency_ms)
+        self.queue_waits.append(wait_ms)
+        if len(self.latencies) > 2 * METRICS_WINDOW:
+            self.latencies = self.latencies[-METRICS_WINDOW:]
+            self.queue_waits = self.queue_waits[-METRICS_WINDOW:]
+
+    def snapshot(self):
+        def pct(values):
+            if not values:
+                return {}
+            p50, p95, p99 = np.percentile(values[-METRICS_WINDOW:], [50, 95, 99])
+            return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+        uptime = time.perf_counter() - self.started
+        return {
+            'uptime_s': uptime,
+            'requests': self.requests,
+            'errors': self.errors,
+            'requests_per_sec': self.requests / uptime if uptime else 0.0,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'batch_sizes': {str(k): v for k, v in sorted(self.batch_sizes.items())},
+            'latency_ms': pct(self.latencies),
+            'queue_wait_ms': pct(self.queue_waits),
+            'inference_ms': pct(self.inference_ms),
+        }
+
+
+class MicroBatcher:
+    """Coalesces single-image requests into batches of up to max_batch, waiting at most max_wait_ms."""
+    def __init__(self, model_path, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, threads=None):
+        self.session = create_session(model_path, threads)
+        self.input_name = self.session.get_inputs()[0].name
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.metrics = Metrics()
+        num_classes = self.session.get_outputs()[0].shape[-1]
+        self.class_names = load_class_names(num_classes if isinstance(num_classes, int) else 10)
+
+    async def recognize(self, x):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((x, future, time.perf_counter()))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Whatever queued up meanwhile rides along, up to max_batch
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            inputs = np.stack([x for x, _, _ in batch])
+            t0 = time.perf_counter()
+            try:
+                logits = await loop.run_in_executor(
+                    None, lambda: self.session.run(None, {self.input_name: inputs})[0])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            self.metrics.record_batch(len(batch), 1000 * (done - t0))
+
+            probs = softmax(logits)
+            for (_, future, queued), p in zip(batch, probs):
+                if not future.done():
+                    future.set_result((p, 1000 * (t0 - queued)))
+
+    def result(self, probs):
+        """Same shape as DigitCNN.recognize in js/recognition/digitCNN.js."""
+        best = int(probs.argmax())
+        info = self.class_names.get(str(best))
+        symbol = info['symbol'] if info else '?'
+        return {
+            'name': info['name'] if info else 'Unknown',
+            'symbol': symbol,
+            'confidence': float(probs[best]),
+            'Name': symbol,  # Backwards compat with game
+            'Score': float(probs[best]),
+        }
+
+
+# ===== HTTP =====
+STATUS = {200: 'OK', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large',
+          500: 'Internal Server Error'}
+
+
+async def read_request(reader):
+    """(method, path, headers, body) or None when the client closed the connection."""
+    line = await reader.readline()
+    if not line:
+        return None
+    method, path, _ = line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > MAX_BODY:
+        raise ValueError('body too large')
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+def write_response(writer, status, payload=None, keep_alive=True):
+    body = json.dumps(payload).encode() if payload is not None else b''
+    head = [f"HTTP/1.1 {status} {STATUS[status]}",
+            'Content-Type: application/json',
+            f'Content-Length: {len(body)}',
+            'Access-Control-Allow-Origin: *',
+            'Access-Control-Allow-Methods: GET, POST, OPTIONS',
+            'Access-Control-Allow-Headers: Content-Type',
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode() + body)
+
+
+async def handle(batcher, reader, writer):
+    try:
+        while True:
+            try:
+                request = await read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                write_response(writer, 400, {'error': 'malformed request'}, keep_alive=False)
+                break
+            if request is None:
+                break
+            method, path, headers, body = request
+            keep_alive = headers.get('connection', '').lower() != 'close'
+            path = path.split('?', 1)[0]
+
+            if method == 'OPTIONS':
+                write_response(writer, 204, keep_alive=keep_alive)
+            elif method == 'GET' and path == '/health':
+                write_response(writer, 200, {'status': 'ok'}, keep_alive)
+            elif method == 'GET' and path == '/metrics':
+                write_response(writer, 200, batcher.metrics.snapshot(), keep_alive)
+            elif method == 'POST' and path == '/recognize':
+                t0 = time.perf_counter()
+                try:
+                    # Base64/PNG decoding and canvas preprocessing would otherwise stall every
+                    # connection and the batch timer, so they run in a worker thread too
+                    x = await asyncio.get_running_loop().run_in_executor(
+                        None, decode_input, body, headers.get('content-type', 'application/json'))
+                except Exception as e:
+                    batcher.metrics.errors += 1
+                    write_response(writer, 400, {'error': str(e)}, keep_alive)
+                else:
+                    try:
+                        probs, wait_ms = await batcher.recognize(x)
+                    except Exception as e:
+                        batcher.metrics.errors += 1
+                        write_response(writer, 500, {'error': str(e)}, keep_alive)
+                    else:
+                        batcher.metrics.record_request(1000 * (time.perf_counter() - t0), wait_ms)
+                        write_response(writer, 200, batcher.result(probs), keep_alive)
+            else:
+                write_response(writer, 404, {'error': f'{method} {path} not found'}, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionResetError, BrokenPipeError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(model_path, host=HOST, port=PORT, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, threads=None):
+    batcher = MicroBatcher(model_path, max_batch, max_wait_ms, threads)
+    server = await asyncio.start_server(lambda r, w: handle(batcher, r, w), host, port)
+    print(f"Serving {model_path} on http://{host}:{port}  (max batch {max_batch}, max wait {max_wait_ms} ms)")
+    async with server:
+        await asyncio.gather(server.serve_forever(), batcher.run())
+
+
+# ===== Load generator =====
+async def http_request(reader, writer, host, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b''
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\n\r\n").encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':')[1])
+    return status, json.loads(await reader.readexactly(length)) if length else None
+
+
+def sample_tensors(count):
+    """Normalized MNIST test images when available, otherwise random strokes-on-black noise."""
+    try:
+        from evaluate import load_test_set
+        images, labels = load_test_set(IMG_SIZE)
+        return images[:count, 0], labels[:count]
+    except Exception:
+        rng = np.random.default_rng(0)
+        return rng.uniform(-1, 1, (count, IMG_SIZE, IMG_SIZE)).astype(np.float32), None
+
+
+async def student(host, port, tensors, labels, requests, think_ms, latencies, correct, seed):
+    rng = np.random.default_rng(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for _ in range(requests):
+            i = int(rng.integers(len(tensors)))
+            t0 = time.perf_counter()
+            status, result = await http_request(reader, writer, host, 'POST', '/recognize',
+                                                {'tensor': tensors[i].ravel().tolist()})
+            latencies.append(1000 * (time.perf_counter() - t0))
+            if status == 200 and labels is not None:
+                correct.append(result['symbol'] == str(labels[i]))
+            if think_ms:
+                await asyncio.sleep(rng.exponential(think_ms / 1000))
+    finally:
+        writer.close()
+
+
+async def load_test(url, students=32, requests=50, think_ms=0.0):
+    host, _, port = url.split('://', 1)[-1].rstrip('/').partition(':')
+    port = int(port or 80)
+    tensors, labels = sample_tensors(1000)
+    latencies, correct = [], []
+
+    print(f"{students} simulated students × {requests} requests against {url}...")
+    t0 = time.perf_counter()
+    await asyncio.gather(*(student(host, port, tensors, labels, requests, think_ms, latencies, correct, seed)
+                           for seed in range(students)))
+    elapsed = time.perf_counter() - t0
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, metrics = await http_request(reader, writer, host, 'GET', '/metrics')
+    writer.close()
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    print(f"\nClient:  {len(latencies) / elapsed:,.0f} requests/s over {elapsed:.1f}s   "
+          f"latency p50 {p50:.1f} ms  p95 {p95:.1f} ms  p99 {p99:.1f} ms")
+    if correct:
+        print(f"         accuracy on MNIST test samples: {100 * np.mean(correct):.2f}%")
+    print(f"Server:  {metrics['batches']} batches, mean batch size {metrics['mean_batch_size']:.1f}, "
+          f"queue wait p50 {metrics['queue_wait_ms'].get('p50', 0):.2f} ms, "
+          f"inference p50 {metrics['inference_ms'].get('p50', 0):.2f} ms")
+    print(f"         batch sizes: {metrics['batch_sizes']}")
+    return metrics
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Micro-batching recognition server for digit_cnn.onnx.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('serve', help='run the server')
+    p.add_argument('--model', default=os.path.join(MODEL_DIR, 'digit_cnn.onnx'))
+    p.add_argument('--host', default=HOST)
+    p.add_argument('--port', type=int, default=PORT)
+    p.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    p.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+    p.add_argument('--threads', type=int, default=None, help='onnxruntime intra-op threads')
+    p = sub.add_parser('load', help='simulate students hitting a running server')
+    p.add_argument('--url', default=f'http://127.0.0.1:{PORT}')
+    p.add_argument('--students', type=int, default=32, help='concurrent clients')
+    p.add_argument('--requests', type=int, default=50, help='requests per student')
+    p.add_argument('--think-ms', type=float, default=0.0, help='mean pause between a student\'s requests')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.command == 'serve':
+        if not os.path.exists(args.model):
+            print(f"Error: model not found at {args.model}")
+            sys.exit(1)
+        try:
+            asyncio.run(serve(args.model, args.host, args.port, args.max_batch, args.max_wait_ms, args.threads))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(load_test(args.url, args.students, args.requests, args.think_ms))
@@ -0,0 +1,202 @@
+"""
+recolor.py — Palette variants of sprites from recolour rules compiled into colour lookup tables.
+
+recolor_bus.py and recolor_bus_white.py each hardcode one target colour and run a full
+RGB→HSV→RGB round trip over the sheet with masked edits, so every new bus colour meant
+a new script and another pair of conversions. Here a Rule (a hue band plus thresholds,
+and what to do with it: target hue, saturation/value scaling, a protected stripe) is
+compiled into a lookup table over the image's colours:
+  • the image's distinct RGBA pixels are found once (a sort) and converted to HSV
+    once, however many variants are made; sprites have tens of thousands of colours,
+    not hundreds of thousands of pixels
+  • compiling a rule edits only the palette entries in its band and converts just those
+    back to RGB; colours outside the band are kept exactly instead of round-tripping
+  • applying a table is one np.take of packed uint32 pixels, alpha included
+  • protect_rows restores a stripe of rows from the original (the white bus's yellow band)
+
+    python recolor.py img/sunnie_minibus_sheet.png --preset rust white -o img/buses/
+    python recolor.py img/sunnie_minibus_sheet.png --hues 0 60 90 120 150 -o img/buses/
+    python recolor.py img/sunnie_minibus_sheet.png --rules buses.json -o img/buses/ --bench
+
+buses.json maps variant names to Rule fields: {"teal": {"target_hue": 90, "sat": 0.8}}.
+Also available as the `recolor_hsv` op in build_assets.py.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from collections import namedtuple
+import cv2
+import numpy as np
+
+from image_io import load_image, save_image
+from compositing import as_pixels
+
+# ===== Configuration =====
+# OpenCV hue units (0-179). hue: inclusive band, wrapping through red when hue[0] > hue[1];
+# pixels also need saturation > min_sat and value > min_val. target_hue replaces the hue,
+# set_sat the saturation (else it is scaled by sat), and value is scaled by val.
+# protect_rows: [start, end) rows left as they were.
+Rule = namedtuple('Rule', ['hue', 'min_sat', 'min_val', 'target_hue', 'sat', 'val', 'set_sat', 'protect_rows'],
+                  defaults=((15, 40), 100, 100, None, 1.0, 1.0, None, None))
+PRESETS = {
+    # recolor_bus.py: earthy orange
+    'rust': Rule(hue=(20, 35), target_hue=21, sat=0.8, val=0.9),
+    # recolor_bus_white.py: white body, yellow stripe across rows 110-125
+    'white': Rule(set_sat=10, val=1.5, protect_rows=(110, 125)),
+}
+
+
+def palette(img):
+    """(distinct RGBA pixels as packed uint32, each pixel's index into them as an (H, W) intp array)."""
+    pixels = as_pixels(np.ascontiguousarray(img))
+    # Sorting uint32 is far cheaper than np.unique's argsort for the inverse; searchsorted finds it instead
+    ordered = np.sort(pixels, axis=None)
+    colors = ordered[np.concatenate(([True], ordered[1:] != ordered[:-1]))]
+    return colors, np.searchsorted(colors, pixels)
+
+
+def palette_hsv(colors):
+    """HSV of packed RGBA colours, as a (K, 1, 3) uint8 array."""
+    rgb = colors.view(np.uint8).reshape(-1, 1, 4)[..., :3]
+    return cv2.cvtColor(np.ascontiguousarray(rgb), cv2.COLOR_RGB2HSV)
+
+
+def compile_lut(rule, colors, hsv=None):
+    """The colours `colors` (packed uint32) become under `rule`, as a same-shape lookup table."""
+    hsv = palette_hsv(colors) if hsv is None else hsv
+    h, s, v = hsv[:, 0, 0], hsv[:, 0, 1], hsv[:, 0, 2]
+    lo, hi = rule.hue
+    band = (h >= lo) & (h <= hi) if lo <= hi else (h >= lo) | (h <= hi)
+    mask = band & (s > rule.min_sat) & (v > rule.min_val)
+
+    edited = hsv[mask]
+    if rule.target_hue is not None:
+        edited[:, 0, 0] = rule.target_hue
+    if rule.set_sat is not None:
+        edited[:, 0, 1] = rule.set_sat
+    else:
+        edited[:, 0, 1] = np.clip(edited[:, 0, 1] * rule.sat, 0, 255).astype(np.uint8)
+    edited[:, 0, 2] = np.clip(edited[:, 0, 2] * rule.val, 0, 255).astype(np.uint8)
+
+    lut = colors.copy()
+    if len(edited):
+        lut.view(np.uint8).reshape(-1, 4)[mask, :3] = cv2.cvtColor(edited, cv2.COLOR_HSV2RGB)[:, 0]
+    return lut
+
+
+def apply_lut(img, lut, index, protect_rows=None):
+    """One gather of `lut` by each pixel's palette index; protect_rows are copied from `img`."""
+    out = np.empty((*index.shape, 4), np.uint8)
+    np.take(lut, index, out=as_pixels(out))
+    if protect_rows is not None:
+        out[protect_rows[0]:protect_rows[1]] = img[protect_rows[0]:protect_rows[1]]
+    return out
+
+
+def recolor(img, rule):
+    colors, index = palette(img)
+    return apply_lut(img, compile_lut(rule, colors), index, rule.protect_rows)
+
+
+def recolor_variants(img, rules):
+    """{name: recoloured image} for each of `rules` ({name: Rule}), sharing one palette."""
+    colors, index = palette(img)
+    hsv = palette_hsv(colors)
+    return {name: apply_lut(img, compile_lut(rule, colors, hsv), index, rule.protect_rows)
+            for name, rule in rules.items()}
+
+
+def recolor_hsv_reference(img, rule):
+    """The per-image HSV round trip of recolor_bus.py / recolor_bus_white.py, kept as the benchmark baseline."""
+    h, s, v = cv2.split(cv2.cvtColor(img[..., :3], cv2.COLOR_RGB2HSV))
+    lo, hi = rule.hue
+    band = (h >= lo) & (h <= hi) if lo <= hi else (h >= lo) | (h <= hi)
+    mask = band & (s > rule.min_sat) & (v > rule.min_val)
+    if rule.protect_rows is not None:
+        mask[rule.protect_rows[0]:rule.protect_rows[1]] = False
+    if rule.target_hue is not None:
+        h[mask] = rule.target_hue
+    s[mask] = rule.set_sat if rule.set_sat is not None else np.clip(s[mask] * rule.sat, 0, 255).astype(np.uint8)
+    v[mask] = np.clip(v[mask] * rule.val, 0, 255).astype(np.uint8)
+    out = img.copy()
+    out[..., :3] = cv2.cvtColor(cv2.merge([h, s, v]), cv2.COLOR_HSV2RGB)
+    return out
+
+
+def bench(img, rules, runs=5):
+    def reference():
+        return {name: recolor_hsv_reference(img, rule) for name, rule in rules.items()}
+
+    results = {}
+    for name, fn in [('HSV round trip per variant', reference), ('compiled LUT', lambda: recolor_variants(img, rules))]:
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            out = fn()
+        results[name] = ((time.perf_counter() - t0) / runs * 1000, out)
+
+    print(f"{len(rules)} variants of a {img.shape[1]}×{img.shape[0]} image, {runs} runs")
+    for name, (ms, _) in results.items():
+        print(f"  {name:<28}{ms:>8.1f} ms")
+    (t_old, a), (t_new, b) = results.values()
+    # The round trip also shifts colours outside the band by a few levels; the LUT leaves them alone
+    recoloured = {n: (b[n] != img).any(axis=2) for n in rules}
+    diff = max(int(np.abs(a[n].astype(np.int16) - b[n])[m].max(initial=0)) for n, m in recoloured.items())
+    drift = max(int(np.abs(a[n].astype(np.int16) - img)[~m].max(initial=0)) for n, m in recoloured.items())
+    print(f"{t_old / t_new:.1f}x faster; max difference {diff} on recoloured pixels, "
+          f"{drift} from the round trip elsewhere")
+
+
+def load_rules(args):
+    rules = {name: PRESETS[name] for name in args.preset}
+    rules.update({f'hue{h}': Rule(target_hue=h) for h in args.hues})
+    if args.rules:
+        with open(args.rules, encoding='utf-8') as f:
+            fields = json.load(f)
+        try:
+            rules.update({name: Rule(**{k: tuple(v) if isinstance(v, list) else v for k, v in rule.items()})
+                          for name, rule in fields.items()})
+        except TypeError as e:
+            print(f"Error: {args.rules}: {e}")
+            sys.exit(1)
+    return rules
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Make palette variants of sprites with compiled recolour rules.')
+    parser.add_argument('inputs', nargs='+', help='sprite or sheet PNGs')
+    parser.add_argument('-o', '--output', help='output directory; variants are written as <name>_<variant>.png')
+    parser.add_argument('--preset', nargs='+', choices=list(PRESETS), default=[])
+    parser.add_argument('--hues', type=int, nargs='+', default=[],
+                        help='one variant per target hue (0-179) of the default yellow band')
+    parser.add_argument('--rules', help='JSON of {variant: {Rule field: value}}')
+    parser.add_argument('--bench', action='store_true', help='compare with an HSV round trip per variant')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    rules = load_rules(args)
+    if not rules:
+        print("Error: give at least one of --preset, --hues or --rules")
+        sys.exit(1)
+    if not args.output and not args.bench:
+        print("Error: --output is required unless --bench is given")
+        sys.exit(1)
+
+    for path in args.inputs:
+        img = load_image(path)
+        if args.bench:
+            bench(img, rules)
+        if not args.output:
+            continue
+        t0 = time.perf_counter()
+        variants = recolor_variants(img, rules)
+        elapsed = time.perf_counter() - t0
+        stem = os.path.splitext(os.path.basename(path))[0]
+        for name, out in variants.items():
+            save_image(os.path.join(args.output, f'{stem}_{name}.png'), out)
+        print(f"✅ {len(variants)} variant(s) of {path} in {elapsed * 1000:.1f} ms → {args.output}")
@@ -0,0 +1,154 @@
+"""
+remove_background.py — Vectorized key-colour background removal for sprites and backgrounds.
+
+Replaces the per-pixel getdata() loops of adhoc_scripts/remove_bg.py and process_sprite.py.
+Pixels matching the key become transparent (RGB is kept, as in remove_bg.py). Keys:
+  • top-left  the colour of pixel (0, 0), matched within --tolerance (remove_bg.py, process_sprite.py)
+  • magenta   R > 200, G < 50, B > 200, the generator background (composite_bus.py)
+  • R,G,B     an explicit colour, matched within --tolerance, e.g. 255,255,255 (make_favicon.py)
+The mask is computed in row chunks, so temporaries stay at a few MB however large the
+image is. With --flood only key-coloured regions connected to the image border are
+removed, so the same colour inside the sprite (eyes, windows) survives.
+
+    python remove_background.py raw/sprite.png -o img/sprite.png
+    python remove_background.py raw/buses/ -o img/buses/ --key magenta --flood --workers 4
+
+Also available as the `remove_bg` op in build_assets.py.
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+from image_io import load_image, save_image
+
+# ===== Configuration =====
+TOLERANCE = 30
+# Rows per chunk; at 4K width that is ~2 MB per uint16 temporary
+CHUNK_ROWS = 256
+# Per-channel inclusive (low, high) ranges of named keys
+KEY_RANGES = {
+    'magenta': ((201, 255), (0, 49), (201, 255)),
+}
+
+
+def key_mask_chunk(rgb, key, tolerance=TOLERANCE, metric='sum'):
+    """Boolean mask of pixels matching `key` in an (h, W, 3) uint8 chunk."""
+    if isinstance(key, str):
+        (r0, r1), (g0, g1), (b0, b1) = KEY_RANGES[key]
+        r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+        return (r >= r0) & (r <= r1) & (g >= g0) & (g <= g1) & (b >= b0) & (b <= b1)
+    key = np.asarray(key, np.uint8)
+    # Per-channel |c - k| in uint8 (max - min never wraps), accumulated without a widened RGB copy
+    dist = np.zeros(rgb.shape[:2], np.uint16)
+    for c in range(3):
+        channel = rgb[..., c]
+        diff = np.maximum(channel, key[c]) - np.minimum(channel, key[c])
+        if metric == 'sum':
+            dist += diff
+        else:
+            np.maximum(dist, diff, out=dist)
+    return dist < tolerance
+
+
+def key_mask(img, key='top-left', tolerance=TOLERANCE, metric='sum', chunk_rows=CHUNK_ROWS):
+    """(H, W) bool mask of background pixels, computed chunk by chunk."""
+    if isinstance(key, str) and key == 'top-left':
+        key = img[0, 0, :3].copy()
+    mask = np.empty(img.shape[:2], bool)
+    for y in range(0, img.shape[0], chunk_rows):
+        mask[y:y + chunk_rows] = key_mask_chunk(img[y:y + chunk_rows, :, :3], key, tolerance, metric)
+    return mask
+
+
+def border_connected(mask):
+    """Keep only the parts of `mask` 4-connected to the image border."""
+    # A ring of ones around the mask joins every border-touching region into one component
+    padded = np.pad(mask.view(np.uint8), 1, constant_values=1)
+    _, labels = cv2.connectedComponents(padded, connectivity=4, ltype=cv2.CV_32S)
+    return labels[1:-1, 1:-1] == labels[0, 0]
+
+
+def remove_background(img, key='top-left', tolerance=TOLERANCE, metric='sum', flood=False,
+                      chunk_rows=CHUNK_ROWS):
+    """Zero the alpha of background pixels of an RGBA image, in place. Returns the image."""
+    mask = key_mask(img, key, tolerance, metric, chunk_rows)
+    if flood:
+        mask = border_connected(mask)
+    for y in range(0, img.shape[0], chunk_rows):
+        img[y:y + chunk_rows, :, 3][mask[y:y + chunk_rows]] = 0
+    return img
+
+
+def parse_key(text):
+    if text in ('top-left', *KEY_RANGES):
+        return text
+    try:
+        color = [int(c) for c in text.split(',')]
+    except ValueError:
+        color = []
+    if len(color) != 3:
+        raise argparse.ArgumentTypeError(f"key must be top-left, {', '.join(KEY_RANGES)} or R,G,B: {text}")
+    return color
+
+
+def process_file(job):
+    """Worker: (src, dst, options) -> (src, seconds, fraction removed)."""
+    src, dst, options = job
+    t0 = time.perf_counter()
+    img = load_image(src)
+    before = np.count_nonzero(img[..., 3])
+    remove_background(img, **options)
+    save_image(dst, img)
+    removed = (before - np.count_nonzero(img[..., 3])) / img[..., 3].size
+    return src, time.perf_counter() - t0, removed
+
+
+def run(inputs, output, options, workers=None):
+    """Process image files, or every PNG in directories, into `output` (a file or directory)."""
+    jobs = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for src in sorted(glob.glob(os.path.join(path, '*.png'))):
+                jobs.append((src, os.path.join(output, os.path.relpath(src, path)), options))
+        elif len(inputs) == 1 and output.lower().endswith('.png'):
+            jobs.append((path, output, options))
+        else:
+            jobs.append((path, os.path.join(output, os.path.basename(path)), options))
+    if not jobs:
+        print("Error: no PNG files found")
+        sys.exit(1)
+
+    t0 = time.perf_counter()
+    workers = workers or min(len(jobs), os.cpu_count())
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for src, seconds, removed in pool.map(process_file, jobs):
+            print(f"  {src:<48} {100 * removed:5.1f}% removed  {seconds * 1000:7.1f} ms")
+    print(f"✅ {len(jobs)} image(s) written to {output} in {time.perf_counter() - t0:.2f}s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Make a key-colour background transparent.')
+    parser.add_argument('inputs', nargs='+', help='PNG files or directories of PNGs')
+    parser.add_argument('-o', '--output', required=True, help='output PNG (single input) or directory')
+    parser.add_argument('--key', type=parse_key, default='top-left',
+                        help=f"top-left, {', '.join(KEY_RANGES)} or R,G,B (default: top-left)")
+    parser.add_argument('--tolerance', type=int, default=TOLERANCE, help='colour distance threshold')
+    parser.add_argument('--metric', choices=['sum', 'max'], default='sum',
+                        help='sum of channel differences (remove_bg.py) or largest one (process_sprite.py)')
+    parser.add_argument('--flood', action='store_true', help='only remove background connected to the border')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: all cores)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    options = {'key': args.key, 'tolerance': args.tolerance, 'metric': args.metric, 'flood': args.flood,
+               'chunk_rows': args.chunk_rows}
+    run(args.inputs, args.output, options, args.workers)
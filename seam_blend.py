@@ -0,0 +1,210 @@
+"""
+seam_blend.py — Seamless horizontal tiling for the scrolling title background.
+
+TitleScene scrolls title_bg.png as a tileSprite, so its right edge must continue into
+its left edge. This replaces adhoc_scripts/combine_bg.py, blend_fixed_seam.py and
+blend_img3_seam.py: one or more tiles (scaled to the first tile's height) are laid
+side by side on a cyclic canvas, each overlapping the next by --overlap and the last
+wrapping onto the first. Every overlap is blended with a multi-band (Laplacian
+pyramid) blend: coarse detail such as sky colour fades over the whole overlap, while
+fine detail switches over a few pixels and doesn't ghost.
+
+The canvas is processed in vertical strips with a halo wide enough for the coarsest
+pyramid level, with columns taken modulo the canvas width so the wrap seam is treated
+like any other. Only strips that touch an overlap are blended; the rest are copied.
+Float temporaries therefore scale with the strip width and the image height, not with
+how many tiles are joined.
+
+    python seam_blend.py img/title_bg_old.png -o img/title_bg.png            # make one tile wrap
+    python seam_blend.py street.png alternate.png img3.png -o img/title_bg.png --overlap 0.15
+    python seam_blend.py --check img/title_bg.png
+"""
+
+import sys
+import time
+import argparse
+import cv2
+import numpy as np
+
+from image_io import load_image, save_image
+
+# ===== Configuration =====
+# Overlap between neighbouring tiles, as a fraction of the first tile's width (or pixels if > 1)
+OVERLAP = 0.15
+# Fraction of the overlap the level-0 mask ramps over; the rest leaves room for coarse levels to spread
+RAMP = 0.5
+STRIP_WIDTH = 256
+MAX_LEVELS = 6
+# The wrap seam passes when its column step is no larger than this percentile of all column steps
+SEAM_PERCENTILE = 99
+
+
+def pyramid_levels(overlap, ramp=RAMP):
+    """As many levels as keep the coarsest mask's spread (~4·2^levels px) inside the margin around the ramp."""
+    margin = overlap * (1 - ramp) / 2
+    return int(np.clip(np.floor(np.log2(max(margin, 1))) - 2, 0, MAX_LEVELS))
+
+
+def layout(widths, overlap):
+    """Tile start columns on the cyclic canvas and the canvas width."""
+    widths = np.asarray(widths)
+    positions = np.concatenate([[0], np.cumsum(widths[:-1] - overlap)])
+    return positions, int(widths.sum() - len(widths) * overlap)
+
+
+def ramp_weights(offsets, width, overlap, ramp=RAMP):
+    """
+    Weight of a tile at columns `offsets` from its left edge: 0 outside the tile, rising
+    over the centre `ramp` of its first `overlap` columns and falling over its last.
+    The falling ramp of one tile and the rising ramp of the next sum to 1.
+    """
+    span = max(overlap * ramp, 1e-6)
+    start = (overlap - span) / 2
+    centres = offsets + 0.5
+    rise = np.clip((centres - start) / span, 0, 1)
+    fall = np.clip((width - centres - start) / span, 0, 1)
+    return np.where((offsets >= 0) & (offsets < width), np.minimum(rise, fall), 0).astype(np.float32)
+
+
+def gaussian_pyramid(img, levels):
+    pyramid = [img]
+    for _ in range(levels):
+        pyramid.append(cv2.pyrDown(pyramid[-1]))
+    return pyramid
+
+
+def laplacian_pyramid(img, levels):
+    gaussian = gaussian_pyramid(img, levels)
+    pyramid = [g - cv2.pyrUp(gaussian[i + 1], dstsize=g.shape[1::-1]) for i, g in enumerate(gaussian[:-1])]
+    return pyramid + [gaussian[-1]]
+
+
+def multiband_blend(images, weights, levels):
+    """Blend same-size float32 images with per-column weights (1, W) via Laplacian pyramids."""
+    blended = None
+    for img, w in zip(images, weights):
+        bands = laplacian_pyramid(img, levels)
+        masks = gaussian_pyramid(w, levels)
+        terms = [band * mask[..., None] for band, mask in zip(bands, masks)]
+        blended = terms if blended is None else [b + t for b, t in zip(blended, terms)]
+    out = blended[-1]
+    for band in reversed(blended[:-1]):
+        out = cv2.pyrUp(out, dstsize=band.shape[1::-1]) + band
+    return out
+
+
+def tile_strip(tile, start, stop):
+    """Columns [start, stop) of `tile`, which may run past either edge; reflected beyond it."""
+    width = tile.shape[1]
+    lo, hi = max(start, 0), min(stop, width)
+    strip = tile[:, lo:hi]
+    pad_left, pad_right = lo - start, stop - hi
+    if pad_left or pad_right:
+        strip = cv2.copyMakeBorder(strip, 0, 0, pad_left, pad_right, cv2.BORDER_REFLECT_101)
+    return strip
+
+
+def blend_tiles(tiles, overlap=OVERLAP, levels=None, strip_width=STRIP_WIDTH, ramp=RAMP):
+    """Join `tiles` (uint8, H×W×C) into one image that wraps seamlessly. Returns (image, seam columns)."""
+    height = tiles[0].shape[0]
+    tiles = [t if t.shape[0] == height else
+             cv2.resize(t, (round(t.shape[1] * height / t.shape[0]), height), interpolation=cv2.INTER_LANCZOS4)
+             for t in tiles]
+    overlap = int(tiles[0].shape[1] * overlap if overlap <= 1 else overlap)
+    if overlap < 2 or overlap * 2 > min(t.shape[1] for t in tiles):
+        raise ValueError(f"overlap of {overlap}px doesn't fit tiles of width {[t.shape[1] for t in tiles]}")
+    levels = pyramid_levels(overlap, ramp) if levels is None else levels
+    positions, total = layout([t.shape[1] for t in tiles], overlap)
+
+    # Strips and halo aligned to the coarsest level so every strip samples the same pyramid grid
+    align = 2 ** levels
+    halo = align * 4 if levels else 0
+    strip_width = -(-strip_width // align) * align
+    # Opaque tiles (the usual case) only need their colour channels blended
+    channels = 3 if all((t[..., 3] == 255).all() for t in tiles) else 4
+    out = np.empty((height, total, channels), np.uint8)
+
+    # Each tile also appears one canvas width to the left and right, for the wrap seam
+    instances = [(tile, pos + shift) for tile, pos in zip(tiles, positions) for shift in (-total, 0, total)]
+    for x0 in range(0, total, strip_width):
+        x1 = min(x0 + strip_width, total)
+        start, stop = x0 - halo, x1 + halo
+        # Coarse masks spread up to a halo beyond a ramp, so look that much further before copying
+        cols = np.arange(start - halo, stop + halo)
+        parts = []
+        for tile, pos in instances:
+            w = ramp_weights(cols - pos, tile.shape[1], overlap, ramp)
+            if w.any():
+                parts.append((tile, pos, w[halo:len(cols) - halo]))
+        if len(parts) == 1 and parts[0][2].min() == 1:
+            tile, pos, _ = parts[0]
+            out[:, x0:x1] = tile[:, x0 - pos:x1 - pos, :channels]
+            continue
+        images = [tile_strip(tile[..., :channels], start - pos, stop - pos).astype(np.float32)
+                  for tile, pos, _ in parts]
+        weights = [w[None] for _, _, w in parts]
+        blended = multiband_blend(images, weights, levels)
+        out[:, x0:x1] = np.clip(np.rint(blended[:, halo:halo + x1 - x0]), 0, 255)
+
+    if channels == 3:
+        out = np.concatenate([out, np.full((height, total, 1), 255, np.uint8)], axis=2)
+    seams = [int(p) for p in positions] + [total]
+    return out, seams
+
+
+def column_steps(img):
+    """Mean absolute RGB difference between each column and the next, wrapping at the right edge."""
+    rgb = img[..., :3].astype(np.int16)
+    steps = np.empty(img.shape[1])
+    steps[:-1] = np.abs(np.diff(rgb, axis=1)).mean(axis=(0, 2))
+    steps[-1] = np.abs(rgb[:, -1] - rgb[:, 0]).mean()
+    return steps
+
+
+def check_seams(img, percentile=SEAM_PERCENTILE, label=''):
+    """
+    Whether the step from the last column back to the first looks like any other column
+    step of the image, i.e. is within the given percentile of them.
+    """
+    steps = column_steps(img)
+    median, limit = np.median(steps), np.percentile(steps[:-1], percentile)
+    ok = steps[-1] <= limit
+    print(f"{'✅' if ok else '❌'} {label}wrap seam step {steps[-1]:.2f} "
+          f"({steps[-1] / median:.2f}x median, p{percentile} {limit / median:.2f}x)")
+    return ok
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Blend tiles into a seamlessly wrapping background.')
+    parser.add_argument('tiles', nargs='+', help='tile images, left to right')
+    parser.add_argument('-o', '--output', help='output PNG')
+    parser.add_argument('--overlap', type=float, default=OVERLAP,
+                        help='overlap between tiles: fraction of the first tile width, or pixels if > 1')
+    parser.add_argument('--levels', type=int, default=None, help='pyramid levels (default: from the overlap)')
+    parser.add_argument('--strip-width', type=int, default=STRIP_WIDTH)
+    parser.add_argument('--check', action='store_true', help='only check that each input wraps seamlessly')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.check:
+        results = [check_seams(load_image(path), label=f'{path}: ') for path in args.tiles]
+        sys.exit(0 if all(results) else 1)
+    if not args.output:
+        print("Error: --output is required unless --check is given")
+        sys.exit(1)
+
+    tiles = [load_image(path) for path in args.tiles]
+    t0 = time.perf_counter()
+    try:
+        out, seams = blend_tiles(tiles, args.overlap, args.levels, args.strip_width)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    print(f"Blended {len(tiles)} tile(s) into {out.shape[1]}×{out.shape[0]} "
+          f"(seams at {seams}) in {time.perf_counter() - t0:.2f}s")
+    save_image(args.output, out)
+    ok = check_seams(out)
+    print(f"Saved {args.output}")
+    sys.exit(0 if ok else 1)
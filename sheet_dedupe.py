@@ -0,0 +1,95 @@
+"""
+sheet_dedupe.py — Animation sheets that store each distinct frame bitmap once.
+
+create_bus_sheet.py, composite_bus*.py and tile_user_minibus.py paste the same bus
+bitmap three times into a 1920×210 sheet, moved by a [0, 4, 2] y-offset, so the
+texture holds three copies of one image. This takes N frames (separate images or a
+sheet split by @WxH), trims each to its alpha bounding box so frames that differ only
+by translation have identical pixels, and packs each distinct bitmap once. Frames
+that genuinely differ are simply all kept, so the worst case is an ordinary (trimmed)
+sheet of every frame.
+
+The output is a Phaser multiatlas (see atlas_packer.py): every frame points at its
+bitmap's rectangle, and its spriteSourceSize holds its offset within the full frame.
+The same JSON carries an "anims" entry with per-frame durations:
+
+    python sheet_dedupe.py img/sunnie_minibus_sheet.png@640x210 -o img/minibus --duration 500
+    python sheet_dedupe.py walk_0.png walk_1.png walk_2.png -o img/walk --durations 120 80 120 --repeat 0
+
+    this.load.multiatlas('minibus', 'img/minibus.json', 'img/');   // BootScene
+    this.load.animation('minibus_anims', 'img/minibus.json');
+    this.add.sprite(x, y, 'minibus').play('minibus');
+"""
+
+import os
+import sys
+import time
+import argparse
+
+from atlas_packer import MAX_SIZE, PADDING, parse_sprite, load_sprites, dedupe, pack, write_atlases
+
+# ===== Configuration =====
+# The title minibus animation runs at 2 fps
+DURATION_MS = 500
+
+
+def anims_json(key, texture, sprites, durations, repeat=-1):
+    """
+    Phaser animation JSON for `sprites` in order. Phaser adds a frame's `duration` to the
+    animation's ms per frame, so the base is the shortest duration and frames add the rest.
+    """
+    base = min(durations)
+    return {'anims': [{
+        'key': key,
+        'type': 'frame',
+        'duration': base * len(sprites),
+        'repeat': repeat,
+        'frames': [{'key': texture, 'frame': s.name, 'duration': d - base} for s, d in zip(sprites, durations)],
+    }]}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Build an animation sheet that stores identical frames once.')
+    parser.add_argument('frames', nargs='+', type=parse_sprite,
+                        help='[name=]path[@WxH], in playback order; @WxH splits a sheet into frames')
+    parser.add_argument('-o', '--output', required=True, help='output path without extension, e.g. img/minibus')
+    parser.add_argument('--key', help='texture and animation key (default: output file name)')
+    parser.add_argument('--duration', type=int, default=DURATION_MS, help='ms per frame')
+    parser.add_argument('--durations', type=int, nargs='+', help='ms for each frame, overriding --duration')
+    parser.add_argument('--repeat', type=int, default=-1, help='animation repeats (-1: loop forever)')
+    parser.add_argument('--max-size', type=int, default=MAX_SIZE)
+    parser.add_argument('--padding', type=int, default=PADDING)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    key = args.key or os.path.basename(args.output)
+    t0 = time.perf_counter()
+    sprites = load_sprites(args.frames)
+    durations = args.durations or [args.duration] * len(sprites)
+    if len(durations) != len(sprites):
+        print(f"Error: {len(durations)} durations for {len(sprites)} frames")
+        sys.exit(1)
+
+    unique, duplicates = dedupe(sprites)
+    try:
+        atlases = pack(unique, args.max_size, args.padding)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    write_atlases(atlases, args.output, duplicates, anims_json(key, key, sprites, durations, args.repeat))
+
+    for s in unique:
+        shared = [d.name for d in duplicates.get(s.name, [])]
+        print(f"  {s.name:<24} {s.image.shape[1]}×{s.image.shape[0]}"
+              f"{f'  also {", ".join(shared)}' if shared else ''}")
+    if len(unique) == len(sprites):
+        print("  frames all differ; every frame is kept")
+    # What a plain sheet of the untrimmed frames would take, vs. the packed atlas
+    sheet_bytes = sum(s.source_w * s.source_h for s in sprites) * 4
+    bitmap_bytes = sum(s.image.shape[0] * s.image.shape[1] for s in unique) * 4
+    atlas_bytes = sum(w * h for (w, h), _ in atlases) * 4
+    print(f"✅ {len(sprites)} frames, {len(unique)} distinct bitmap(s) of {bitmap_bytes / 2 ** 20:.2f} MB "
+          f"in {atlas_bytes / 2 ** 20:.2f} MB of power-of-two texture, vs {sheet_bytes / 2 ** 20:.2f} MB "
+          f"as a full sheet ({sheet_bytes / atlas_bytes:.1f}x) in {time.perf_counter() - t0:.2f}s → {args.output}.json")
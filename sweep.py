@@ -0,0 +1,227 @@
+"""
+sweep.py — Parallel hyperparameter sweep for the DigitCNN trainer.
+
+Trials run concurrently in a process pool. Each worker is pinned to its own slice
+of CPU cores (os.sched_setaffinity + torch.set_num_threads), and losing trials are
+pruned early by median stopping on per-epoch validation accuracy. Validation uses
+the last 5k MNIST training images, so the test set stays untouched.
+
+    # Grid over every combination
+    python sweep.py --param lr=0.0003,0.001,0.003 --param batch_size=64,128 --parallel 2 --threads 2
+
+    # Random search; 'lo:hi' samples uniformly, 'log:lo:hi' log-uniformly
+    python sweep.py --search random --trials 12 --param lr=log:1e-4:1e-2 --param epochs=4,6,8
+
+Results are printed as one table ranked by accuracy and by wall-clock time, along
+with the cheapest configuration that meets --target-acc.
+"""
+
+import os
+import json
+import math
+import time
+import random
+import argparse
+import itertools
+import statistics
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import torch
+
+import get_mnist_model as mnist
+from mnist_data import MNISTArrays, BatchLoader
+
+# ===== Configuration =====
+PARAM_TYPES = {'batch_size': int, 'epochs': int, 'lr': float, 'step_size': int, 'gamma': float}
+VAL_SIZE = 5000
+# Median stopping: never prune during the first GRACE_EPOCHS epochs, and only
+# once at least MIN_TRIALS other trials have reported at that epoch
+GRACE_EPOCHS = 1
+MIN_TRIALS = 3
+TARGET_ACC = 98.0
+
+
+def default_config():
+    return {'batch_size': mnist.BATCH_SIZE, 'epochs': mnist.EPOCHS, 'lr': mnist.LR,
+            'step_size': mnist.STEP_SIZE, 'gamma': mnist.GAMMA}
+
+
+def parse_param(spec):
+    """'lr=0.001,0.003' -> ('lr', [0.001, 0.003]); 'lr=log:1e-4:1e-2' -> ('lr', ('log', 1e-4, 1e-2))."""
+    name, _, values = spec.partition('=')
+    if name not in PARAM_TYPES:
+        raise ValueError(f"Unknown hyperparameter '{name}' (choose from {', '.join(PARAM_TYPES)})")
+    cast = PARAM_TYPES[name]
+    if ':' in values:
+        parts = values.split(':')
+        scale = parts.pop(0) if parts[0] in ('log', 'lin') else 'lin'
+        return name, (scale, float(parts[0]), float(parts[1]))
+    return name, [cast(v) for v in values.split(',')]
+
+
+def grid_configs(space):
+    """Every combination of the listed values."""
+    for name, values in space.items():
+        if isinstance(values, tuple):
+            raise ValueError(f"Grid search needs explicit values for '{name}', not a range")
+    names = list(space)
+    for combo in itertools.product(*(space[n] for n in names)):
+        yield {**default_config(), **dict(zip(names, combo))}
+
+
+def random_configs(space, trials, seed=0):
+    """`trials` configurations sampled from value lists or (log-)uniform ranges."""
+    rng = random.Random(seed)
+    for _ in range(trials):
+        config = default_config()
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                scale, lo, hi = values
+                if scale == 'log':
+                    value = 10 ** rng.uniform(math.log10(lo), math.log10(hi))
+                else:
+                    value = rng.uniform(lo, hi)
+                config[name] = PARAM_TYPES[name](round(value) if PARAM_TYPES[name] is int else value)
+            else:
+                config[name] = rng.choice(values)
+        yield config
+
+
+# Per-worker state, set up by _init_worker
+_REPORTS = None
+_LOCK = None
+
+
+def _init_worker(core_queue, reports, lock, threads):
+    global _REPORTS, _LOCK
+    _REPORTS, _LOCK = reports, lock
+    cores = core_queue.get()
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+
+
+def should_continue(trial_id, epoch, acc, grace=GRACE_EPOCHS, min_trials=MIN_TRIALS):
+    """Median stopping rule: prune if this trial is below the median of the others at `epoch`."""
+    with _LOCK:
+        history = _REPORTS.get(epoch, [])
+        others = [a for tid, a in history if tid != trial_id]
+        _REPORTS[epoch] = history + [(trial_id, acc)]
+    if epoch <= grace or len(others) < min_trials:
+        return True
+    return acc >= statistics.median(others)
+
+
+def run_trial(job):
+    """Worker: train one configuration on the train split, scoring on the validation split."""
+    trial_id, config, seed = job
+    train_data = MNISTArrays('train')
+    n = len(train_data)
+    val_data = train_data.subset(slice(n - VAL_SIZE, n))
+    train_data = train_data.subset(slice(0, n - VAL_SIZE))
+
+    t0 = time.perf_counter()
+    train_batches = mnist.build_train_batches('batch', train_data, seed, batch_size=config['batch_size'],
+                                              epochs=config['epochs'])
+    val_loader = BatchLoader(val_data, batch_size=1000, device=mnist.DEVICE)
+    _, val_acc, stats = mnist.fit(
+        'fp32', train_batches, val_loader, seed=seed, epochs=config['epochs'], lr=config['lr'],
+        step_size=config['step_size'], gamma=config['gamma'], val_loader=val_loader,
+        on_epoch=lambda epoch, acc: should_continue(trial_id, epoch, acc), verbose=False,
+    )
+    result = {
+        'trial': trial_id, **config,
+        'val_acc': val_acc,
+        'epochs_run': stats['epochs_run'],
+        'pruned': stats['pruned'],
+        'seconds': time.perf_counter() - t0,
+        'samples_per_sec': stats['samples_per_sec'],
+        'cores': sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else None,
+    }
+    status = f"pruned after epoch {stats['epochs_run']}" if stats['pruned'] else 'done'
+    print(f"  trial {trial_id:3d} {status:<22} val_acc={val_acc:.2f}%  {result['seconds']:.0f}s  {format_config(config)}")
+    return result
+
+
+def format_config(config):
+    return ' '.join(f"{k}={v:.2g}" if isinstance(v, float) else f"{k}={v}" for k, v in config.items())
+
+
+def core_slices(parallel, threads):
+    """Split the available cores into `parallel` slices of `threads` cores (None if there aren't enough)."""
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+    if parallel * threads > len(cores):
+        return [None] * parallel
+    return [cores[i * threads:(i + 1) * threads] for i in range(parallel)]
+
+
+def sweep(configs, parallel=2, threads=1, seed=0):
+    configs = list(configs)
+    print(f"Sweeping {len(configs)} configurations, {parallel} at a time with {threads} thread(s) each")
+    # Build the .npy cache (or download MNIST) once here, not in every worker at the same time
+    MNISTArrays('train')
+    manager = multiprocessing.Manager()
+    core_queue = manager.Queue()
+    for cores in core_slices(parallel, threads):
+        core_queue.put(cores)
+    reports, lock = manager.dict(), manager.Lock()
+
+    with ProcessPoolExecutor(max_workers=parallel, initializer=_init_worker,
+                             initargs=(core_queue, reports, lock, threads)) as pool:
+        results = list(pool.map(run_trial, [(i, c, seed) for i, c in enumerate(configs)]))
+    manager.shutdown()
+    return results
+
+
+def print_table(results, target_acc=TARGET_ACC):
+    header = f"{'trial':>5}  {'val acc':>8}  {'time':>7}  {'epochs':>6}  {'pruned':>6}  config"
+    for title, key in (('accuracy', lambda r: (-r['val_acc'], r['seconds'])),
+                       ('wall-clock time', lambda r: (r['seconds'], -r['val_acc']))):
+        print(f"\nRanked by {title}:")
+        print(header)
+        for r in sorted(results, key=key):
+            config = {k: r[k] for k in PARAM_TYPES}
+            print(f"{r['trial']:>5}  {r['val_acc']:>7.2f}%  {r['seconds']:>6.0f}s  {r['epochs_run']:>6}  "
+                  f"{'yes' if r['pruned'] else '':>6}  {format_config(config)}")
+
+    eligible = [r for r in results if not r['pruned'] and r['val_acc'] >= target_acc]
+    if eligible:
+        best = min(eligible, key=lambda r: r['seconds'])
+        print(f"\n✅ Cheapest config reaching {target_acc}%: trial {best['trial']} "
+              f"({best['val_acc']:.2f}% in {best['seconds']:.0f}s)")
+    else:
+        print(f"\n⚠️  No configuration reached {target_acc}% validation accuracy")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Parallel hyperparameter sweep for DigitCNN.')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUES',
+                        help=f"search dimension, one of {', '.join(PARAM_TYPES)}; "
+                             "values as a comma list or 'lo:hi' / 'log:lo:hi' ranges (random search)")
+    parser.add_argument('--search', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--trials', type=int, default=8, help='number of random-search trials')
+    parser.add_argument('--parallel', type=int, default=2, help='trials running at the same time')
+    parser.add_argument('--threads', type=int, default=max(1, (os.cpu_count() or 1) // 2),
+                        help='torch threads (and pinned cores) per trial')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--target-acc', type=float, default=TARGET_ACC,
+                        help='validation accuracy the chosen config has to reach')
+    parser.add_argument('--out', default=None, help='also write all results to this JSON file')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    space = dict(parse_param(spec) for spec in args.param)
+    if args.search == 'grid':
+        configs = grid_configs(space)
+    else:
+        configs = random_configs(space, args.trials, args.seed)
+
+    results = sweep(configs, parallel=args.parallel, threads=args.threads, seed=args.seed)
+    print_table(results, args.target_acc)
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,204 @@
+"""
+telemetry.py — Training telemetry with on-device metric accumulation and per-step timing.
+
+Loss and accuracy are accumulated as device tensors and only synced once per
+epoch (or every `sync_every` steps), instead of calling .item() on every batch.
+Each step is split into data-wait / forward / backward / optimizer time, and
+everything is appended to a JSONL file so runs can be compared afterwards:
+
+    python telemetry.py runs/new.jsonl --baseline runs/old.jsonl
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+PHASES = ('data', 'forward', 'backward', 'optimizer')
+# Fail the comparison if throughput drops by more than this fraction
+REGRESSION_TOLERANCE = 0.10
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+class TrainTelemetry:
+    """
+    Per-epoch metrics and step timing for a training loop.
+
+        tel.start_epoch(epoch)
+        for images, labels in tel.timed(loader):      # time spent waiting = 'data'
+            outputs = model(images); loss = ...;  tel.mark('forward')
+            loss.backward();                      tel.mark('backward')
+            optimizer.step();                     tel.mark('optimizer')
+            tel.update(loss, outputs, labels)
+        stats = tel.end_epoch(lr=...)
+
+    Timings use the host clock, which is exact on CPU. On CUDA they measure
+    launch time unless `sync_timing=True`, which synchronizes at every mark.
+    """
+    def __init__(self, path=None, sync_every=0, device='cpu', sync_timing=False, run_info=None):
+        self.path = path
+        self.sync_every = sync_every
+        self.device = device
+        self.sync_timing = sync_timing and str(device).startswith('cuda')
+        self.file = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.file = open(path, 'a', encoding='utf-8')
+            self._write({'type': 'run', 'time': time.time(), **(run_info or {})})
+
+    def _write(self, record):
+        if self.file:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+
+    def _sync(self):
+        if self.sync_timing:
+            import torch
+            torch.cuda.synchronize()
+
+    def start_epoch(self, epoch):
+        import torch
+        self.epoch = epoch
+        self.step = 0
+        self.total = 0
+        self.loss_sum = torch.zeros((), device=self.device)
+        self.correct = torch.zeros((), dtype=torch.long, device=self.device)
+        self.times = {phase: [] for phase in PHASES}
+        self.epoch_start = time.perf_counter()
+        self._interval_start = self.epoch_start
+        self._interval_total = 0
+
+    def timed(self, loader):
+        """Iterate `loader`, recording how long each batch took to arrive."""
+        iterator = iter(loader)
+        while True:
+            t0 = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            self._last = time.perf_counter()
+            self.times['data'].append(self._last - t0)
+            yield batch
+
+    def mark(self, phase):
+        """Close the current phase of this step (forward / backward / optimizer)."""
+        self._sync()
+        now = time.perf_counter()
+        self.times[phase].append(now - self._last)
+        self._last = now
+
+    def update(self, loss, outputs, labels):
+        """Accumulate batch loss and accuracy on-device; no host sync unless an interval ends."""
+        n = labels.size(0)
+        self.loss_sum += loss.detach() * n
+        self.correct += outputs.detach().argmax(1).eq(labels).sum()
+        self.total += n
+        self.step += 1
+
+        if self.sync_every and self.step % self.sync_every == 0:
+            now = time.perf_counter()
+            samples = self.total - self._interval_total
+            self._write({
+                'type': 'interval', 'epoch': self.epoch, 'step': self.step,
+                'loss': self.loss_sum.item() / self.total,
+                'acc': 100.0 * self.correct.item() / self.total,
+                'samples_per_sec': samples / (now - self._interval_start),
+            })
+            self._interval_start, self._interval_total = now, self.total
+
+    def end_epoch(self, **extra):
+        """Sync once, write the epoch record and return it."""
+        elapsed = time.perf_counter() - self.epoch_start
+        record = {
+            'type': 'epoch',
+            'epoch': self.epoch,
+            'steps': self.step,
+            'samples': self.total,
+            'loss': self.loss_sum.item() / max(self.total, 1),
+            'acc': 100.0 * self.correct.item() / max(self.total, 1),
+            'seconds': elapsed,
+            'samples_per_sec': self.total / elapsed,
+            **extra,
+        }
+        for phase, values in self.times.items():
+            record[f"{phase}_s"] = sum(values)
+            record[f"{phase}_ms_p50"] = 1000 * _percentile(values, 50)
+            record[f"{phase}_ms_p95"] = 1000 * _percentile(values, 95)
+        self._write(record)
+        return record
+
+    def log(self, record_type, **fields):
+        """Write any other record (e.g. final test accuracy)."""
+        self._write({'type': record_type, **fields})
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def format_breakdown(record):
+    """One-line share of epoch time per phase, e.g. 'data 12% | forward 30% | ...'."""
+    total = sum(record[f"{phase}_s"] for phase in PHASES) or 1.0
+    return ' | '.join(f"{phase} {100 * record[f'{phase}_s'] / total:.0f}%" for phase in PHASES)
+
+
+def load_epochs(path):
+    """Epoch records of the last run in a telemetry JSONL file."""
+    epochs = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record['type'] == 'run':
+                epochs = []
+            elif record['type'] == 'epoch':
+                epochs.append(record)
+    return epochs
+
+
+def summarize(path):
+    epochs = load_epochs(path)
+    if not epochs:
+        raise ValueError(f"No epoch records in {path}")
+    # Skip the first epoch when possible: it includes warm-up (allocations, compilation)
+    steady = epochs[1:] or epochs
+    return {
+        'epochs': len(epochs),
+        'samples_per_sec': statistics.median(r['samples_per_sec'] for r in steady),
+        'final_acc': epochs[-1]['acc'],
+        'breakdown': format_breakdown({f"{p}_s": sum(r[f"{p}_s"] for r in steady) for p in PHASES}),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Summarize a training telemetry JSONL and check for throughput regressions.')
+    parser.add_argument('run', help='telemetry JSONL of the run to check')
+    parser.add_argument('--baseline', help='telemetry JSONL of a reference run')
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help='allowed fractional drop in samples/s vs. the baseline')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    run = summarize(args.run)
+    print(f"{args.run}: {run['samples_per_sec']:.0f} samples/s  train_acc={run['final_acc']:.1f}%  [{run['breakdown']}]")
+
+    if args.baseline:
+        base = summarize(args.baseline)
+        print(f"{args.baseline}: {base['samples_per_sec']:.0f} samples/s  train_acc={base['final_acc']:.1f}%  [{base['breakdown']}]")
+        change = run['samples_per_sec'] / base['samples_per_sec'] - 1
+        print(f"Throughput change: {100 * change:+.1f}%")
+        if change < -args.tolerance:
+            print(f"❌ Throughput regression beyond {100 * args.tolerance:.0f}%")
+            sys.exit(1)
+        print("✅ No throughput regression")